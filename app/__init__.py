@@ -10,12 +10,13 @@ import os
 from flask import Flask
 from flask_mail import Mail
 from flask_migrate import Migrate, MigrateCommand
-from flask_sqlalchemy import SQLAlchemy
 from flask_user import UserManager, SQLAlchemyAdapter
 from flask_wtf.csrf import CSRFProtect
 
+from .database import ConfiguredSQLAlchemy, database_uri_from_environment
+
 # Instantiate Flask extensions
-db = SQLAlchemy()
+db = ConfiguredSQLAlchemy()
 csrf_protect = CSRFProtect()
 mail = Mail()
 migrate = Migrate()
@@ -32,6 +33,8 @@ def create_app(extra_config_settings={}):
     app.config.from_object('app.settings')
     # Load local settings from 'app/local_settings.py'
     app.config.from_object('app.local_settings')
+    # A DATABASE_URL environment variable overrides the configured database
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri_from_environment(app.config.get('SQLALCHEMY_DATABASE_URI'))
     # Load extra config settings from 'extra_config_settings' param
     app.config.update(extra_config_settings)
 
@@ -43,8 +46,10 @@ def create_app(extra_config_settings={}):
     # Setup Flask-Migrate
     migrate.init_app(app, db)
 
-    # Setup Flask-Mail
+    # Setup Flask-Mail, sending from a background thread
     mail.init_app(app)
+    from .models.mail_queue import init_mail_queue
+    init_mail_queue(app)
 
     # Setup WTForms CSRFProtect
     csrf_protect.init_app(app)
@@ -64,11 +69,23 @@ def create_app(extra_config_settings={}):
     # Setup an error-logger to send emails to app.config.ADMINS
     init_email_error_handler(app)
 
+    # Setup per-endpoint request and SQL statistics
+    from .models.perf_stats import init_perf_stats
+    init_perf_stats(app)
+
+    # Setup the Prometheus request, pool and cache metrics
+    from .models.metrics import init_metrics
+    init_metrics(app)
+
+    # Setup the request-scoped User identity cache
+    from .models.identity_cache import CachedSQLAlchemyAdapter, init_identity_cache
+    init_identity_cache(app)
+
     # Setup Flask-User to handle user account related forms
     from .models.user_models import User, MyRegisterForm
     from .views.misc_views import user_profile_page
 
-    db_adapter = SQLAlchemyAdapter(db, User)  # Setup the SQLAlchemy DB Adapter
+    db_adapter = CachedSQLAlchemyAdapter(db, User)  # Setup the SQLAlchemy DB Adapter, loading users through the identity cache
     user_manager = UserManager(db_adapter, app,  # Init Flask-User and bind to app
                                register_form=MyRegisterForm,  # using a custom register form with UserProfile fields
                                user_profile_view_function=user_profile_page,
@@ -81,38 +98,30 @@ def init_email_error_handler(app):
     """
     Initialize a logger to send emails on error-level messages.
     Unhandled exceptions will now send an email message to app.config.ADMINS.
+    The emails go out through the mail queue, so logging an error does not
+    wait on the mail server, and repeats of an error are mailed once per
+    MAIL_ERROR_DEDUPE_SECONDS.
     """
     if app.debug: return  # Do not send error emails while developing
 
-    # Retrieve email settings from app.config
-    host = app.config['MAIL_SERVER']
-    port = app.config['MAIL_PORT']
-    from_addr = app.config['MAIL_DEFAULT_SENDER']
-    username = app.config['MAIL_USERNAME']
-    password = app.config['MAIL_PASSWORD']
-    secure = () if app.config.get('MAIL_USE_TLS') else None
-
     # Retrieve app settings from app.config
     to_addr_list = app.config['ADMINS']
     subject = app.config.get('APP_SYSTEM_ERROR_SUBJECT_LINE', 'System Error')
+    if not to_addr_list: return
 
-    # Setup an SMTP mail handler for error-level messages
+    # Setup a queued mail handler for error-level messages
     import logging
-    from logging.handlers import SMTPHandler
+    from .models.mail_queue import MailHandler
 
-    mail_handler = SMTPHandler(
-        mailhost=(host, port),  # Mail host and port
-        fromaddr=from_addr,  # From address
-        toaddrs=to_addr_list,  # To address
+    mail_handler = MailHandler(
+        app.extensions['mail_queue'],  # Sent by the mail queue of the app
+        recipients=to_addr_list,  # To address
         subject=subject,  # Subject line
-        credentials=(username, password),  # Credentials
-        secure=secure,
+        dedupe=app.config.get('MAIL_ERROR_DEDUPE_SECONDS', 300),  # Seconds repeats are not mailed
     )
     mail_handler.setLevel(logging.ERROR)
+    mail_handler.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)s in %(module)s [%(pathname)s:%(lineno)d]\n\n%(message)s'))
     app.logger.addHandler(mail_handler)
 
     # Log errors using: app.logger.error('Some error message')
-
-
-
-
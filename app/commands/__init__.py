@@ -1,4 +1,14 @@
 # __init__.py is a special Python file that allows a directory to become
 # a Python package so it can be accessed using the 'import' statement.
 
-from .init_db import InitDbCommand
\ No newline at end of file
+from .init_db import InitDbCommand
+from .check_query_plans import CheckQueryPlansCommand
+from .assign_reviewers import AssignReviewersCommand
+from .export import ExportCommand
+from .import_data import ImportCommand
+from .provision_users import BenchmarkHashingCommand
+from .seed import SeedCommand
+from .benchmark_routes import BenchmarkRoutesCommand
+from .benchmark_writes import BenchmarkWritesCommand
+from .benchmark_mail import BenchmarkMailCommand
+from .worker import WorkerCommand
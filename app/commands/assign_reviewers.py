@@ -0,0 +1,120 @@
+import heapq
+import time
+
+from flask_script import Command, Option
+
+from app import db
+from app.models.paper_models import Paper, PaperAuthors, PaperReviewers, PaperScores
+from app.models.user_models import User, Role, UsersRoles
+from app.models.version_models import DataVersion, PAPERS_VERSION
+
+# Rows per INSERT / UPDATE batch when writing the assignment
+WRITE_CHUNK_SIZE = 1000
+
+
+class AssignReviewersCommand(Command):
+    """ Assign reviewers to every undecided paper, balancing reviewer load."""
+
+    option_list = (
+        Option('--reviewers-per-paper', '-k', dest='k', type=int, default=3,
+               help='Number of reviewers each paper should have'),
+    )
+
+    def run(self, k):
+        result = auto_assign_reviewers(k)
+        print('Assigned %(assigned)d reviews to %(papers)d papers in %(seconds).2fs, '
+              '%(unfilled)d papers could not be filled' % result)
+
+
+def active_reviewer_ids():
+    """ Ids of the active users with the reviewer role, as EligibleReviewerIndex picks them """
+    return [user_id for user_id, in db.session.query(User.id)
+            .join(UsersRoles, UsersRoles.user_id == User.id)
+            .join(Role, Role.id == UsersRoles.role_id)
+            .filter(Role.name == 'reviewer', User.active == True)]
+
+
+def auto_assign_reviewers(k=3):
+    """ Give every undecided paper k reviewers.
+
+    Existing assignments are kept and count towards k and towards the load
+    of their reviewer. Missing slots are filled greedily from a min-heap of
+    (load, reviewer_id), so the least loaded eligible reviewer is always
+    picked first and authors never review their own paper. Papers are
+    filled in order of most remaining slots first. Runs in
+    O(slots * log(reviewers)) plus the rows read and written.
+    """
+    started = time.time()
+
+    # Active reviewer-role users and their current load, one query each
+    reviewer_ids = active_reviewer_ids()
+    load = dict((reviewer_id, 0) for reviewer_id in reviewer_ids)
+    for reviewer_id, count in db.session.query(PaperReviewers.reviewer_id, db.func.count(PaperReviewers.id)) \
+            .group_by(PaperReviewers.reviewer_id):
+        if reviewer_id in load:
+            load[reviewer_id] = count
+
+    # Undecided papers with their authors and current reviewers
+    paper_ids = [paper_id for paper_id, in db.session.query(Paper.id).filter(Paper.status.in_([0, 1]))]
+    excluded = dict((paper_id, set()) for paper_id in paper_ids)
+    assigned = dict((paper_id, 0) for paper_id in paper_ids)
+    for paper_id, user_id in db.session.query(PaperAuthors.paper_id, PaperAuthors.user_id):
+        if paper_id in excluded:
+            excluded[paper_id].add(user_id)
+    for paper_id, reviewer_id in db.session.query(PaperReviewers.paper_id, PaperReviewers.reviewer_id):
+        if paper_id in excluded:
+            excluded[paper_id].add(reviewer_id)
+            assigned[paper_id] += 1
+
+    heap = [(count, reviewer_id) for reviewer_id, count in load.items()]
+    heapq.heapify(heap)
+
+    rows = []
+    unfilled = 0
+    for paper_id in sorted(paper_ids, key=lambda paper_id: (assigned[paper_id], paper_id)):
+        needed = k - assigned[paper_id]
+        skipped = []
+        while needed > 0 and heap:
+            count, reviewer_id = heapq.heappop(heap)
+            if reviewer_id in excluded[paper_id]:
+                skipped.append((count, reviewer_id))
+                continue
+            rows.append({'paper_id': paper_id, 'reviewer_id': reviewer_id})
+            # Still the least loaded reviewer maybe, but not twice for this paper
+            excluded[paper_id].add(reviewer_id)
+            heapq.heappush(heap, (count + 1, reviewer_id))
+            needed -= 1
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        if needed > 0:
+            unfilled += 1
+
+    write_assignments(rows)
+    paper_ids = sorted(set(row['paper_id'] for row in rows))
+    return {'assigned': len(rows),
+            'papers': len(paper_ids),
+            'paper_ids': paper_ids,
+            'unfilled': unfilled,
+            'seconds': time.time() - started}
+
+
+def write_assignments(rows):
+    """ Insert new paper_reviewers rows and bump the score summaries in bulk """
+    new_reviewers = {}
+    for row in rows:
+        new_reviewers[row['paper_id']] = new_reviewers.get(row['paper_id'], 0) + 1
+    summaries = [{'summary_paper_id': paper_id, 'added': count} for paper_id, count in new_reviewers.items()]
+
+    scores = PaperScores.__table__
+    bump = scores.update() \
+        .where(scores.c.paper_id == db.bindparam('summary_paper_id')) \
+        .values(reviewer_count=scores.c.reviewer_count + db.bindparam('added'))
+    for start in range(0, len(rows), WRITE_CHUNK_SIZE):
+        db.session.execute(PaperReviewers.__table__.insert(), rows[start:start + WRITE_CHUNK_SIZE])
+    for start in range(0, len(summaries), WRITE_CHUNK_SIZE):
+        db.session.execute(bump, summaries[start:start + WRITE_CHUNK_SIZE])
+    paper_ids = list(new_reviewers)
+    for start in range(0, len(paper_ids), WRITE_CHUNK_SIZE):
+        DataVersion.bump([], paper_ids[start:start + WRITE_CHUNK_SIZE])
+    DataVersion.bump([PAPERS_VERSION])
+    db.session.commit()
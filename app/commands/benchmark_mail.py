@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from logging.handlers import SMTPHandler
+from timeit import default_timer
+
+try:
+    import socketserver
+except ImportError:  # Python 2
+    import SocketServer as socketserver
+
+from flask_script import Command, Option
+
+from app import create_app
+from app.models.mail_queue import MailHandler, MailQueue
+
+
+class BenchmarkMailCommand(Command):
+    """ Log errors through SMTPHandler and through the mail queue against a local SMTP stand-in."""
+
+    option_list = (
+        Option('--errors', '-n', dest='errors', type=int, default=50, help='Errors logged'),
+        Option('--distinct', '-d', dest='distinct', type=int, default=5, help='Different errors among them'),
+        Option('--delay', dest='delay', type=float, default=20,
+               help='Milliseconds the stand-in takes to answer each SMTP command'),
+        Option('--rate', dest='rate', type=int, default=600, help='Mail queue messages per minute'),
+    )
+
+    def run(self, errors, distinct, delay, rate):
+        for label, queued in [('SMTPHandler', False), ('mail queue', True)]:
+            result = benchmark_mail(queued, errors, distinct, delay / 1000.0, rate)
+            print('%-11s %4d errors logged in %8.2fms each, %4d mails over %3d connections, delivered after %.2fs'
+                  % (label, errors, result['log_ms'], result['mails'], result['connections'], result['seconds']))
+
+
+class SMTPStandIn(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """ An SMTP server on 127.0.0.1 that keeps the messages it receives and counts connections.
+
+    Recipients in refuse are answered with 550, as unknown users are.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, delay=0.0, refuse=()):
+        socketserver.TCPServer.__init__(self, ('127.0.0.1', 0), _SMTPSession)
+        self.delay = delay
+        self.refuse = set(refuse)
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='smtp-stand-in')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _SMTPSession(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        time.sleep(self.server.delay)
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply('220 localhost SMTP stand-in')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.strip().split(b' ', 1)[0].upper()
+            if command in (b'EHLO', b'HELO'):
+                self.reply('250 localhost')
+            elif command == b'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                for data in iter(self.rfile.readline, b''):
+                    if data == b'.\r\n':
+                        break
+                    lines.append(data)
+                with self.server.lock:
+                    self.server.messages.append(b''.join(lines))
+                self.reply('250 OK')
+            elif command == b'QUIT':
+                self.reply('221 Bye')
+                return
+            elif command == b'RCPT' and \
+                    line.strip()[len(b'RCPT TO:'):].strip(b'<>').decode('ascii', 'replace') in self.server.refuse:
+                self.reply('550 No such user')
+            elif command in (b'MAIL', b'RCPT', b'RSET', b'NOOP'):
+                self.reply('250 OK')
+            else:
+                self.reply('502 Command not implemented')
+
+
+def benchmark_mail(queued, errors=50, distinct=5, delay=0.02, rate=600):
+    """ Log errors to a stand-in SMTP server answering each command after delay seconds.
+
+    errors records of distinct different errors are logged from this
+    thread, as a failing request would. SMTPHandler sends every record
+    before logging returns; the mail queue only queues them, sends
+    repeats once and reuses one connection per batch.
+    """
+    server = SMTPStandIn(delay).start()
+    try:
+        app = create_app({'MAIL_SERVER': '127.0.0.1', 'MAIL_PORT': server.port, 'MAIL_USE_TLS': False,
+                          'MAIL_USERNAME': None, 'MAIL_PASSWORD': None, 'MAIL_DEBUG': False,
+                          'MAIL_SUPPRESS_SEND': False, 'MAIL_DEFAULT_SENDER': 'benchmark@example.com'})
+        mail_queue = None
+        if queued:
+            mail_queue = MailQueue(app, rate=rate)
+            handler = MailHandler(mail_queue, ['admin@example.com'], 'Benchmark error')
+        else:
+            handler = SMTPHandler(('127.0.0.1', server.port), 'benchmark@example.com', ['admin@example.com'],
+                                  'Benchmark error')
+        logger = logging.Logger('benchmark_mail')
+        logger.addHandler(handler)
+
+        started = default_timer()
+        for i in range(errors):
+            logger.error('Benchmark error %d' % (i % distinct))
+        logged = default_timer() - started
+        if mail_queue is not None:
+            mail_queue.flush()
+        return {'log_ms': logged * 1000.0 / errors, 'mails': len(server.messages),
+                'connections': server.connections, 'seconds': default_timer() - started}
+    finally:
+        server.stop()
@@ -0,0 +1,273 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from timeit import default_timer
+
+from flask_script import Command, Option
+from sqlalchemy import event
+
+from app import create_app, db
+from app.commands.seed import seed_database
+from app.models.paper_models import Paper, PaperAuthors, PaperReviewers
+from app.views.fragment_cache import fragment_cache
+from app.views.manuscripts import manuscript_store
+from app.views.reviewer_index import reviewer_index
+
+# A manuscript for the upload and download routes
+BENCHMARK_PDF = b'%PDF-1.4\n' + b'0' * (256 * 1024) + b'\n%%EOF\n'
+# What `manage.py worker` makes of it: (suffix, content) of the derived files
+BENCHMARK_PROCESSED = [('.txt', b'Benchmark manuscript text ' * 100),
+                       ('.png', b'\x89PNG\r\n\x1a\n' + b'0' * (32 * 1024)),
+                       ('.json', b'{"pages": 12, "text_bytes": 2600}')]
+
+# Every main_blueprint endpoint: (role, method, url, JSON body). Values in
+# %(name)s come from benchmark_fixtures(), also in a body given as a JSON
+# string; a (mimetype, bytes) body is sent as is. A new route must be added here.
+ROUTES = {
+    'main.home_page': ('member', 'GET', '/', None),
+    'main.member_page': ('member', 'GET', '/member', None),
+    'main.user_profile_page': ('member', 'GET', '/pages/profile', None),
+    'main.assignment_of_reviewers': ('admin', 'GET', '/conference/reviewer', None),
+    'main.admin_list_of_papers': ('admin', 'GET', '/conference/paper', None),
+    'main.overview_scores': ('admin', 'GET', '/conference/overview', None),
+    'main.conf_paper_detail': ('admin', 'GET', '/conference/paper/detail/%(paper_id)s', None),
+    'main.conf_assign_reviewer': ('admin', 'GET', '/conference/assign/reviewer?paper_id=%(paper_id)s'
+                                  '&data=%(reviewers_json)s', None),
+    'main.conf_auto_assign_reviewers': ('admin', 'POST', '/conference/assign/auto', {'k': 3}),
+    'main.conf_export': ('admin', 'GET', '/conference/export?format=csv', None),
+    'main.conf_events': ('admin', 'GET', '/conference/events?last_event_id=0&timeout=0', None),
+    'main.conf_action_paper': ('admin', 'GET', '/conference/action/paper?paper_id=%(paper_id)s&action=1', None),
+    'main.review_paper': ('reviewer', 'GET', '/review/paper', None),
+    'main.review_paper_star': ('reviewer', 'GET', '/review/paper/star?paper_id=%(paper_id)s&value=4', None),
+    'main.review_paper_stars': ('reviewer', 'POST', '/review/paper/stars', '{"scores": %(scores_json)s}'),
+    'main.paper_submission': ('member', 'GET', '/member/submit-paper', None),
+    'main.submit_paper': ('member', 'GET', '/submit/paper?data=%(paper_json)s', None),
+    'main.list_of_papers': ('member', 'GET', '/member/list-papers', None),
+    'main.paper_search': ('member', 'GET', '/paper/search?q=sparse%%20consensus', None),
+    'main.paper_manuscript': ('member', 'GET', '/paper/%(paper_id)s/manuscript', None),
+    'main.paper_manuscript_preview': ('member', 'GET', '/paper/%(paper_id)s/manuscript/preview', None),
+    'main.upload_manuscript': ('member', 'PUT', '/paper/%(paper_id)s/manuscript',
+                               ('application/pdf', BENCHMARK_PDF)),
+    'main.member_paper_detail': ('member', 'GET', '/paper/detail/%(paper_id)s', None),
+    'main.activate_user_admin': ('admin', 'GET', '/activate/user?id=%(member_id)s&active=true', None),
+    'main.admin_bulk_create_users': ('admin', 'POST', '/admin/users/bulk',
+                                     {'users': [{'email': 'benchmark@example.com', 'password': 'Password1'}]}),
+    'main.assign_user_admin': ('admin', 'GET', '/assign/user?id=%(member_id)s', None),
+    'main.admin_perf': ('admin', 'GET', '/admin/perf', None),
+    'main.metrics': ('admin', 'GET', '/metrics', None),
+}
+
+# Routes that work through all the data in batches: their statement count
+# grows with the data by design, so only the baseline applies to them
+BATCH_ROUTES = set(['main.conf_export', 'main.conf_auto_assign_reviewers'])
+
+# Statements a route may add on a bigger dataset, e.g. one more IN chunk;
+# an N+1 pattern adds about one per row of the page
+QUERY_GROWTH_SLACK = 2
+
+# Latency differences below this many milliseconds are treated as noise
+LATENCY_NOISE_MS = 2.0
+
+
+class BenchmarkRoutesCommand(Command):
+    """ Time every route on seeded databases of increasing size and check query counts and latency."""
+
+    option_list = (
+        Option('--sizes', dest='sizes', default='200,2000,20000',
+               help='Comma separated numbers of papers to seed, users are half of it'),
+        Option('--requests', '-n', dest='requests', type=int, default=20, help='Timed requests per route'),
+        Option('--baseline', '-b', dest='baseline', default='benchmarks/routes.json',
+               help='Baseline file to compare with'),
+        Option('--save', dest='save', action='store_true', default=False,
+               help='Write the results as the new baseline instead of comparing'),
+        Option('--max-slowdown', dest='max_slowdown', type=float, default=1.5,
+               help='Fail when a median latency exceeds the baseline by this factor'),
+    )
+
+    def run(self, sizes, requests, baseline, save, max_slowdown):
+        sizes = sorted(int(size) for size in sizes.split(','))
+        results = benchmark_routes(sizes, requests)
+        for endpoint in sorted(results):
+            for size in sizes:
+                result = results[endpoint].get(str(size))
+                if result is None:
+                    continue
+                print('%-36s %7d papers %4d queries  p50 %8.1fms  p95 %8.1fms'
+                      % (endpoint, size, result['queries'], result['p50'], result['p95']))
+
+        if save:
+            directory = os.path.dirname(baseline)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(baseline, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            print('Baseline written to %s' % baseline)
+            return
+
+        stored = None
+        if os.path.exists(baseline):
+            with open(baseline) as f:
+                stored = json.load(f)
+        else:
+            print('No baseline at %s, only checking query growth' % baseline)
+        failures = check_results(results, sizes, stored, max_slowdown)
+        for failure in failures:
+            print('FAIL ' + failure)
+        if failures:
+            sys.exit(1)
+        print('All routes within budget')
+
+
+def benchmark_routes(sizes, requests=20):
+    """ Map endpoint -> str(size) -> {queries, p50, p95} measured on a scratch database.
+
+    A separate app is created on a temporary SQLite file, so the
+    configured database is never touched. queries is the number of
+    statements of the first request after the caches were cleared; the
+    latencies are over the following requests.
+    """
+    directory = tempfile.mkdtemp()
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'benchmark.sqlite'),
+        'WTF_CSRF_ENABLED': False,
+        'PASSWORD_HASH_PROCESSES': 1,
+        'MANUSCRIPT_PATH': os.path.join(directory, 'manuscripts'),
+        'FRAGMENT_CACHE_BACKEND': None,
+    })
+    results = dict((endpoint, {}) for endpoint in main_endpoints(app))
+    try:
+        for size in sizes:
+            with app.app_context():
+                seed_database(users=max(50, size // 2), papers=size, k=3, seed=1)
+                fixtures = benchmark_fixtures()
+                db.session.remove()
+            # No app context is held here, so each request gets its own, as in production
+            for endpoint in sorted(results):
+                if endpoint in ROUTES:
+                    results[endpoint][str(size)] = benchmark_route(app, ROUTES[endpoint], fixtures, requests)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def main_endpoints(app):
+    return sorted(set(rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.startswith('main.')))
+
+
+def benchmark_fixtures():
+    """ Ids used in the route URLs: a paper under review with a manuscript, one of its reviewers and its first author """
+    paper_id, reviewer_id = db.session.query(PaperReviewers.paper_id, PaperReviewers.reviewer_id) \
+        .join(Paper, Paper.id == PaperReviewers.paper_id) \
+        .filter(Paper.status == 1) \
+        .order_by(PaperReviewers.paper_id, PaperReviewers.id).first()
+    member_id = db.session.query(PaperAuthors.user_id) \
+        .filter(PaperAuthors.paper_id == paper_id, PaperAuthors.position == 0).scalar()
+    reviewers = [id for id, in db.session.query(PaperReviewers.reviewer_id)
+                 .filter(PaperReviewers.paper_id == paper_id)]
+    store = manuscript_store()
+    digest, size = store.save(io.BytesIO(BENCHMARK_PDF), len(BENCHMARK_PDF))
+    for suffix, content in BENCHMARK_PROCESSED:
+        with open(store.path(digest, suffix), 'wb') as f:
+            f.write(content)
+    Paper.query.filter(Paper.id == paper_id).update({Paper.mediaRef: digest, Paper.mediaTyp: 'application/pdf'})
+    db.session.commit()
+    reviewed = [id for id, in db.session.query(PaperReviewers.paper_id)
+                .filter(PaperReviewers.reviewer_id == reviewer_id)
+                .order_by(PaperReviewers.paper_id).limit(20)]
+    return {
+        'users': {'admin': 1, 'reviewer': reviewer_id, 'member': member_id},
+        'paper_id': paper_id,
+        'member_id': member_id,
+        'reviewers_json': json.dumps({'reviewers': reviewers}),
+        'scores_json': json.dumps([{'paper_id': id, 'value': 4} for id in reviewed]),
+        'paper_json': json.dumps({'authors': [member_id], 'title': 'Benchmark', 'abstract': 'Benchmark'}),
+    }
+
+
+def benchmark_route(app, route, fixtures, requests):
+    role, method, url, body = route
+    url = url % fixtures
+    if body is not None and not isinstance(body, (dict, tuple)):
+        body = json.loads(body % fixtures)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = str(fixtures['users'][role])
+        session['_fresh'] = True
+
+    def send():
+        if isinstance(body, tuple):
+            response = client.open(url, method=method, data=body[1], content_type=body[0])
+        elif body is not None:
+            response = client.open(url, method=method, data=json.dumps(body), content_type='application/json')
+        else:
+            response = client.open(url, method=method)
+        response.get_data()  # consume streamed responses
+        return response
+
+    statements = []
+    thread = threading.current_thread()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Not the statements of background threads, e.g. the change broker's poller
+        if threading.current_thread() is thread:
+            statements.append(statement)
+
+    with app.app_context():
+        fragment_cache().clear()
+        reviewer_index().invalidate()
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        send()
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+    timings = []
+    for i in range(requests):
+        started = default_timer()
+        send()
+        timings.append((default_timer() - started) * 1000.0)
+    timings.sort()
+    return {'queries': len(statements), 'p50': percentile(timings, 0.5), 'p95': percentile(timings, 0.95)}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[int(round(fraction * (len(sorted_values) - 1)))]
+
+
+def check_results(results, sizes, baseline=None, max_slowdown=1.5):
+    """ Failure messages: routes without a benchmark, query counts that grow
+    with the data or exceed the baseline, and median latencies more than
+    max_slowdown times the baseline.
+    """
+    failures = []
+    for endpoint in sorted(results):
+        by_size = results[endpoint]
+        if not by_size:
+            failures.append('%s has no entry in ROUTES' % endpoint)
+            continue
+        smallest, largest = by_size[str(sizes[0])], by_size[str(sizes[-1])]
+        if endpoint not in BATCH_ROUTES and largest['queries'] > smallest['queries'] + QUERY_GROWTH_SLACK:
+            failures.append('%s: %d queries with %d papers but %d with %d papers'
+                            % (endpoint, largest['queries'], sizes[-1], smallest['queries'], sizes[0]))
+        if baseline is None:
+            continue
+        for size in sizes:
+            result = by_size[str(size)]
+            expected = baseline.get(endpoint, {}).get(str(size))
+            if expected is None:
+                continue
+            if result['queries'] > expected['queries']:
+                failures.append('%s: %d queries with %d papers, baseline %d'
+                                % (endpoint, result['queries'], size, expected['queries']))
+            if result['p50'] > expected['p50'] * max_slowdown and \
+                    result['p50'] - expected['p50'] > LATENCY_NOISE_MS:
+                failures.append('%s: p50 %.1fms with %d papers, baseline %.1fms'
+                                % (endpoint, result['p50'], size, expected['p50']))
+    return failures
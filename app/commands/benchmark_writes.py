@@ -0,0 +1,105 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+from timeit import default_timer
+
+from flask_script import Command, Option
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from app.commands.export import iter_paper_records
+from app.commands.seed import seed_database
+from app.models.paper_models import DECIDED_STATUSES, Paper, PaperReviewers
+from app.views.review_scores import store_review_scores
+
+# SQLite as it was configured before SQLITE_PRAGMAS: rollback journal, no pragmas
+PLAIN_SQLITE = {'SQLITE_PRAGMAS': {}}
+
+
+class BenchmarkWritesCommand(Command):
+    """ Write scores from many threads at once and count "database is locked" failures."""
+
+    option_list = (
+        Option('--threads', '-t', dest='threads', type=int, default=8, help='Writing threads'),
+        Option('--writes', '-n', dest='writes', type=int, default=100, help='Score writes per thread'),
+        Option('--readers', '-r', dest='readers', type=int, default=1,
+               help='Threads exporting all papers while the writers run'),
+        Option('--papers', '-p', dest='papers', type=int, default=20000, help='Papers to seed'),
+    )
+
+    def run(self, threads, writes, readers, papers):
+        for label, config in [('plain SQLite', PLAIN_SQLITE), ('configured', {})]:
+            result = benchmark_writes(config, threads, writes, readers, papers)
+            print('%-13s %5d writes, %5d locked, %5d other errors in %.2fs (%.0f writes/s), %d exports'
+                  % (label, result['writes'], result['locked'], result['errors'], result['seconds'],
+                     result['writes'] / result['seconds'], result['exports']))
+
+
+def benchmark_writes(config, threads=8, writes=100, readers=1, papers=20000):
+    """ Seed a scratch SQLite database and score papers from threads concurrently.
+
+    Every write is a star click on an undecided paper, stored by the
+    same store_review_scores() as the endpoint: a conditional UPDATE of
+    the score, the recount of the paper summary and the change counters,
+    then the commit. Meanwhile reader threads export all papers over and
+    over; with the rollback journal a long read keeps writers from
+    committing, with WAL it does not.
+    """
+    directory = tempfile.mkdtemp()
+    settings = {'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(directory, 'writes.sqlite')}
+    settings.update(config)
+    app = create_app(settings)
+    try:
+        with app.app_context():
+            seed_database(users=max(50, papers // 2), papers=papers, k=3, seed=1)
+            assignments = db.session.query(PaperReviewers.paper_id, PaperReviewers.reviewer_id) \
+                .join(Paper, Paper.id == PaperReviewers.paper_id) \
+                .filter(Paper.status.notin_(DECIDED_STATUSES)).all()
+            db.session.remove()
+
+        counts = {'writes': 0, 'locked': 0, 'errors': 0, 'exports': 0}
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def reader():
+            with app.app_context():
+                while not done.is_set():
+                    for record in iter_paper_records():
+                        pass
+                    with lock:
+                        counts['exports'] += 1
+                db.session.remove()
+
+        def writer(seed):
+            rng = random.Random(seed)
+            with app.app_context():
+                for i in range(writes):
+                    paper_id, reviewer_id = rng.choice(assignments)
+                    result = 'writes'
+                    try:
+                        store_review_scores(reviewer_id, [(paper_id, rng.randint(-2, 2))])
+                    except OperationalError as e:
+                        db.session.rollback()
+                        result = 'locked' if 'locked' in str(e) else 'errors'
+                    with lock:
+                        counts[result] += 1
+                db.session.remove()
+
+        workers = [threading.Thread(target=writer, args=(seed,)) for seed in range(threads)]
+        background = [threading.Thread(target=reader) for i in range(readers)]
+        for thread in background:
+            thread.start()
+        started = default_timer()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        counts['seconds'] = default_timer() - started
+        done.set()
+        for thread in background:
+            thread.join()
+        return counts
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
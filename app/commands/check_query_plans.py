@@ -0,0 +1,119 @@
+import re
+import sys
+
+from flask import current_app
+from flask_script import Command
+from sqlalchemy import event
+
+from app import db
+from app.models.paper_models import Paper
+from app.models.user_models import User, Role
+
+# Read-only routes whose queries must be served by an index, per role
+CHECKED_URLS = {
+    'admin': [
+        '/conference/paper',
+        '/conference/overview',
+        '/conference/reviewer',
+        '/conference/paper/detail/{paper_id}',
+        '/member/list-papers',
+        '/member/submit-paper',
+        '/paper/detail/{paper_id}',
+    ],
+    'reviewer': [
+        '/review/paper',
+        '/member/list-papers',
+        '/paper/detail/{paper_id}',
+    ],
+}
+
+# Plan steps that read a bounded or constant number of rows. A subquery in
+# FROM, e.g. the page that subqueryload() joins to, is scanned under its alias
+# anon_N by newer SQLite; its own steps are checked separately
+ALLOWED_SCANS = re.compile(r'^SCAN (CONSTANT ROW|SUBQUERY|\(subquery|anon_\d+\b)')
+
+# Statements whose scans or sorts are known to be fine, as (pattern, reason).
+# A LIMIT is no excuse: a scan sorted by a temp B-tree reads every row first
+ALLOWED_STATEMENTS = [
+    # SQLite reports a walk of the rowid as a scan; the first page of a paper list stops after LIMIT rows
+    (r'FROM papers (LEFT OUTER JOIN paper_scores(?: AS \w+)? ON [\w.]+ = [\w.]+ )?ORDER BY papers\.id\s+LIMIT',
+     'first keyset page in primary key order'),
+    # The reviewers of one page of papers are found by index and sorted in assignment order
+    (r'FROM paper_reviewers\s+WHERE paper_reviewers\.paper_id IN \([?, ]+\) ORDER BY paper_reviewers\.id$',
+     'bounded sort of the reviewers of a page'),
+    # EligibleReviewerIndex loads every active reviewer once per USERS_VERSION
+    (r'FROM users JOIN users_roles ON .* WHERE roles\.name = \? AND users\.is_active = 1 ORDER BY users\.id$',
+     'reviewer index load'),
+]
+
+
+class CheckQueryPlansCommand(Command):
+    """ Fail if a view query does a full table scan or sorts without an index (SQLite only)."""
+
+    def run(self):
+        scans = check_query_plans()
+        for url, statement, detail in scans:
+            print('%s\n    %s\n    %s' % (url, detail, statement))
+        if scans:
+            print('%d full table scan(s) or unindexed sort(s) found' % len(scans))
+            sys.exit(1)
+        print('No full table scans or unindexed sorts')
+
+
+def check_query_plans():
+    """ Run every checked route and return (url, statement, plan step) of each full scan and unindexed sort """
+    if db.engine.name != 'sqlite':
+        raise RuntimeError('EXPLAIN QUERY PLAN checks need a SQLite database')
+
+    paper = Paper.query.order_by(Paper.id).first()
+    paper_id = paper.id if paper else 0
+    scans = []
+    for role_name, urls in CHECKED_URLS.items():
+        user = User.query.join(User.roles).filter(Role.name == role_name).order_by(User.id).first()
+        if user is None:
+            continue
+        for url in urls:
+            url = url.format(paper_id=paper_id)
+            for statement, parameters in capture_statements(user, url):
+                for detail in full_scans(statement, parameters):
+                    scans.append((url, statement, detail))
+    return scans
+
+
+def capture_statements(user, url):
+    """ GET url as user and return the (statement, parameters) it executed """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'UPDATE', 'DELETE')):
+            statements.append((statement, parameters))
+
+    client = current_app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = str(user.id)
+        session['_fresh'] = True
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        client.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+def full_scans(statement, parameters):
+    """ Plan steps of statement that read a whole table or sort rows without an index """
+    if any(re.search(pattern, ' '.join(statement.split())) for pattern, reason in ALLOWED_STATEMENTS):
+        return []
+    connection = db.engine.raw_connection()
+    try:
+        plan = connection.cursor().execute('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    finally:
+        connection.close()
+    details = [row[-1] for row in plan]
+    return [detail for detail in details
+            if detail.startswith('USE TEMP B-TREE FOR ORDER BY')
+            or (detail.startswith('SCAN ')
+                and 'USING INDEX' not in detail
+                and 'USING COVERING INDEX' not in detail
+                and 'USING INTEGER PRIMARY KEY' not in detail
+                and not ALLOWED_SCANS.match(detail))]
@@ -0,0 +1,132 @@
+import csv
+import io
+import itertools
+import json
+import sys
+
+from flask_script import Command, Option
+
+from app import db
+from app.models.paper_models import Paper, PaperAuthors, PaperReviewers, PaperScores
+from app.models.user_models import User
+
+# Papers per batch; also the size of the IN lists, which SQLite caps at 999
+EXPORT_BATCH_SIZE = 500
+
+PAPER_STATUS = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
+
+CSV_COLUMNS = ['id', 'title', 'abstract', 'status', 'submitted_by', 'authors', 'reviewers',
+               'score_count', 'score_sum', 'score_mean']
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class ExportCommand(Command):
+    """ Write every paper with its authors, reviewers and scores as NDJSON or CSV."""
+
+    option_list = (
+        Option('--format', '-f', dest='format', default='ndjson', choices=sorted(EXPORT_FORMATS),
+               help='Output format'),
+        Option('--output', '-o', dest='output', default=None,
+               help='Output file, standard output when omitted'),
+    )
+
+    def run(self, format, output):
+        out = io.open(output, 'w', encoding='utf-8', newline='') if output else sys.stdout
+        try:
+            for chunk in export_lines(format):
+                out.write(chunk)
+        finally:
+            if output:
+                out.close()
+
+
+def export_lines(format):
+    """ Generator of the export as text chunks, one per paper plus a CSV header """
+    records = iter_paper_records()
+    if format == 'ndjson':
+        for record in records:
+            yield json.dumps(record, sort_keys=True) + '\n'
+    elif format == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in itertools.chain([CSV_COLUMNS], (csv_row(record) for record in records)):
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    else:
+        raise ValueError('Unknown export format %r' % format)
+
+
+def csv_row(record):
+    return [record['id'], record['title'], record['abstract'], record['status'], record['submitted_by'],
+            '; '.join(author['name'] for author in record['authors']),
+            '; '.join('%s (%s)' % (reviewer['name'], reviewer['score']) for reviewer in record['reviewers']),
+            record['score_count'], record['score_sum'], record['score_mean']]
+
+
+def iter_paper_records(batch_size=EXPORT_BATCH_SIZE):
+    """ Yield one dict per paper, ordered by id.
+
+    Papers are streamed from a server-side cursor. Authors and reviewers are
+    resolved with one join each per batch_size papers, so memory stays
+    bounded by the batch whatever the number of papers.
+    """
+    query = db.session.query(Paper.id, Paper.title, Paper.abstract, Paper.status, Paper.submittedBy,
+                             PaperScores.score_count, PaperScores.score_sum) \
+        .outerjoin(PaperScores, PaperScores.paper_id == Paper.id) \
+        .order_by(Paper.id) \
+        .yield_per(batch_size)
+    batch = []
+    for row in query:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            for record in paper_records(batch):
+                yield record
+            batch = []
+    for record in paper_records(batch):
+        yield record
+
+
+def paper_records(rows):
+    """ Build the records of a batch of paper rows """
+    if not rows:
+        return []
+    paper_ids = [row.id for row in rows]
+
+    authors = dict((paper_id, []) for paper_id in paper_ids)
+    for paper_id, user_id, first_name, last_name in db.session.query(
+            PaperAuthors.paper_id, User.id, User.first_name, User.last_name) \
+            .join(User, User.id == PaperAuthors.user_id) \
+            .filter(PaperAuthors.paper_id.in_(paper_ids)) \
+            .order_by(PaperAuthors.paper_id, PaperAuthors.position):
+        authors[paper_id].append({'id': user_id, 'name': first_name + ' ' + last_name})
+
+    reviewers = dict((paper_id, []) for paper_id in paper_ids)
+    for paper_id, user_id, first_name, last_name, score in db.session.query(
+            PaperReviewers.paper_id, User.id, User.first_name, User.last_name, PaperReviewers.score) \
+            .join(User, User.id == PaperReviewers.reviewer_id) \
+            .filter(PaperReviewers.paper_id.in_(paper_ids)) \
+            .order_by(PaperReviewers.paper_id, PaperReviewers.id):
+        reviewers[paper_id].append({'id': user_id, 'name': first_name + ' ' + last_name, 'score': score})
+
+    records = []
+    for row in rows:
+        score_count = row.score_count or 0
+        records.append({
+            'id': row.id,
+            'title': row.title,
+            'abstract': row.abstract,
+            'status': PAPER_STATUS[row.status] if row.status is not None else None,
+            'submitted_by': row.submittedBy,
+            'authors': authors[row.id],
+            'reviewers': reviewers[row.id],
+            'score_count': score_count,
+            'score_sum': row.score_sum or 0,
+            'score_mean': float(row.score_sum) / score_count if score_count else None,
+        })
+    return records
@@ -0,0 +1,230 @@
+import csv
+import io
+import itertools
+import json
+import os
+import time
+
+from flask_script import Command, Option
+
+from app import db
+from app.commands.provision_users import PasswordHasher, provision_users
+from app.models.paper_models import Paper, PaperAuthors, PaperReviewers, PaperScores
+from app.models.user_models import User
+from app.models.version_models import DataVersion, PAPERS_VERSION
+
+PAPER_STATUS = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
+
+
+class ImportCommand(Command):
+    """ Import users, papers and reviewer assignments from CSV or NDJSON files.
+
+    users:       email, first_name, last_name, password or password_hash, roles, active
+    papers:      id, title, abstract, status, submitted_by (email), authors (emails)
+    assignments: paper_id, reviewer (email), score
+
+    List fields are JSON arrays in NDJSON and ';' separated in CSV. Each
+    file is imported in chunks; progress is kept in <file>.progress after
+    every commit, so an interrupted import resumes after the last
+    committed chunk when run again on the same, unchanged file. The
+    progress file is removed once the whole file is imported.
+    """
+
+    option_list = (
+        Option('--users', dest='users', default=None, help='Users file (.csv or .ndjson)'),
+        Option('--papers', dest='papers', default=None, help='Papers file (.csv or .ndjson)'),
+        Option('--assignments', dest='assignments', default=None, help='Reviewer assignments file (.csv or .ndjson)'),
+        Option('--chunk-size', dest='chunk_size', type=int, default=500, help='Rows per bulk insert'),
+        Option('--chunks-per-commit', dest='chunks_per_commit', type=int, default=1,
+               help='Chunks written in one transaction'),
+        Option('--processes', dest='processes', type=int, default=None,
+               help='Password hashing processes, one per core by default'),
+    )
+
+    def run(self, users, papers, assignments, chunk_size, chunks_per_commit, processes):
+        importer = Importer(chunk_size, chunks_per_commit)
+        if users:
+            with PasswordHasher(processes) as importer.hasher:
+                importer.import_file(users, importer.import_users)
+        if papers:
+            importer.import_file(papers, importer.import_papers)
+        if assignments:
+            importer.import_file(assignments, importer.import_assignments)
+
+
+def read_records(path):
+    """ Yield the rows of a .csv file or of a .ndjson / .jsonl file as dicts """
+    if path.endswith('.csv'):
+        with io.open(path, encoding='utf-8', newline='') as f:
+            for record in csv.DictReader(f):
+                yield record
+    else:
+        with io.open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def file_identity(path):
+    """ Size and modification time of path, recorded with the progress to tell a changed file """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def list_field(value):
+    """ A list field: JSON array from NDJSON or ';' separated string from CSV """
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return value
+    return [item.strip() for item in str(value).split(';') if item.strip()]
+
+
+def bool_field(value, default=True):
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'y')
+
+
+def status_field(value):
+    if value is None or value == '':
+        return 0
+    if str(value) in PAPER_STATUS:
+        return PAPER_STATUS.index(str(value))
+    return int(value)
+
+
+class Importer(object):
+    """ Chunked bulk importer; lookups are answered from in-memory maps """
+
+    def __init__(self, chunk_size=500, chunks_per_commit=1, hasher=None):
+        self.chunk_size = chunk_size
+        self.chunks_per_commit = chunks_per_commit
+        self.hasher = hasher
+        self._user_ids = None
+
+    # In-memory lookup map, loaded once with one query
+
+    @property
+    def user_ids(self):
+        """ Map lower case email -> user id """
+        if self._user_ids is None:
+            self._user_ids = dict((email.lower(), id) for id, email in db.session.query(User.id, User.email))
+        return self._user_ids
+
+    # Chunking, transactions and resume
+
+    def import_file(self, path, import_chunk):
+        """ Feed the rows of path to import_chunk, chunk by chunk, resuming after the last commit """
+        progress_path = path + '.progress'
+        identity = file_identity(path)
+        done = 0
+        if os.path.exists(progress_path):
+            with open(progress_path) as f:
+                progress = json.load(f)
+            if progress.get('file') != identity:
+                raise ValueError('%s changed since the interrupted import recorded in %s; '
+                                 'remove it to import the file from the start' % (path, progress_path))
+            done = progress['rows']
+            print('%s: resuming after row %d' % (path, done))
+
+        records = itertools.islice(read_records(path), done, None)
+        started = time.time()
+        imported = 0
+        pending = 0
+        chunks = 0
+        while True:
+            chunk = list(itertools.islice(records, self.chunk_size))
+            if not chunk:
+                break
+            import_chunk(chunk)
+            pending += len(chunk)
+            chunks += 1
+            if chunks % self.chunks_per_commit == 0:
+                done, imported, pending = self.commit(progress_path, identity, done, imported, pending)
+                print('%s: %d rows, %.0f rows/s' % (path, done, imported / max(time.time() - started, 1e-6)))
+        if pending:
+            db.session.commit()
+            imported += pending
+        # Complete: a later run of the same path is a new import
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
+        elapsed = time.time() - started
+        print('%s: imported %d rows in %.2fs (%.0f rows/s)' % (path, imported, elapsed, imported / max(elapsed, 1e-6)))
+
+    def commit(self, progress_path, identity, done, imported, pending):
+        db.session.commit()
+        done += pending
+        # Only record progress once the rows are durable
+        temporary = progress_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'rows': done, 'file': identity}, f)
+        os.rename(temporary, progress_path)
+        return done, imported + pending, 0
+
+    # Chunk importers
+
+    def import_users(self, records):
+        users = [dict(record,
+                      active=bool_field(record.get('active')),
+                      roles=list_field(record.get('roles'))) for record in records]
+        provision_users(users, self.hasher, self.user_ids)
+
+    def import_papers(self, records):
+        next_id = (db.session.query(db.func.max(Paper.id)).scalar() or 0) + 1
+        papers = []
+        authors = []
+        for record in records:
+            if record.get('id'):
+                paper_id = int(record['id'])
+            else:
+                paper_id = next_id
+            next_id = max(next_id, paper_id + 1)
+            submitter = record.get('submitted_by')
+            papers.append({'id': paper_id,
+                           'title': record.get('title') or u'',
+                           'abstract': record.get('abstract') or u'',
+                           'status': status_field(record.get('status')),
+                           'submittedBy': self.user_ids.get(submitter.lower()) if submitter else None})
+            for position, email in enumerate(list_field(record.get('authors'))):
+                user_id = self.user_ids.get(email.lower())
+                if user_id is None:
+                    raise ValueError('Paper %d: unknown author %s' % (paper_id, email))
+                authors.append({'paper_id': paper_id, 'user_id': user_id, 'position': position})
+        db.session.bulk_insert_mappings(Paper, papers)
+        db.session.bulk_insert_mappings(PaperAuthors, authors)
+        db.session.bulk_insert_mappings(PaperScores, [{'paper_id': paper['id']} for paper in papers])
+        db.reset_id_sequences(Paper)
+        DataVersion.bump([PAPERS_VERSION])
+
+    def import_assignments(self, records):
+        assignments = {}
+        for record in records:
+            reviewer = record.get('reviewer')
+            reviewer_id = self.user_ids.get(reviewer.lower()) if reviewer else record.get('reviewer_id')
+            if reviewer_id is None:
+                raise ValueError('Unknown reviewer %s' % reviewer)
+            score = record.get('score')
+            assignments[(int(record['paper_id']), int(reviewer_id))] = None if score in (None, '') else int(score)
+        if not assignments:
+            return
+
+        # Skip assignments that already exist, found with one query per paper chunk
+        paper_ids = list(set(paper_id for paper_id, reviewer_id in assignments))
+        for start in range(0, len(paper_ids), 500):
+            for pair in db.session.query(PaperReviewers.paper_id, PaperReviewers.reviewer_id) \
+                    .filter(PaperReviewers.paper_id.in_(paper_ids[start:start + 500])):
+                assignments.pop(tuple(pair), None)
+        db.session.bulk_insert_mappings(PaperReviewers, [
+            {'paper_id': paper_id, 'reviewer_id': reviewer_id, 'score': score}
+            for (paper_id, reviewer_id), score in assignments.items()])
+
+        # Refresh the score summaries of the papers of this chunk in bulk
+        touched = sorted(set(paper_id for paper_id, reviewer_id in assignments))
+        for start in range(0, len(touched), 500):
+            chunk = touched[start:start + 500]
+            PaperScores.rebuild(chunk)
+            DataVersion.bump([], chunk)
+        DataVersion.bump([PAPERS_VERSION])
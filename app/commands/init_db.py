@@ -4,13 +4,10 @@ from flask import current_app
 from flask_script import Command
 
 from app import db
-from app.models.paper_models import Paper, PaperReviewers
+from app.models.paper_models import Paper, PaperAuthors, PaperReviewers, PaperScores
 from app.models.user_models import User, Role
 
 
-from phpserialize import serialize
-
-
 class InitDbCommand(Command):
     """ Initialize the database."""
 
@@ -76,21 +73,22 @@ def find_or_create_user(first_name, last_name, email, password, role=None):
 
 
 def create_papers():
-    create_papers_func(serialize([5]),'Title 5', 'Abstract 5', 5, 1)
-    create_papers_func(serialize([4,6]),'Title 6', 'Abstract 6', 6, 1)
-    create_papers_func(serialize([7]),'Title 7', 'Abstract 7', 7, 1)
+    create_papers_func([5],'Title 5', 'Abstract 5', 5, 1)
+    create_papers_func([4,6],'Title 6', 'Abstract 6', 6, 1)
+    create_papers_func([7],'Title 7', 'Abstract 7', 7, 1)
 
     db.session.commit()
 
 
 def create_papers_func(authors,title,abstract,submittedBy,status=0,mediaRef=None,mediaTyp=None):
-    paper = Paper(authors=authors,
-                title=title,
+    paper = Paper(title=title,
                 abstract=abstract,
                 mediaRef=mediaRef,
                 mediaTyp=mediaTyp,
                 status=status,
                 submittedBy=submittedBy)
+    for position, author_id in enumerate(authors):
+        paper.author_links.append(PaperAuthors(user_id=author_id, position=position))
     db.session.add(paper)
 
 
@@ -100,7 +98,10 @@ def assign_reviewers():
     assign_reviewers_func(2,3)
     assign_reviewers_func(3,3,-1)
     assign_reviewers_func(3,4,-1)
+    db.session.flush()
 
+    # Build the per-paper score summaries from the assignments above
+    PaperScores.rebuild_all()
     db.session.commit()
 
 
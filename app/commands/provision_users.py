@@ -0,0 +1,158 @@
+import datetime
+import multiprocessing
+import time
+
+from flask import current_app
+from flask_script import Command, Option
+from flask_user.passwords import generate_sha512_hmac
+from passlib.context import CryptContext
+
+from app import db
+from app.models.user_models import User, Role, UsersRoles
+from app.models.version_models import DataVersion, USERS_VERSION
+
+# Users per INSERT batch; also the size of the IN lists, which SQLite caps at 999
+PROVISION_CHUNK_SIZE = 500
+
+
+class BenchmarkHashingCommand(Command):
+    """ Time password hashing with 1, 2, 4, ... worker processes up to the number of cores."""
+
+    option_list = (
+        Option('--passwords', '-n', dest='count', type=int, default=200,
+               help='Number of passwords hashed per run'),
+    )
+
+    def run(self, count):
+        passwords = ['Password%d' % i for i in range(count)]
+        cores = multiprocessing.cpu_count()
+        runs = sorted(set([1, cores] + [2 ** i for i in range(cores.bit_length()) if 2 ** i < cores]))
+        baseline = None
+        print('%d passwords, %d cores' % (count, cores))
+        for processes in runs:
+            with PasswordHasher(processes) as hasher:
+                started = time.time()
+                hasher.hash_passwords(passwords)
+                seconds = time.time() - started
+            baseline = baseline or seconds
+            print('%3d processes: %7.2fs %8.1f passwords/s  speedup %.2fx'
+                  % (processes, seconds, count / seconds, baseline / seconds))
+
+
+def hasher_settings(user_manager):
+    """ The picklable part of the Flask-User hashing configuration """
+    return (user_manager.password_hash, user_manager.password_hash_mode, user_manager.password_salt,
+            user_manager.password_crypt_context.to_string())
+
+
+_worker_settings = None
+_worker_context = None
+
+
+def _init_worker(settings):
+    global _worker_settings, _worker_context
+    _worker_settings = settings
+    _worker_context = CryptContext.from_string(settings[3])
+
+
+def _hash_password(password):
+    """ Same result as UserManager.hash_password, without needing the app """
+    password_hash, password_hash_mode, password_salt, _ = _worker_settings
+    if password_hash == 'plaintext':
+        return password
+    if password_hash_mode == 'Flask-Security':
+        password = generate_sha512_hmac(password_salt, password)
+    return _worker_context.encrypt(password)
+
+
+class PasswordHasher(object):
+    """ Hash passwords in a pool of processes, PASSWORD_HASH_PROCESSES or one per core by default.
+
+    bcrypt is CPU bound and holds the GIL, so threads would not help. Use
+    it as a context manager so the pool is started once and closed after
+    the last batch.
+    """
+
+    def __init__(self, processes=None):
+        self.processes = processes or current_app.config.get('PASSWORD_HASH_PROCESSES') \
+            or multiprocessing.cpu_count()
+        self.settings = hasher_settings(current_app.user_manager)
+        self._pool = None
+
+    def __enter__(self):
+        if self.processes > 1:
+            self._pool = multiprocessing.Pool(self.processes, _init_worker, (self.settings,))
+        else:
+            _init_worker(self.settings)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def hash_passwords(self, passwords):
+        """ The hashes of passwords, in the same order """
+        passwords = list(passwords)
+        if self._pool is None:
+            return [_hash_password(password) for password in passwords]
+        chunksize = max(1, len(passwords) // (self.processes * 4))
+        return self._pool.map(_hash_password, passwords, chunksize)
+
+
+def provision_users(records, hasher, user_ids=None, chunk_size=PROVISION_CHUNK_SIZE):
+    """ Create users from dicts with email, first_name, last_name, password
+    (or password_hash), active and roles.
+
+    Emails already in user_ids (lower case email -> id, read with one query
+    when not given) or earlier in records are skipped. Passwords are hashed
+    with hasher, then users and their roles are inserted chunk_size at a
+    time and user_ids is updated with the new ids. The caller commits.
+    Returns the number of users created.
+    """
+    if user_ids is None:
+        user_ids = dict((email.lower(), id) for id, email in db.session.query(User.id, User.email))
+    new_records = []
+    for record in records:
+        email = record['email'].strip()
+        if email.lower() in user_ids:
+            continue
+        user_ids[email.lower()] = None
+        new_records.append(dict(record, email=email))
+    if not new_records:
+        return 0
+
+    to_hash = [record for record in new_records if record.get('password') and not record.get('password_hash')]
+    for record, password_hash in zip(to_hash, hasher.hash_passwords(record['password'] for record in to_hash)):
+        record['password_hash'] = password_hash
+
+    role_ids = dict((name, id) for id, name in db.session.query(Role.id, Role.name))
+    now = datetime.datetime.utcnow()
+    for start in range(0, len(new_records), chunk_size):
+        chunk = new_records[start:start + chunk_size]
+        db.session.bulk_insert_mappings(User, [{
+            'email': record['email'],
+            'first_name': record.get('first_name') or u'',
+            'last_name': record.get('last_name') or u'',
+            'password': record.get('password_hash') or u'',
+            'active': record.get('active', True),
+            'confirmed_at': now} for record in chunk])
+
+        # Read back the new ids with one query to link the roles
+        for id, email in db.session.query(User.id, User.email) \
+                .filter(User.email.in_([record['email'] for record in chunk])):
+            user_ids[email.lower()] = id
+        users_roles = []
+        for record in chunk:
+            for name in record.get('roles') or ():
+                if name not in role_ids:
+                    role = Role(name=name, label=name.capitalize())
+                    db.session.add(role)
+                    db.session.flush()
+                    role_ids[name] = role.id
+                users_roles.append({'user_id': user_ids[record['email'].lower()], 'role_id': role_ids[name]})
+        if users_roles:
+            db.session.bulk_insert_mappings(UsersRoles, users_roles)
+    DataVersion.bump([USERS_VERSION])
+    return len(new_records)
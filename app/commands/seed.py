@@ -0,0 +1,161 @@
+import bisect
+import datetime
+import random
+import time
+
+from flask import current_app
+from flask_script import Command, Option
+
+from app import db
+from app.models.paper_models import Paper, PaperAuthors, PaperReviewers, PaperScores
+from app.models.user_models import User, Role, UsersRoles
+from app.models.version_models import DataVersion, PAPERS_VERSION, USERS_VERSION
+
+# Rows per executemany INSERT
+SEED_CHUNK_SIZE = 1000
+
+FIRST_NAMES = [u'Ana', u'Ben', u'Chen', u'Dara', u'Elif', u'Farid', u'Grace', u'Hiro', u'Ines', u'Jonas',
+               u'Kofi', u'Lena', u'Mateo', u'Nadia', u'Omar', u'Priya', u'Quinn', u'Rosa', u'Sven', u'Tariq',
+               u'Uma', u'Viktor', u'Wen', u'Ximena', u'Yusuf', u'Zoe']
+LAST_NAMES = [u'Almeida', u'Becker', u'Costa', u'Dubois', u'Eriksen', u'Fischer', u'Garcia', u'Haddad',
+              u'Ivanova', u'Jensen', u'Kim', u'Lopez', u'Moreau', u'Nakamura', u'Okafor', u'Petrov', u'Quispe',
+              u'Rossi', u'Silva', u'Tanaka', u'Usman', u'Van Dijk', u'Wang', u'Yilmaz', u'Zhang']
+TOPICS = [u'Graph', u'Neural', u'Distributed', u'Probabilistic', u'Secure', u'Incremental', u'Adaptive',
+          u'Scalable', u'Verified', u'Sparse', u'Federated', u'Streaming']
+SUBJECTS = [u'Query Processing', u'Scheduling', u'Type Inference', u'Caching', u'Consensus', u'Retrieval',
+            u'Compression', u'Program Repair', u'Indexing', u'Peer Review', u'Load Balancing', u'Sampling']
+
+# Authors per paper and their weights: most papers have one to three authors
+AUTHOR_COUNTS = [1, 2, 3, 4, 5, 6, 8]
+AUTHOR_WEIGHTS = [30, 30, 20, 10, 5, 3, 2]
+
+# Status index and weight: Submitted, Under Review, Accepted, Rejected
+STATUS_WEIGHTS = [25, 45, 12, 18]
+
+# Share of users holding the reviewer role
+REVIEWER_SHARE = 0.1
+
+# Chance that a reviewer of a paper under review already gave a score
+SCORED_SHARE = 0.6
+
+
+class SeedCommand(Command):
+    """ Replace the database with a reproducible synthetic conference."""
+
+    option_list = (
+        Option('--users', '-u', dest='users', type=int, default=10000, help='Number of users'),
+        Option('--papers', '-p', dest='papers', type=int, default=20000, help='Number of papers'),
+        Option('--reviewers-per-paper', '-k', dest='k', type=int, default=3,
+               help='Reviewers of each paper that is under review or decided'),
+        Option('--seed', '-s', dest='seed', type=int, default=1, help='Random seed'),
+    )
+
+    def run(self, users, papers, k, seed):
+        result = seed_database(users, papers, k, seed)
+        print('Seeded %(users)d users, %(papers)d papers, %(authors)d authorships and '
+              '%(assignments)d assignments (%(rows)d rows) in %(seconds).2fs' % result)
+
+
+def seed_database(users=10000, papers=20000, k=3, seed=1):
+    """ Drop all tables and fill them with generated data.
+
+    The same arguments always produce the same rows. User 1 is
+    admin@example.com and about a tenth of the users are reviewers,
+    reviewer1@example.com, reviewer2@example.com and so on; everybody's
+    password is Password1. Author counts are skewed, a few prolific users
+    write many papers, statuses are mixed and papers under review have
+    only part of their scores.
+    """
+    started = time.time()
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+
+    # Hashing once is enough: every user gets the same password
+    password = current_app.user_manager.hash_password('Password1')
+    now = datetime.datetime.utcnow()
+
+    insert(Role, [{'id': 1, 'name': 'admin', 'label': u'Admin'},
+                  {'id': 2, 'name': 'reviewer', 'label': u'Reviewer'}])
+
+    reviewer_count = max(k + 1, int(users * REVIEWER_SHARE))
+    user_rows = []
+    role_rows = [{'user_id': 1, 'role_id': 1}]
+    reviewer_ids = []
+    for user_id in range(1, users + 1):
+        if user_id == 1:
+            email = u'admin@example.com'
+        elif user_id <= reviewer_count + 1:
+            email = u'reviewer%d@example.com' % (user_id - 1)
+            role_rows.append({'user_id': user_id, 'role_id': 2})
+            reviewer_ids.append(user_id)
+        else:
+            email = u'member%d@example.com' % (user_id - reviewer_count - 1)
+        # A few members never activated their account
+        active = rng.random() > 0.02 or user_id <= reviewer_count + 1
+        user_rows.append({'id': user_id, 'email': email, 'password': password, 'confirmed_at': now,
+                          'is_active': active,
+                          'first_name': rng.choice(FIRST_NAMES), 'last_name': rng.choice(LAST_NAMES)})
+    insert(User, user_rows)
+    insert(UsersRoles, role_rows)
+
+    paper_rows = []
+    author_rows = []
+    reviewer_rows = []
+    for paper_id in range(1, papers + 1):
+        count = min(weighted_choice(rng, AUTHOR_COUNTS, AUTHOR_WEIGHTS), users - 1)
+        authors = []
+        while len(authors) < count:
+            # Squaring the uniform draw makes low user ids far more prolific
+            author_id = 2 + int((users - 1) * rng.random() ** 2)
+            if author_id not in authors:
+                authors.append(author_id)
+        author_rows.extend({'paper_id': paper_id, 'user_id': author_id, 'position': position}
+                           for position, author_id in enumerate(authors))
+
+        status = weighted_choice(rng, range(len(STATUS_WEIGHTS)), STATUS_WEIGHTS)
+        paper_rows.append({'id': paper_id, 'status': status, 'submittedBy': authors[0],
+                           'title': u'%s %s %d' % (rng.choice(TOPICS), rng.choice(SUBJECTS), paper_id),
+                           'abstract': u'We study %s %s.' % (rng.choice(TOPICS).lower(),
+                                                             rng.choice(SUBJECTS).lower())})
+        if status == 0:
+            continue
+        # Reviewers are users 2 .. reviewer_count + 1; authors cannot review their paper
+        eligible = len(reviewer_ids) - len([author_id for author_id in authors if author_id <= reviewer_count + 1])
+        candidates = []
+        while len(candidates) < min(k, eligible):
+            reviewer_id = rng.choice(reviewer_ids)
+            if reviewer_id not in candidates and reviewer_id not in authors:
+                candidates.append(reviewer_id)
+        for reviewer_id in candidates:
+            scored = status != 1 or rng.random() < SCORED_SHARE
+            reviewer_rows.append({'paper_id': paper_id, 'reviewer_id': reviewer_id,
+                                  'score': rng.randint(-2, 2) if scored else None})
+    insert(Paper, paper_rows)
+    insert(PaperAuthors, author_rows)
+    insert(PaperReviewers, reviewer_rows)
+
+    db.reset_id_sequences(Role, User, Paper)
+    PaperScores.rebuild_all()
+    DataVersion.bump([PAPERS_VERSION, USERS_VERSION])
+    db.session.commit()
+    return {'users': len(user_rows),
+            'papers': len(paper_rows),
+            'authors': len(author_rows),
+            'assignments': len(reviewer_rows),
+            'rows': len(user_rows) + len(role_rows) + 2 * len(paper_rows) + len(author_rows) + len(reviewer_rows),
+            'seconds': time.time() - started}
+
+
+def weighted_choice(rng, values, weights):
+    totals = []
+    total = 0
+    for weight in weights:
+        total += weight
+        totals.append(total)
+    return list(values)[bisect.bisect_right(totals, rng.random() * total)]
+
+
+def insert(model, rows):
+    for start in range(0, len(rows), SEED_CHUNK_SIZE):
+        db.session.execute(model.__table__.insert(), rows[start:start + SEED_CHUNK_SIZE])
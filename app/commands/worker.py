@@ -0,0 +1,190 @@
+import datetime
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+from flask import current_app
+from flask_script import Command, Option
+
+from app import db
+from app.models.job_models import Job, PermanentJobError
+from app.models.paper_models import Paper
+from app.models.version_models import DataVersion, PAPERS_VERSION
+from app.views.fragment_cache import fragment_cache
+from app.views.manuscripts import MANUSCRIPT_JOB, ProcessingError, manuscript_store, process_manuscript
+
+
+def run_manuscript_job(digest):
+    try:
+        process_manuscript(manuscript_store(), digest)
+    except ProcessingError as e:
+        raise PermanentJobError(str(e))
+    # The detail pages of the papers with this manuscript now show more; committed by Job.finish()
+    paper_ids = [paper_id for paper_id, in db.session.query(Paper.id).filter(Paper.mediaRef == digest)]
+    DataVersion.bump([PAPERS_VERSION], paper_ids)
+    fragment_cache().evict_papers(paper_ids)
+
+
+# Job kind: function called with the payload of the job as keyword arguments
+JOB_HANDLERS = {
+    MANUSCRIPT_JOB: run_manuscript_job,
+}
+
+
+class JobTimeout(Exception):
+    pass
+
+
+class WorkerCommand(Command):
+    """ Run the queued background jobs in a pool of processes, or print the queue statistics."""
+
+    option_list = (
+        Option('--processes', '-p', dest='processes', type=int, default=None,
+               help='Worker processes, WORKER_PROCESSES or one per core by default'),
+        Option('--poll', dest='poll', type=float, default=None,
+               help='Seconds an idle process waits before looking for jobs again'),
+        Option('--report', dest='report', type=int, default=60,
+               help='Seconds between queue depth and throughput lines'),
+        Option('--once', dest='once', action='store_true', default=False,
+               help='Stop when no job is due'),
+        Option('--stats', dest='stats', action='store_true', default=False,
+               help='Print the queue statistics of the last hour and exit'),
+    )
+
+    def run(self, processes, poll, report, once, stats):
+        if stats:
+            print(format_stats(Job.stats(datetime.datetime.utcnow() - datetime.timedelta(hours=1)), 3600))
+            return
+        config = current_app.config
+        pool = WorkerPool(current_app._get_current_object(),
+                          processes or config.get('WORKER_PROCESSES') or multiprocessing.cpu_count(),
+                          poll or config.get('WORKER_POLL_SECONDS', 1.0))
+        pool.run(report, once)
+
+
+def format_stats(stats, seconds):
+    by_status = stats['by_status']
+    line = '%d due (oldest %.0fs), %d running, %d waiting to retry; last %ds: %d done, %d failed, %.2f jobs/s' \
+        % (stats['depth'], stats['oldest'], by_status.get('running', 0),
+           by_status.get('queued', 0) - stats['depth'], seconds, stats['done'], stats['failed'],
+           (stats['done'] + stats['failed']) / float(seconds))
+    if stats['run_time'] is not None:
+        line += ', %.2fs per job' % stats['run_time']
+    return line
+
+
+class WorkerPool(object):
+    """ Processes running jobs from the jobs table, supervised by this one.
+
+    Every process claims one job at a time, so a slow job only holds up
+    its own process; the queue depth printed every report seconds tells
+    whether more processes are needed. A process that dies is replaced,
+    and its job is queued again once it has been running longer than its
+    timeout. SIGINT or SIGTERM stop the pool after the running jobs.
+    """
+
+    def __init__(self, app, processes, poll):
+        self.app = app
+        self.processes = processes
+        self.poll = poll
+        self._stop = multiprocessing.Event()
+        self._workers = {}
+
+    def run(self, report=60, once=False):
+        signal.signal(signal.SIGINT, lambda signum, frame: self._stop.set())
+        signal.signal(signal.SIGTERM, lambda signum, frame: self._stop.set())
+        self.app.logger.info('Starting %d worker processes', self.processes)
+        print('Starting %d worker processes' % self.processes)
+        reported = datetime.datetime.utcnow()
+        while True:
+            if not self._stop.is_set():
+                for number in range(self.processes):
+                    worker = self._workers.get(number)
+                    if worker is None:
+                        self._start(number, once)
+                    elif not worker.is_alive() and worker.exitcode != 0:
+                        print('Worker %d exited with %s, restarting it' % (number, worker.exitcode))
+                        self._start(number, once)
+            if not any(worker.is_alive() for worker in self._workers.values()):
+                break
+            self._stop.wait(1.0)
+            now = datetime.datetime.utcnow()
+            if (now - reported).total_seconds() >= report:
+                self._report(reported, now)
+                reported = now
+        self._report(reported, datetime.datetime.utcnow())
+
+    def _start(self, number, once):
+        # Children must open connections of their own
+        db.session.remove()
+        db.engine.dispose()
+        worker = multiprocessing.Process(target=work, name='worker-%d' % number,
+                                         args=(self.app, '%s:%d' % (socket.gethostname(), number),
+                                               self.poll, once, self._stop))
+        worker.start()
+        self._workers[number] = worker
+
+    def _report(self, since, now):
+        try:
+            requeued = Job.requeue_stale()
+            if requeued:
+                print('Queued %d jobs of stopped workers again' % requeued)
+            print(format_stats(Job.stats(since), max(1, int((now - since).total_seconds()))))
+            sys.stdout.flush()
+        finally:
+            db.session.remove()
+
+
+def work(app, name, poll, once, stop):
+    """ Run jobs until stop is set, or with once until no job is due """
+    # The supervisor handles both signals and sets stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    name = '%s:%d' % (name, os.getpid())
+    with app.app_context():
+        while not stop.is_set():
+            job = Job.claim(name)
+            if job is None:
+                if once:
+                    break
+                stop.wait(poll)
+                continue
+            run_job(job)
+            db.session.remove()
+
+
+def run_job(job):
+    """ Run the handler of job for at most job.timeout seconds and record the outcome """
+    handler = JOB_HANDLERS.get(job.kind)
+    if handler is None:
+        job.fail('No handler for %s jobs' % job.kind, retry=False)
+        return
+    payload = job.data
+    timeout = job.timeout
+
+    def timed_out(signum, frame):
+        raise JobTimeout('Timed out after %ds' % timeout)
+
+    started = time.time()
+    try:
+        previous = signal.signal(signal.SIGALRM, timed_out)
+        signal.alarm(timeout)
+        try:
+            handler(**payload)
+        finally:
+            signal.alarm(0)
+            signal.signal(signal.SIGALRM, previous)
+    except PermanentJobError as e:
+        db.session.rollback()
+        job.fail(str(e), retry=False)
+    except Exception as e:
+        db.session.rollback()
+        job.fail(''.join(traceback.format_exception_only(type(e), e)).strip())
+        current_app.logger.warning('Job %d (%s) failed on attempt %d of %d after %.1fs: %s', job.id, job.key,
+                                   job.attempts, job.max_attempts, time.time() - started, job.error)
+    else:
+        job.finish()
@@ -0,0 +1,47 @@
+import datetime
+import json
+
+from app import db
+
+# Kinds of change events, streamed to the chairs by /conference/events
+SCORE_SET = 'score_set'
+REVIEWERS_ASSIGNED = 'reviewers_assigned'
+STATUS_CHANGED = 'status_changed'
+
+
+# Define the change event model: the log every worker process reads live updates from
+class ChangeEvent(db.Model):
+    __tablename__ = 'change_events'
+    id = db.Column(db.Integer(), primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    paper_id = db.Column(db.Integer())
+    data = db.Column(db.Text(), nullable=False, server_default=u'{}')  # JSON object
+    created_at = db.Column(db.DateTime(), nullable=False, index=True)
+
+    @classmethod
+    def publish(cls, kind, paper_ids, **data):
+        """ Log a kind event with data for each of paper_ids.
+        Call it in the same transaction as the change, so that only committed changes are streamed.
+        """
+        now = datetime.datetime.utcnow()
+        payload = json.dumps(data, sort_keys=True)
+        rows = [{'kind': kind, 'paper_id': int(paper_id), 'data': payload, 'created_at': now}
+                for paper_id in paper_ids]
+        if rows:
+            db.session.execute(cls.__table__.insert(), rows)
+
+    @classmethod
+    def since(cls, last_id, limit=500):
+        """ Up to limit events after last_id as dicts, oldest first """
+        rows = db.session.query(cls.id, cls.kind, cls.paper_id, cls.data) \
+            .filter(cls.id > last_id).order_by(cls.id).limit(limit)
+        return [dict(json.loads(data), id=id, kind=kind, paper_id=paper_id) for id, kind, paper_id, data in rows]
+
+    @classmethod
+    def last_id(cls):
+        return db.session.query(db.func.coalesce(db.func.max(cls.id), 0)).scalar()
+
+    @classmethod
+    def prune(cls, before):
+        """ Delete the events created before the datetime before """
+        return cls.query.filter(cls.created_at < before).delete(synchronize_session=False)
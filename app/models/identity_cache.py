@@ -0,0 +1,90 @@
+import collections
+
+from flask import current_app, g
+from flask_user import SQLAlchemyAdapter
+
+from app import db
+from app.models.user_models import User
+
+# SQLite refuses statements with more than 999 bound parameters
+IN_CHUNK_SIZE = 500
+
+
+class IdentityCache(object):
+    """ Users loaded during one request, keyed by id.
+
+    Every user is loaded at most once per request, together with its roles
+    so that roles_accepted() does not lazy load them. hits counts lookups
+    served from the cache, i.e. queries saved.
+    """
+
+    def __init__(self):
+        self.users = {}
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+
+    def get_user(self, id):
+        if id is None:
+            return None
+        return self.get_users([id]).get(int(id))
+
+    def get_users(self, ids):
+        """ Map id -> User for ids, loading the missing ones with one query per chunk """
+        ids = set(int(id) for id in ids)
+        missing = [id for id in ids if id not in self.users]
+        self.hits += len(ids) - len(missing)
+        self.misses += len(missing)
+        for start in range(0, len(missing), IN_CHUNK_SIZE):
+            chunk = missing[start:start + IN_CHUNK_SIZE]
+            self.queries += 1
+            # subqueryload: a joinedload of the roles makes SQLite scan users_roles
+            for user in User.query.options(db.subqueryload(User.roles)).filter(User.id.in_(chunk)):
+                self.users[user.id] = user
+            for id in chunk:
+                self.users.setdefault(id, None)
+        return dict((id, self.users[id]) for id in ids if self.users[id] is not None)
+
+    def add(self, users):
+        """ Remember users that were loaded by another query """
+        for user in users:
+            self.users.setdefault(user.id, user)
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'queries': self.queries,
+                'queries_saved': self.hits}
+
+
+class CachedSQLAlchemyAdapter(SQLAlchemyAdapter):
+    """ Flask-User adapter that loads users through the identity cache """
+
+    def get_object(self, ObjectClass, id):
+        if ObjectClass is User:
+            return identity_cache().get_user(id)
+        return super(CachedSQLAlchemyAdapter, self).get_object(ObjectClass, id)
+
+
+def identity_cache():
+    """ The IdentityCache of the current app context """
+    cache = getattr(g, 'identity_cache', None)
+    if cache is None:
+        cache = g.identity_cache = IdentityCache()
+    return cache
+
+
+def identity_cache_stats(app=None):
+    """ Totals of the identity cache stats over all finished app contexts """
+    app = app or current_app
+    return dict(app.extensions['identity_cache_stats'])
+
+
+def init_identity_cache(app):
+    """ Add the stats of each app context's identity cache to the app totals """
+    app.extensions['identity_cache_stats'] = collections.Counter()
+
+    @app.teardown_appcontext
+    def collect_identity_cache_stats(exception=None):
+        cache = getattr(g, 'identity_cache', None)
+        if cache is not None:
+            app.extensions['identity_cache_stats'].update(cache.stats)
@@ -0,0 +1,148 @@
+import datetime
+import json
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+
+# Job states
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Seconds before the first retry of a failed job, doubled on every further attempt
+RETRY_DELAY = 30
+
+
+class PermanentJobError(Exception):
+    """ Raised by a job handler for a failure retrying will not fix: the job fails at once """
+
+
+# Define the job model: the queue of background work run by `manage.py worker`
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+    id = db.Column(db.Integer(), primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    key = db.Column(db.String(255), nullable=False, unique=True)  # one job per key, see enqueue()
+    payload = db.Column(db.Text(), nullable=False, server_default=u'{}')  # JSON object
+    status = db.Column(db.String(20), nullable=False, server_default=QUEUED)
+    attempts = db.Column(db.Integer(), nullable=False, server_default='0')
+    max_attempts = db.Column(db.Integer(), nullable=False, server_default='3')
+    timeout = db.Column(db.Integer(), nullable=False, server_default='300')  # seconds per attempt
+    run_after = db.Column(db.DateTime(), nullable=False)
+    locked_by = db.Column(db.String(100))
+    started_at = db.Column(db.DateTime())
+    finished_at = db.Column(db.DateTime())
+    created_at = db.Column(db.DateTime(), nullable=False)
+    error = db.Column(db.Text())
+
+    @classmethod
+    def enqueue(cls, kind, key, payload, max_attempts=3, timeout=300):
+        """ Queue a kind job unless a job with key exists already; True when queued.
+
+        The key makes enqueueing idempotent, e.g. 'manuscript:<sha256>' runs
+        once per file however often it is uploaded. Call it in the same
+        transaction as the change that needs the job.
+        """
+        if db.session.query(cls.id).filter(cls.key == key).first() is not None:
+            return False
+        now = datetime.datetime.utcnow()
+        try:
+            with db.session.begin_nested():
+                db.session.execute(cls.__table__.insert(), {
+                    'kind': kind, 'key': key, 'payload': json.dumps(payload, sort_keys=True),
+                    'status': QUEUED, 'attempts': 0, 'max_attempts': max_attempts, 'timeout': timeout,
+                    'run_after': now, 'created_at': now})
+        except IntegrityError:
+            # Queued by another request in the meantime
+            return False
+        return True
+
+    @classmethod
+    def claim(cls, worker):
+        """ Mark the oldest due job as running for worker and return it, None when there is none.
+
+        The UPDATE only succeeds while the job is still queued, so two
+        workers never run the same attempt.
+        """
+        now = datetime.datetime.utcnow()
+        while True:
+            job_id = db.session.query(cls.id) \
+                .filter(cls.status == QUEUED, cls.run_after <= now) \
+                .order_by(cls.run_after, cls.id).limit(1).scalar()
+            if job_id is None:
+                db.session.commit()
+                return None
+            claimed = cls.query.filter(cls.id == job_id, cls.status == QUEUED).update({
+                cls.status: RUNNING, cls.locked_by: worker, cls.started_at: now,
+                cls.attempts: cls.attempts + 1}, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return cls.query.get(job_id)
+
+    def finish(self):
+        self.status = DONE
+        self.finished_at = datetime.datetime.utcnow()
+        self.error = None
+        db.session.commit()
+
+    def fail(self, error, retry=True):
+        """ Record error and queue the job again after a delay, or give up after max_attempts """
+        now = datetime.datetime.utcnow()
+        self.error = error
+        self.finished_at = now
+        if retry and self.attempts < self.max_attempts:
+            self.status = QUEUED
+            self.run_after = now + datetime.timedelta(seconds=RETRY_DELAY * 2 ** (self.attempts - 1))
+        else:
+            self.status = FAILED
+        db.session.commit()
+
+    @property
+    def data(self):
+        return json.loads(self.payload)
+
+    @classmethod
+    def requeue_stale(cls, grace=60):
+        """ Queue again the running jobs whose worker died: those running past their timeout plus grace """
+        now = datetime.datetime.utcnow()
+        stale = [job for job in cls.query.filter(cls.status == RUNNING)
+                 if job.started_at + datetime.timedelta(seconds=job.timeout + grace) < now]
+        for job in stale:
+            job.fail('Worker stopped while running the job')
+        return len(stale)
+
+    @classmethod
+    def stats(cls, since):
+        """ Queue depth and throughput: {'depth', 'oldest', 'by_status', 'done', 'failed', 'run_time'}.
+
+        depth counts the due queued jobs and oldest is the age in seconds of
+        the oldest of them; done, failed and the mean run_time in seconds
+        are over the jobs finished after the datetime since.
+        """
+        now = datetime.datetime.utcnow()
+        by_status = dict(db.session.query(cls.status, db.func.count(cls.id)).group_by(cls.status))
+        depth, oldest = db.session.query(db.func.count(cls.id), db.func.min(cls.run_after)) \
+            .filter(cls.status == QUEUED, cls.run_after <= now).one()
+        finished = db.session.query(cls.status, cls.started_at, cls.finished_at) \
+            .filter(cls.finished_at >= since, cls.status.in_([DONE, FAILED]))
+        done = failed = 0
+        run_time = 0.0
+        for status, started_at, finished_at in finished:
+            if status == DONE:
+                done += 1
+                run_time += (finished_at - started_at).total_seconds()
+            else:
+                failed += 1
+        return {
+            'depth': depth,
+            'oldest': (now - oldest).total_seconds() if oldest else 0.0,
+            'by_status': by_status,
+            'done': done,
+            'failed': failed,
+            'run_time': run_time / done if done else None,
+        }
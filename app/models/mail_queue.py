@@ -0,0 +1,200 @@
+import atexit
+import logging
+import os
+import smtplib
+import socket
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from flask import current_app
+from flask_mail import BadHeaderError, Message
+
+from app import mail
+
+# Attempts to send a batch before its messages are given up
+SEND_ATTEMPTS = 3
+
+# Repeated errors remembered by a MailHandler before the stale ones are forgotten
+MAX_ERROR_KEYS = 1000
+
+
+class MailQueue(object):
+    """ Sends mail from a background thread, so a request never waits on the mail server.
+
+    send() only puts the message on a bounded queue; when it is full the
+    message is dropped and counted rather than blocking the caller. The
+    thread takes what is queued, at most batch_size messages, and sends
+    them over one SMTP connection, no faster than rate messages a minute.
+    A batch whose connection fails is retried SEND_ATTEMPTS times; a
+    message the server refuses for good is given up alone. The queue is per
+    process and is flushed for a few seconds when the process exits.
+    """
+
+    def __init__(self, app, rate=60, batch_size=50, queue_size=1000):
+        self.app = app
+        self.rate = rate
+        self.batch_size = batch_size
+        self.sent = 0
+        self.dropped = 0  # queue full
+        self.failed = 0  # refused with 5xx, or given up after SEND_ATTEMPTS
+        self.connections = 0
+        self._queue = queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._next_send = 0
+
+    def send(self, subject, recipients, body):
+        """ Queue a plain text message; False when it was dropped as the queue is full """
+        self._start()
+        try:
+            self._queue.put_nowait((subject, list(recipients), body))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        """ Wait up to timeout seconds until every queued message was sent or given up; True when done """
+        deadline = None if timeout is None else time.time() + timeout
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                done.wait(remaining)
+        return True
+
+    def _start(self):
+        # A forked worker does not inherit the thread of its parent
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='mail-queue')
+                self._thread.daemon = True
+                self._thread.start()
+                atexit.register(self.flush, 5)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            done = self.sent + self.failed
+            try:
+                with self.app.app_context():
+                    self._send_batch(batch)
+            except Exception:
+                # Warnings only: an error record would be mailed through this queue again
+                self.app.logger.warning('Mail queue failed', exc_info=True)
+                self.failed += len(batch) - (self.sent + self.failed - done)
+            for message in batch:
+                self._queue.task_done()
+
+    def _send_batch(self, batch):
+        """ Send batch over one connection, again on connection and 4xx errors; 5xx refusals fail one message """
+        pending = [Message(subject, recipients=recipients, body=body) for subject, recipients, body in batch]
+        for attempt in range(SEND_ATTEMPTS):
+            connection = mail.connect()
+            try:
+                with connection:
+                    self.connections += 1
+                    while pending:
+                        self._throttle()
+                        try:
+                            connection.send(pending[0])
+                            self.sent += 1
+                        except (smtplib.SMTPException, BadHeaderError) as e:
+                            if not is_permanent(e):
+                                raise
+                            # smtplib reset the transaction, the connection goes on with the next message
+                            self.failed += 1
+                            self.app.logger.warning('Mail to %s refused: %s', ', '.join(pending[0].send_to), e)
+                        pending.pop(0)
+                return
+            except (smtplib.SMTPException, socket.error) as e:
+                self.app.logger.warning('Sending mail failed (attempt %d of %d, %d messages left): %s',
+                                        attempt + 1, SEND_ATTEMPTS, len(pending), e)
+                time.sleep(2 ** attempt)
+        self.failed += len(pending)
+
+    def _throttle(self):
+        interval = 60.0 / self.rate
+        now = time.time()
+        if self._next_send > now:
+            time.sleep(self._next_send - now)
+            now = self._next_send
+        self._next_send = now + interval
+
+
+def is_permanent(error):
+    """ Whether sending a message failed for good: a 5xx reply or a message that cannot be sent """
+    if isinstance(error, BadHeaderError):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, message in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+class MailHandler(logging.Handler):
+    """ Mails log records to recipients through a MailQueue.
+
+    A record is formatted in the thread that logged it and then only
+    queued. Records from the same place with the same message and
+    exception type are mailed once per dedupe seconds; the next mail
+    after that says how many were left out.
+    """
+
+    def __init__(self, mail_queue, recipients, subject, dedupe=300):
+        logging.Handler.__init__(self)
+        self.mail_queue = mail_queue
+        self.recipients = recipients
+        self.subject = subject
+        self.dedupe = dedupe
+        self._seen = {}  # key -> [time mailed, records left out since]
+
+    def emit(self, record):
+        try:
+            now = time.time()
+            exc_type = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+            key = (record.name, record.pathname, record.lineno, str(record.msg), exc_type)
+            seen = self._seen.get(key)
+            if seen is not None and now - seen[0] < self.dedupe:
+                seen[1] += 1
+                return
+            if len(self._seen) >= MAX_ERROR_KEYS:
+                self._seen = dict((k, v) for k, v in self._seen.items() if now - v[0] < self.dedupe)
+            self._seen[key] = [now, 0]
+
+            body = self.format(record)
+            if seen is not None and seen[1]:
+                body += '\n\n%d more of this error were not mailed since %s' \
+                    % (seen[1], time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(seen[0])))
+            self.mail_queue.send(self.subject, self.recipients, body)
+        except Exception:
+            self.handleError(record)
+
+
+def init_mail_queue(app):
+    app.extensions['mail_queue'] = MailQueue(app,
+                                             rate=app.config.get('MAIL_RATE_PER_MINUTE', 60),
+                                             batch_size=app.config.get('MAIL_BATCH_SIZE', 50),
+                                             queue_size=app.config.get('MAIL_QUEUE_SIZE', 1000))
+
+
+def mail_queue():
+    """ The MailQueue of the current app """
+    return current_app.extensions['mail_queue']
@@ -0,0 +1,173 @@
+import datetime
+import os
+import threading
+import time
+from timeit import default_timer
+
+from flask import current_app, g, request
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+
+from app import db
+from app.models.job_models import Job, QUEUED
+from app.models.paper_models import Paper, PaperScores
+from app.models.perf_stats import LATENCY_BUCKETS
+
+PAPER_STATUS = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
+
+# Metric values are kept per process. When the prometheus_multiproc_dir
+# environment variable names a directory before the app is imported, every
+# worker writes its values there and /metrics adds up the files of all
+# workers; the directory must be emptied when the server starts.
+
+REQUESTS = Counter('http_requests_total', 'Requests served',
+                   ['endpoint', 'method', 'status'])
+LATENCY = Histogram('http_request_duration_seconds', 'Request latency',
+                    ['endpoint', 'status'], buckets=[bound / 1000.0 for bound in LATENCY_BUCKETS])
+CONNECTIONS_IN_USE = Gauge('db_connections_in_use', 'Database connections checked out of the pool',
+                           multiprocess_mode='livesum')
+CONNECTIONS_OPENED = Counter('db_connections_opened_total', 'Database connections opened')
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups; hit ratio = hit / (hit + miss)',
+                         ['cache', 'result'])
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    CONNECTIONS_IN_USE.inc()
+
+
+def _on_checkin(dbapi_connection, connection_record):
+    CONNECTIONS_IN_USE.dec()
+
+
+def _on_connect(dbapi_connection, connection_record):
+    CONNECTIONS_OPENED.inc()
+
+
+class DomainCollector(object):
+    """ Papers by status, review progress and background jobs, read from the database.
+
+    Computed by the worker answering the scrape and kept for ttl seconds,
+    so scrapes cost at most four small grouped queries per ttl.
+    """
+
+    def __init__(self, ttl=15):
+        self.ttl = ttl
+        self._values = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def values(self):
+        with self._lock:
+            if self._values is None or time.time() - self._loaded_at > self.ttl:
+                papers = dict((status, 0) for status in range(len(PAPER_STATUS)))
+                for status, count in db.session.query(Paper.status, db.func.count(Paper.id)) \
+                        .group_by(Paper.status):
+                    papers[status] = count
+                assigned, scored = db.session.query(
+                    db.func.coalesce(db.func.sum(PaperScores.reviewer_count), 0),
+                    db.func.coalesce(db.func.sum(PaperScores.score_count), 0)).one()
+                jobs = dict(db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status))
+                now = datetime.datetime.utcnow()
+                oldest = db.session.query(db.func.min(Job.run_after)) \
+                    .filter(Job.status == QUEUED, Job.run_after <= now).scalar()
+                self._values = {'papers': papers, 'outstanding': assigned - scored, 'submitted': scored,
+                                'jobs': jobs, 'jobs_wait': (now - oldest).total_seconds() if oldest else 0.0}
+                self._loaded_at = time.time()
+            return self._values
+
+    def collect(self):
+        values = self.values()
+        papers = GaugeMetricFamily('papers', 'Papers by status', labels=['status'])
+        for status, count in sorted(values['papers'].items()):
+            name = PAPER_STATUS[status] if 0 <= status < len(PAPER_STATUS) else str(status)
+            papers.add_metric([name], count)
+        yield papers
+        yield GaugeMetricFamily('reviews_outstanding', 'Assigned reviews without a score',
+                                value=values['outstanding'])
+        yield GaugeMetricFamily('reviews_submitted', 'Assigned reviews with a score', value=values['submitted'])
+        jobs = GaugeMetricFamily('jobs', 'Background jobs by status', labels=['status'])
+        for status, count in sorted(values['jobs'].items()):
+            jobs.add_metric([status], count)
+        yield jobs
+        yield GaugeMetricFamily('jobs_oldest_due_seconds', 'Seconds the oldest due job has waited for a worker',
+                                value=values['jobs_wait'])
+
+
+def cache_totals(app):
+    """ Map (cache, result) -> lookups so far in this process """
+    totals = {}
+    fragments = app.extensions.get('fragment_cache')
+    if fragments is not None:
+        totals[('fragment', 'hit')] = fragments.hits
+        totals[('fragment', 'miss')] = fragments.misses
+    identities = app.extensions.get('identity_cache_stats', {})
+    totals[('identity', 'hit')] = identities.get('hits', 0)
+    totals[('identity', 'miss')] = identities.get('misses', 0)
+    return totals
+
+
+def sync_cache_counters(app):
+    """ Add the cache lookups since the last call to CACHE_REQUESTS """
+    state = app.extensions['metrics']
+    with state['lock']:
+        for key, total in cache_totals(app).items():
+            delta = total - state['cache_seen'].get(key, 0)
+            if delta > 0:
+                CACHE_REQUESTS.labels(*key).inc(delta)
+            state['cache_seen'][key] = total
+
+
+def generate_metrics():
+    """ The Prometheus text exposition of all workers """
+    app = current_app._get_current_object()
+    sync_cache_counters(app)
+    registry = CollectorRegistry()
+    registry.register(app.extensions['metrics']['domain'])
+    if 'prometheus_multiproc_dir' in os.environ:
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY) + generate_latest(registry)
+
+
+def init_metrics(app):
+    """ Count the requests of app and its connection pool use for /metrics """
+    app.extensions['metrics'] = {
+        'lock': threading.Lock(),
+        'cache_seen': {},
+        'domain': DomainCollector(app.config.get('METRICS_DOMAIN_TTL', 15)),
+    }
+
+    # Pool events are global, listen once for all apps of the process
+    if not event.contains(Pool, 'checkout', _on_checkout):
+        event.listen(Pool, 'checkout', _on_checkout)
+        event.listen(Pool, 'checkin', _on_checkin)
+        event.listen(Pool, 'connect', _on_connect)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = default_timer()
+        # The previous requests' cache lookups, so every worker reports its own
+        sync_cache_counters(app)
+
+    @app.after_request
+    def observe_request_metrics(response):
+        observe_request(response.status_code)
+        return response
+
+    @app.teardown_request
+    def observe_failed_request(exception=None):
+        if exception is not None:
+            observe_request(500)
+
+
+def observe_request(status):
+    started = getattr(g, 'metrics_started', None)
+    if started is None:
+        return
+    g.metrics_started = None
+    endpoint = request.endpoint or 'unmatched'
+    REQUESTS.labels(endpoint, request.method, str(status)).inc()
+    LATENCY.labels(endpoint, str(status)).observe(default_timer() - started)
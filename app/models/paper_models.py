@@ -1,23 +1,220 @@
+import math
+
 from app import db
 
+# Papers with one of these statuses take no more scores: 2=Accepted, 3=Rejected
+DECIDED_STATUSES = (2, 3)
+
 
 # Define the Paper data model
 class Paper(db.Model):
     __tablename__ = 'papers'
     id = db.Column(db.Integer(), primary_key=True)
-    authors = db.Column(db.String(255), nullable=False, server_default=u'') #user_id in array
     title = db.Column(db.String(255), nullable=False, server_default=u'')
     abstract = db.Column(db.String(255), nullable=False, server_default=u'')
     mediaRef = db.Column(db.String(255), server_default=u'')
     mediaTyp = db.Column(db.String(255), server_default=u'')
-    status = db.Column(db.Integer(), server_default='0' ) #0=Submitted, 1=Under Review, 2=Accepted, 3=Rejected
+    status = db.Column(db.Integer(), server_default='0', index=True) #0=Submitted, 1=Under Review, 2=Accepted, 3=Rejected
     submittedBy = db.Column(db.Integer(), db.ForeignKey('users.id', ondelete='CASCADE'))
+    version = db.Column(db.Integer(), nullable=False, default=0, server_default='0')  # bumped on every change
+    updated_at = db.Column(db.DateTime())
+
+    # Relationships
+    author_links = db.relationship('PaperAuthors', order_by='PaperAuthors.position',
+                                   cascade='all, delete-orphan')
+    scores = db.relationship('PaperScores', uselist=False, cascade='all, delete-orphan')
+
+    def author_ids(self):
+        """ Author user ids in submission order """
+        return [link.user_id for link in self.author_links]
+
+
+# Define the Paper Authors association model
+class PaperAuthors(db.Model):
+    __tablename__ = 'paper_authors'
+    __table_args__ = (
+        db.Index('ix_paper_authors_paper_id_position', 'paper_id', 'position', unique=True),
+        db.Index('ix_paper_authors_user_id_paper_id', 'user_id', 'paper_id'),
+    )
+    id = db.Column(db.Integer(), primary_key=True)
+    paper_id = db.Column(db.Integer(), db.ForeignKey('papers.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer(), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    position = db.Column(db.Integer(), nullable=False, server_default='0')  # order of the author on the paper
 
 
 # Define the Paper Reviewers association model
 class PaperReviewers(db.Model):
     __tablename__ = 'paper_reviewers'
+    __table_args__ = (
+        db.Index('ix_paper_reviewers_paper_id_reviewer_id', 'paper_id', 'reviewer_id', unique=True),
+        db.Index('ix_paper_reviewers_reviewer_id', 'reviewer_id'),
+    )
     id = db.Column(db.Integer(), primary_key=True)
     paper_id = db.Column(db.Integer(), nullable=False)
     reviewer_id = db.Column(db.Integer(), nullable=False)
-    score = db.Column(db.Integer())
\ No newline at end of file
+    score = db.Column(db.Integer())
+
+    @classmethod
+    def set_score(cls, paper_id, reviewer_id, score):
+        """ Store the score of reviewer_id for paper_id with one conditional UPDATE.
+
+        Returns False, changing nothing, when reviewer_id is not assigned
+        to the paper or the paper has already been accepted or rejected.
+        """
+        open_paper = db.exists().where(Paper.id == cls.paper_id).where(Paper.status.notin_(DECIDED_STATUSES))
+        result = db.session.execute(cls.__table__.update()
+                                    .where(cls.paper_id == paper_id)
+                                    .where(cls.reviewer_id == reviewer_id)
+                                    .where(open_paper)
+                                    .values(score=score))
+        return result.rowcount > 0
+
+
+# Define the per-paper score summary, maintained on every review write
+class PaperScores(db.Model):
+    __tablename__ = 'paper_scores'
+    paper_id = db.Column(db.Integer(), db.ForeignKey('papers.id', ondelete='CASCADE'), primary_key=True)
+    reviewer_count = db.Column(db.Integer(), nullable=False, default=0, server_default='0')  # assigned reviewers
+    score_count = db.Column(db.Integer(), nullable=False, default=0, server_default='0')  # reviewers who gave a score
+    score_sum = db.Column(db.Integer(), nullable=False, default=0, server_default='0')
+    score_sq_sum = db.Column(db.Integer(), nullable=False, default=0, server_default='0')  # sum of squared scores
+    score_min = db.Column(db.Integer())
+    score_max = db.Column(db.Integer())
+
+    @property
+    def missing_count(self):
+        return self.reviewer_count - self.score_count
+
+    @property
+    def mean(self):
+        if not self.score_count:
+            return None
+        return float(self.score_sum) / self.score_count
+
+    @property
+    def stddev(self):
+        """ Population standard deviation of the received scores """
+        if not self.score_count:
+            return None
+        mean = self.mean
+        variance = float(self.score_sq_sum) / self.score_count - mean * mean
+        return math.sqrt(max(variance, 0.0))
+
+    @property
+    def completion(self):
+        """ Fraction of assigned reviewers who gave a score """
+        if not self.reviewer_count:
+            return None
+        return float(self.score_count) / self.reviewer_count
+
+    @classmethod
+    def apply(cls, paper_id, reviewers=0, added=(), removed=()):
+        """ Apply a paper_reviewers change to the summary of paper_id.
+
+        reviewers is the change in the number of assigned reviewers, added
+        the scores that now count and removed the scores that no longer
+        count (None entries are ignored). Must be called after the
+        paper_reviewers change itself.
+        """
+        db.session.flush()
+        added = [score for score in added if score is not None]
+        removed = [score for score in removed if score is not None]
+        values = {}
+        if reviewers:
+            values[cls.reviewer_count] = cls.reviewer_count + reviewers
+        if added or removed:
+            values[cls.score_count] = cls.score_count + len(added) - len(removed)
+            values[cls.score_sum] = cls.score_sum + sum(added) - sum(removed)
+            values[cls.score_sq_sum] = cls.score_sq_sum + sum(score * score for score in added) \
+                - sum(score * score for score in removed)
+        if removed:
+            # A bound may have left: take it again from this paper's rows only
+            values[cls.score_min] = db.select([db.func.min(PaperReviewers.score)]) \
+                .where(PaperReviewers.paper_id == paper_id).as_scalar()
+            values[cls.score_max] = db.select([db.func.max(PaperReviewers.score)]) \
+                .where(PaperReviewers.paper_id == paper_id).as_scalar()
+        elif added:
+            low, high = min(added), max(added)
+            values[cls.score_min] = db.case([(cls.score_min == None, low), (cls.score_min > low, low)],
+                                            else_=cls.score_min)
+            values[cls.score_max] = db.case([(cls.score_max == None, high), (cls.score_max < high, high)],
+                                            else_=cls.score_max)
+        if not values:
+            return
+
+        updated = cls.query.filter(cls.paper_id == paper_id).update(values, synchronize_session=False)
+        if not updated:
+            cls.refresh(paper_id)
+
+    @classmethod
+    def recount(cls, paper_ids):
+        """ Recompute the summaries of paper_ids (at most 500) from their paper_reviewers rows with one UPDATE """
+        paper_ids = set(int(paper_id) for paper_id in paper_ids)
+        if not paper_ids:
+            return
+        reviewers = PaperReviewers.__table__
+
+        def of_paper(aggregate):
+            return db.select([aggregate]).where(reviewers.c.paper_id == cls.paper_id).as_scalar()
+
+        updated = db.session.execute(cls.__table__.update().where(cls.paper_id.in_(paper_ids)).values(
+            reviewer_count=of_paper(db.func.count(reviewers.c.id)),
+            score_count=of_paper(db.func.count(reviewers.c.score)),
+            score_sum=of_paper(db.func.coalesce(db.func.sum(reviewers.c.score), 0)),
+            score_sq_sum=of_paper(db.func.coalesce(db.func.sum(reviewers.c.score * reviewers.c.score), 0)),
+            score_min=of_paper(db.func.min(reviewers.c.score)),
+            score_max=of_paper(db.func.max(reviewers.c.score)))).rowcount
+        if updated < len(paper_ids):
+            # Some papers have no summary row yet
+            cls.rebuild(paper_ids)
+
+    @classmethod
+    def refresh(cls, paper_id):
+        """ Rebuild the summary of one paper from its own paper_reviewers rows """
+        db.session.flush()
+        row = db.session.query(
+            db.func.count(PaperReviewers.id),
+            db.func.count(PaperReviewers.score),
+            db.func.coalesce(db.func.sum(PaperReviewers.score), 0),
+            db.func.coalesce(db.func.sum(PaperReviewers.score * PaperReviewers.score), 0),
+            db.func.min(PaperReviewers.score),
+            db.func.max(PaperReviewers.score)) \
+            .filter(PaperReviewers.paper_id == paper_id).one()
+        summary = db.session.merge(cls(paper_id=int(paper_id)))
+        summary.reviewer_count, summary.score_count, summary.score_sum, \
+            summary.score_sq_sum, summary.score_min, summary.score_max = row
+        return summary
+
+    @classmethod
+    def rebuild_all(cls):
+        """ Recreate every summary with one grouped INSERT ... SELECT """
+        db.session.query(cls).delete(synchronize_session=False)
+        db.session.execute(cls._insert_from_reviewers(cls._aggregates()))
+
+    @classmethod
+    def rebuild(cls, paper_ids):
+        """ Recreate the summaries of paper_ids (at most 500) with one grouped INSERT ... SELECT """
+        paper_ids = list(paper_ids)
+        if not paper_ids:
+            return
+        cls.query.filter(cls.paper_id.in_(paper_ids)).delete(synchronize_session=False)
+        db.session.execute(cls._insert_from_reviewers(cls._aggregates().where(Paper.id.in_(paper_ids))))
+
+    @classmethod
+    def _aggregates(cls):
+        return db.select([
+            Paper.id,
+            db.func.count(PaperReviewers.id),
+            db.func.count(PaperReviewers.score),
+            db.func.coalesce(db.func.sum(PaperReviewers.score), 0),
+            db.func.coalesce(db.func.sum(PaperReviewers.score * PaperReviewers.score), 0),
+            db.func.min(PaperReviewers.score),
+            db.func.max(PaperReviewers.score)]) \
+            .select_from(Paper.__table__.outerjoin(PaperReviewers.__table__, PaperReviewers.paper_id == Paper.id)) \
+            .group_by(Paper.id)
+
+    @classmethod
+    def _insert_from_reviewers(cls, aggregates):
+        return cls.__table__.insert().from_select(
+            ['paper_id', 'reviewer_count', 'score_count', 'score_sum', 'score_sq_sum', 'score_min', 'score_max'],
+            aggregates)
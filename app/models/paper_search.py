@@ -0,0 +1,122 @@
+import re
+
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.models.paper_models import Paper
+
+# Words of a query that are searched for, the rest is ignored
+MAX_SEARCH_TERMS = 10
+
+_WORDS = re.compile(r'\w+', re.UNICODE)
+
+# SQLite: an FTS5 table indexing the title and abstract of papers without a
+# copy of the text, kept up to date by triggers on every write to papers
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5("
+    "title, abstract, content='papers', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS papers_fts_insert AFTER INSERT ON papers BEGIN "
+    "INSERT INTO papers_fts(rowid, title, abstract) VALUES (new.id, new.title, new.abstract); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS papers_fts_delete AFTER DELETE ON papers BEGIN "
+    "INSERT INTO papers_fts(papers_fts, rowid, title, abstract) VALUES ('delete', old.id, old.title, old.abstract); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS papers_fts_update AFTER UPDATE OF title, abstract ON papers BEGIN "
+    "INSERT INTO papers_fts(papers_fts, rowid, title, abstract) VALUES ('delete', old.id, old.title, old.abstract); "
+    "INSERT INTO papers_fts(rowid, title, abstract) VALUES (new.id, new.title, new.abstract); "
+    "END",
+]
+SQLITE_SEARCH_DROP = [
+    "DROP TRIGGER IF EXISTS papers_fts_update",
+    "DROP TRIGGER IF EXISTS papers_fts_delete",
+    "DROP TRIGGER IF EXISTS papers_fts_insert",
+    "DROP TABLE IF EXISTS papers_fts",
+]
+
+# PostgreSQL: a GIN index on the weighted tsvector of each paper, which the
+# database keeps up to date itself. Queries must use the same expression.
+POSTGRESQL_DOCUMENT = "setweight(to_tsvector('english', coalesce(title, '')), 'A') || " \
+                      "setweight(to_tsvector('english', coalesce(abstract, '')), 'B')"
+POSTGRESQL_SEARCH_DDL = ["CREATE INDEX IF NOT EXISTS ix_papers_search ON papers USING gin ((%s))"
+                         % POSTGRESQL_DOCUMENT]
+POSTGRESQL_SEARCH_DROP = ["DROP INDEX IF EXISTS ix_papers_search"]
+
+
+def create_search_index(connection, rebuild=False):
+    """ Create the full-text index of papers; rebuild indexes the papers already there """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        try:
+            for statement in SQLITE_SEARCH_DDL:
+                connection.execute(statement)
+        except OperationalError:
+            # SQLite built without FTS5: search falls back to LIKE
+            return
+        if rebuild:
+            connection.execute("INSERT INTO papers_fts(papers_fts) VALUES ('rebuild')")
+    elif dialect == 'postgresql':
+        for statement in POSTGRESQL_SEARCH_DDL:
+            connection.execute(statement)
+
+
+def drop_search_index(connection):
+    statements = {'sqlite': SQLITE_SEARCH_DROP, 'postgresql': POSTGRESQL_SEARCH_DROP}
+    for statement in statements.get(connection.dialect.name, []):
+        connection.execute(statement)
+
+
+# Tables made by db.create_all() get the index too, e.g. by init_db and seed
+event.listen(Paper.__table__, 'after_create', lambda target, connection, **kw: create_search_index(connection))
+event.listen(Paper.__table__, 'before_drop', lambda target, connection, **kw: drop_search_index(connection))
+
+
+def search_backend():
+    """ 'fts5', 'postgresql' or 'like', looked up once per engine """
+    engine = db.engine
+    backend = getattr(engine, 'paper_search_backend', None)
+    if backend is None:
+        if engine.dialect.name == 'postgresql':
+            backend = 'postgresql'
+        elif engine.dialect.name == 'sqlite' and db.session.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'papers_fts'").scalar():
+            backend = 'fts5'
+        else:
+            backend = 'like'
+        engine.paper_search_backend = backend
+    return backend
+
+
+def search_terms(text):
+    """ The lower-case words of a search text, at most MAX_SEARCH_TERMS """
+    return [word.lower() for word in _WORDS.findall(text or u'')][:MAX_SEARCH_TERMS]
+
+
+def search_papers(terms):
+    """ (query of (Paper, rank) rows matching every term, rank column).
+
+    Lower ranks are better matches, so ordering by (rank, Paper.id)
+    lists the best first and can be keyset paginated. Title matches rank
+    above abstract matches; the last term also matches as a prefix.
+    """
+    backend = search_backend()
+    if backend == 'fts5':
+        # Quoted terms are plain words to FTS5, whatever the user typed
+        match = u' '.join(u'"%s"' % term for term in terms) + u'*'
+        fts = db.literal_column('papers_fts')
+        rank = db.func.bm25(fts, 10.0, 1.0)
+        query = db.session.query(Paper, rank.label('rank')) \
+            .join(db.table('papers_fts', db.column('rowid')), db.literal_column('papers_fts.rowid') == Paper.id) \
+            .filter(fts.match(match))
+    elif backend == 'postgresql':
+        tsquery = db.func.to_tsquery('english', u' & '.join(terms) + u':*')
+        rank = -db.func.ts_rank(db.literal_column(POSTGRESQL_DOCUMENT), tsquery)
+        query = db.session.query(Paper, rank.label('rank')) \
+            .filter(db.literal_column(POSTGRESQL_DOCUMENT).op('@@')(tsquery))
+    else:
+        rank = db.literal_column('0')
+        query = db.session.query(Paper, rank.label('rank'))
+        for term in terms:
+            pattern = u'%' + term + u'%'
+            query = query.filter(db.or_(Paper.title.ilike(pattern), Paper.abstract.ilike(pattern)))
+    return query, rank
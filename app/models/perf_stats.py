@@ -0,0 +1,193 @@
+import logging
+import re
+import threading
+from timeit import default_timer
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds in milliseconds of the request latency histogram buckets
+LATENCY_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float('inf')]
+
+# Statement shapes kept per endpoint, the slowest ones win
+MAX_STATEMENT_SHAPES = 50
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\bIN \((?:\?, )*\?\)', re.IGNORECASE)
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_statement(statement):
+    """ The shape of a statement: literals replaced by ? and IN lists collapsed """
+    statement = _SPACES.sub(' ', statement).strip()
+    statement = _LITERALS.sub('?', statement)
+    return _IN_LISTS.sub('IN (...)', statement)
+
+
+class EndpointStats(object):
+    """ Totals of the requests of one endpoint """
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0  # responses with a 5xx status or an exception
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.statements = 0
+        self.db_time = 0.0
+        self.shapes = {}  # normalized statement -> [count, total ms, max ms]
+
+    def add(self, latency, status, request_perf):
+        self.requests += 1
+        if status >= 500:
+            self.errors += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[i] += 1
+                break
+        self.statements += request_perf.statements
+        self.db_time += request_perf.db_time
+        for shape, duration in request_perf.timings:
+            entry = self.shapes.get(shape)
+            if entry is None:
+                entry = self.shapes[shape] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] = max(entry[2], duration)
+        if len(self.shapes) > MAX_STATEMENT_SHAPES:
+            # Keep the slowest shapes only
+            keep = sorted(self.shapes.items(), key=lambda item: -item[1][2])[:MAX_STATEMENT_SHAPES]
+            self.shapes = dict(keep)
+
+    def as_dict(self, slowest=5):
+        requests = self.requests or 1
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'latency_mean': self.latency_total / requests,
+            'latency_max': self.latency_max,
+            'histogram': [[('+Inf' if bound == float('inf') else bound), count]
+                          for bound, count in zip(LATENCY_BUCKETS, self.buckets)],
+            'statements_per_request': float(self.statements) / requests,
+            'db_time_per_request': self.db_time / requests,
+            'slowest_statements': [
+                {'statement': shape, 'count': count, 'total': total, 'max': longest}
+                for shape, (count, total, longest) in
+                sorted(self.shapes.items(), key=lambda item: -item[1][2])[:slowest]],
+        }
+
+
+class RequestPerf(object):
+    """ Statements of the current request; times are in milliseconds """
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.timings = []  # (normalized statement, ms)
+
+
+class PerfStats(object):
+    """ Per-endpoint request and SQL totals of this process """
+
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+        self._shapes = {}  # statement -> normalized statement
+
+    def normalize(self, statement):
+        shape = self._shapes.get(statement)
+        if shape is None:
+            if len(self._shapes) > 2000:
+                self._shapes.clear()
+            shape = self._shapes[statement] = normalize_statement(statement)
+        return shape
+
+    def record(self, endpoint, latency, status, request_perf):
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.add(latency, status, request_perf)
+
+    def snapshot(self, slowest=5):
+        """ (endpoint, stats) pairs as plain data, slowest endpoints first """
+        with self._lock:
+            return sorted(((endpoint, stats.as_dict(slowest)) for endpoint, stats in self.endpoints.items()),
+                          key=lambda item: -item[1]['latency_mean'])
+
+    def reset(self):
+        with self._lock:
+            self.endpoints.clear()
+
+
+def perf_stats(app=None):
+    """ The PerfStats of the app """
+    app = app or current_app
+    return app.extensions['perf_stats']
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['perf_started'] = default_timer()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('perf_started', None)
+    if started is None or not has_app_context():
+        return
+    request_perf = getattr(g, 'request_perf', None)
+    if request_perf is None:
+        return
+    duration = (default_timer() - started) * 1000.0
+    stats = current_app.extensions['perf_stats']
+    shape = stats.normalize(statement)
+    request_perf.statements += 1
+    request_perf.db_time += duration
+    request_perf.timings.append((shape, duration))
+    if duration >= current_app.config.get('SLOW_QUERY_MS', 100):
+        logger = current_app.extensions.get('slow_query_logger')
+        if logger is not None:
+            logger.warning('%.1fms %s %s', duration, request.endpoint, shape)
+
+
+def init_perf_stats(app):
+    """ Record statement counts, DB time and latency of every request of app """
+    app.extensions['perf_stats'] = PerfStats()
+    if not app.config.get('PERF_STATS_ENABLED', True):
+        return
+
+    # Engine events are global, listen once for all apps of the process
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    if app.config.get('SLOW_QUERY_LOG'):
+        handler = logging.FileHandler(app.config['SLOW_QUERY_LOG'])
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger = logging.getLogger('%s.slow_queries' % app.import_name)
+        logger.addHandler(handler)
+        logger.setLevel(logging.WARNING)
+        logger.propagate = False
+        app.extensions['slow_query_logger'] = logger
+
+    @app.before_request
+    def start_request_perf():
+        g.request_perf = RequestPerf()
+        g.request_perf_started = default_timer()
+
+    @app.after_request
+    def keep_response_status(response):
+        g.request_perf_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request_perf(exception=None):
+        request_perf = getattr(g, 'request_perf', None)
+        if request_perf is None:
+            return
+        g.request_perf = None
+        latency = (default_timer() - g.request_perf_started) * 1000.0
+        status = 500 if exception is not None else getattr(g, 'request_perf_status', 500)
+        app.extensions['perf_stats'].record(request.endpoint or 'unmatched', latency, status, request_perf)
@@ -8,6 +8,9 @@ from app import db
 # Define the User data model. Make sure to add the flask_user.UserMixin !!
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_last_name_id', 'last_name', 'id'),  # user lists are keyset paginated on it
+    )
     id = db.Column(db.Integer, primary_key=True)
 
     # User authentication information (required for Flask-User)
@@ -37,8 +40,11 @@ class Role(db.Model):
 # Define the UserRoles association model
 class UsersRoles(db.Model):
     __tablename__ = 'users_roles'
+    __table_args__ = (
+        db.Index('ix_users_roles_role_id_user_id', 'role_id', 'user_id'),
+    )
     id = db.Column(db.Integer(), primary_key=True)
-    user_id = db.Column(db.Integer(), db.ForeignKey('users.id', ondelete='CASCADE'))
+    user_id = db.Column(db.Integer(), db.ForeignKey('users.id', ondelete='CASCADE'), index=True)
     role_id = db.Column(db.Integer(), db.ForeignKey('roles.id', ondelete='CASCADE'))
 
 
@@ -0,0 +1,65 @@
+import datetime
+
+from sqlalchemy import event, select
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.paper_models import Paper
+
+# Names of the global change counters
+PAPERS_VERSION = 'papers'  # any paper, author, reviewer or score change
+USERS_VERSION = 'users'  # any user name, role or activation change
+
+# Counters created with the table, so bump() only ever updates them
+VERSION_NAMES = (PAPERS_VERSION, USERS_VERSION)
+
+
+# Define the data version model: change counters read by conditional GETs
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer(), nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime())
+
+    @classmethod
+    def bump(cls, names=(), paper_ids=()):
+        """ Increment the named global counters and the version of paper_ids.
+        Call it in the same transaction as the change it describes.
+        """
+        now = datetime.datetime.utcnow()
+        for name in names:
+            updated = cls.query.filter(cls.name == name) \
+                .update({cls.version: cls.version + 1, cls.updated_at: now}, synchronize_session=False)
+            if not updated:
+                # Not one of VERSION_NAMES: create it, or find it created by a concurrent transaction
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(cls.__table__.insert(), {'name': name, 'version': 0})
+                except IntegrityError:
+                    pass
+                cls.query.filter(cls.name == name) \
+                    .update({cls.version: cls.version + 1, cls.updated_at: now}, synchronize_session=False)
+        paper_ids = [int(paper_id) for paper_id in paper_ids]
+        if paper_ids:
+            Paper.query.filter(Paper.id.in_(paper_ids)) \
+                .update({Paper.version: Paper.version + 1, Paper.updated_at: now}, synchronize_session=False)
+
+    @classmethod
+    def current(cls, names):
+        """ Map name -> (version, updated_at) for names, with one query """
+        versions = dict((name, (0, None)) for name in names)
+        for row in cls.query.filter(cls.name.in_(names)):
+            versions[row.name] = (row.version, row.updated_at)
+        return versions
+
+
+def seed_versions(connection):
+    """ Insert the VERSION_NAMES counters that are missing, at version 0 """
+    table = DataVersion.__table__
+    existing = set(name for name, in connection.execute(select([table.c.name])))
+    rows = [{'name': name, 'version': 0} for name in VERSION_NAMES if name not in existing]
+    if rows:
+        connection.execute(table.insert(), rows)
+
+
+event.listen(DataVersion.__table__, 'after_create', lambda target, connection, **kw: seed_versions(connection))
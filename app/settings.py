@@ -14,6 +14,88 @@ CSRF_ENABLED = True
 # Flask-SQLAlchemy settings
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Connection pool, None keeps the SQLAlchemy defaults. SQLite only pools
+# connections when SQLALCHEMY_POOL_SIZE is set
+SQLALCHEMY_POOL_SIZE = None
+SQLALCHEMY_MAX_OVERFLOW = None
+SQLALCHEMY_POOL_TIMEOUT = None
+SQLALCHEMY_POOL_RECYCLE = None
+
+# Run on every new SQLite connection: WAL lets reads go on during a write,
+# busy_timeout (ms) makes writers wait for the lock instead of failing
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 268435456,
+}
+
+# Seconds a worker keeps its eligible reviewer list before reloading it, unless USERS_VERSION changes first
+REVIEWER_INDEX_TTL = 30
+
+# Mixed into every ETag; change it when templates change to invalidate browser copies
+ETAG_SALT = ''
+
+# Rendered paper rows kept per worker, plus an optional store shared by the
+# workers of one host: FRAGMENT_CACHE_BACKEND = 'disk' (a directory) or 'sqlite' (a file)
+FRAGMENT_CACHE_SIZE = 5000
+FRAGMENT_CACHE_BACKEND = None
+FRAGMENT_CACHE_PATH = None
+
+# Per-endpoint request and SQL statistics shown on /admin/perf. Statements
+# slower than SLOW_QUERY_MS milliseconds are written to SLOW_QUERY_LOG when set
+PERF_STATS_ENABLED = True
+SLOW_QUERY_LOG = None
+SLOW_QUERY_MS = 100
+
+# /metrics: bearer token required when set, seconds the paper and review gauges are kept
+METRICS_TOKEN = None
+METRICS_DOMAIN_TTL = 15
+
+# Live updates on /conference/events: seconds between reads of the change
+# log per worker, seconds a stream stays open before the browser reconnects,
+# streams per worker (answer 503 beyond) and seconds events are kept
+LIVE_UPDATES_POLL_SECONDS = 1.0
+LIVE_UPDATES_STREAM_SECONDS = 300
+LIVE_UPDATES_KEEPALIVE_SECONDS = 15
+LIVE_UPDATES_MAX_CLIENTS = 500
+LIVE_UPDATES_RETENTION_SECONDS = 3600
+
+# Manuscript PDFs: directory of the content-addressed store (None for
+# manuscripts/ next to the app) and the largest accepted upload. Set
+# MANUSCRIPT_ACCEL_PREFIX to an nginx internal location aliasing the store to
+# let nginx send the files
+MANUSCRIPT_PATH = None
+MANUSCRIPT_MAX_BYTES = 50 * 1024 * 1024
+MANUSCRIPT_ACCEL_PREFIX = None
+
+# `manage.py worker`: processes running background jobs (None for one per
+# core) and seconds an idle process waits before looking for jobs again
+WORKER_PROCESSES = None
+WORKER_POLL_SECONDS = 1.0
+
+# Flask-Mail: the mail server of error alerts to ADMINS and of the reviewer
+# and author notifications
+MAIL_SERVER = 'localhost'
+MAIL_PORT = 25
+MAIL_USE_TLS = False
+MAIL_USERNAME = None
+MAIL_PASSWORD = None
+MAIL_DEFAULT_SENDER = '"%s" <noreply@example.com>' % APP_NAME
+ADMINS = []
+
+# Mail is sent by a background thread per process: messages a minute, messages
+# per SMTP connection, messages waiting (dropped beyond), seconds a repeated
+# error is not mailed again, and whether reviewers and authors are notified
+MAIL_RATE_PER_MINUTE = 60
+MAIL_BATCH_SIZE = 50
+MAIL_QUEUE_SIZE = 1000
+MAIL_ERROR_DEDUPE_SECONDS = 300
+MAIL_NOTIFICATIONS = True
+
+# Processes hashing passwords in `manage.py import --users`, None for one per core
+PASSWORD_HASH_PROCESSES = None
+
 # Flask-User settings
 USER_APP_NAME = APP_NAME
 USER_ENABLE_CHANGE_PASSWORD = True  # Allow users to change their password
@@ -0,0 +1,40 @@
+// Follow the score, reviewer and status changes streamed by /conference/events.
+// refresh(paperIds) is called with the ids of the changed papers, at most once per second.
+function followPaperChanges(eventsUrl, paperIds, refresh) {
+    if (!window.EventSource) {
+        return null;
+    }
+    var changed = {}, timer = null;
+    var source = new EventSource(eventsUrl);
+
+    function onChange(e) {
+        var event = JSON.parse(e.data);
+        if (paperIds.indexOf(event.paper_id) < 0) {
+            return;
+        }
+        changed[event.paper_id] = true;
+        if (timer === null) {
+            timer = setTimeout(function() {
+                var ids = Object.keys(changed).map(Number);
+                changed = {};
+                timer = null;
+                refresh(ids);
+            }, 1000);
+        }
+    }
+
+    ['score_set', 'reviewers_assigned', 'status_changed'].forEach(function(kind) {
+        source.addEventListener(kind, onChange);
+    });
+    return source;
+}
+
+// Replace the elements matching the selectors with their current version from the page itself
+function reloadFragments(selectors) {
+    $.get(document.location.href, function(html) {
+        var page = $('<div>').html(html);
+        selectors.forEach(function(selector) {
+            $(selector).replaceWith(page.find(selector));
+        });
+    });
+}
@@ -0,0 +1,60 @@
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_user import current_user
+
+from app import db
+from app.models.paper_models import Paper
+from app.models.version_models import DataVersion
+
+
+def conditional_get(*names, **options):
+    """ Answer GET requests with 304 Not Modified while the data is unchanged.
+
+    The ETag is built from the named DataVersion counters, the version of
+    the paper given by the paper_id view argument (when paper=True), the
+    user, the endpoint and its query string. The view body only runs when
+    the client's copy is stale. Place it below the access decorators.
+    """
+    with_paper = options.get('paper', False)
+
+    def wrapper(func):
+        @wraps(func)
+        def decorated_view(*args, **kwargs):
+            # Flashed messages are shown once, so such pages must be rendered
+            if request.method != 'GET' or '_flashes' in session:
+                return func(*args, **kwargs)
+
+            versions = DataVersion.current(names)
+            parts = [(name, versions[name][0]) for name in names]
+            modified = [updated_at for version, updated_at in versions.values() if updated_at]
+            if with_paper:
+                row = db.session.query(Paper.version, Paper.updated_at) \
+                    .filter(Paper.id == kwargs.get('paper_id')).first()
+                if row is None:
+                    return func(*args, **kwargs)
+                parts.append(('paper', row.version))
+                if row.updated_at:
+                    modified.append(row.updated_at)
+
+            key = repr((current_app.config.get('ETAG_SALT', ''), request.endpoint,
+                        sorted(request.args.items(multi=True)), current_user.get_id(), parts))
+            etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+            last_modified = max(modified) if modified else None
+
+            # If-Modified-Since alone is not trusted: it cannot tell users apart
+            if etag in request.if_none_match:
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(func(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            # Per-user pages: let the browser keep them but always revalidate
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_view
+    return wrapper
@@ -0,0 +1,215 @@
+import collections
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+
+from flask import current_app
+from markupsafe import Markup
+
+
+class LRUFragmentStore(object):
+    """ In-process store keeping the max_entries most recently used fragments """
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._fragments = collections.OrderedDict()  # key -> (paper_id, html)
+        self._paper_keys = {}  # paper_id -> set of keys
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._fragments.get(key)
+            if entry is None:
+                return None
+            # Mark as most recently used
+            del self._fragments[key]
+            self._fragments[key] = entry
+            return entry[1]
+
+    def set(self, key, paper_id, html):
+        with self._lock:
+            if key in self._fragments:
+                del self._fragments[key]
+            self._fragments[key] = (paper_id, html)
+            self._paper_keys.setdefault(paper_id, set()).add(key)
+            while len(self._fragments) > self.max_entries:
+                old_key, (old_paper_id, _) = self._fragments.popitem(last=False)
+                self._discard_key(old_paper_id, old_key)
+
+    def evict_paper(self, paper_id):
+        with self._lock:
+            for key in self._paper_keys.pop(paper_id, ()):
+                self._fragments.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+            self._paper_keys.clear()
+
+    def __len__(self):
+        return len(self._fragments)
+
+    def _discard_key(self, paper_id, key):
+        keys = self._paper_keys.get(paper_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._paper_keys[paper_id]
+
+
+class DiskFragmentStore(object):
+    """ Store shared by the workers of one host: one file per fragment,
+    grouped in one directory per paper so a paper is evicted with one rmtree.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _file(self, key, paper_id):
+        return os.path.join(self.path, str(paper_id), hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def get(self, key, paper_id):
+        try:
+            with open(self._file(key, paper_id), 'rb') as f:
+                return f.read().decode('utf-8')
+        except (IOError, OSError):
+            return None
+
+    def set(self, key, paper_id, html):
+        filename = self._file(key, paper_id)
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                pass  # created by another worker
+        # Write to a temporary file first so readers never see partial fragments
+        temporary = None
+        try:
+            fd, temporary = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(html.encode('utf-8'))
+            os.rename(temporary, filename)
+        except (IOError, OSError):
+            # The paper was evicted meanwhile, or the disk is full: the page is served uncached
+            if temporary is not None:
+                try:
+                    os.remove(temporary)
+                except OSError:
+                    pass
+
+    def evict_paper(self, paper_id):
+        shutil.rmtree(os.path.join(self.path, str(paper_id)), ignore_errors=True)
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+
+
+class SQLiteFragmentStore(object):
+    """ Store shared by the workers of one host, kept in a SQLite file """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS fragments '
+            '(key TEXT PRIMARY KEY, paper_id INTEGER NOT NULL, html TEXT NOT NULL)')
+        self._connection().execute(
+            'CREATE INDEX IF NOT EXISTS ix_fragments_paper_id ON fragments (paper_id)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def get(self, key, paper_id):
+        row = self._connection().execute('SELECT html FROM fragments WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key, paper_id, html):
+        self._connection().execute('INSERT OR REPLACE INTO fragments (key, paper_id, html) VALUES (?, ?, ?)',
+                                   (key, paper_id, html))
+
+    def evict_paper(self, paper_id):
+        self._connection().execute('DELETE FROM fragments WHERE paper_id = ?', (paper_id,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM fragments')
+
+
+class FragmentCache(object):
+    """ Rendered HTML fragments of paper rows.
+
+    Keys contain the paper version, so a fragment is never served after
+    its paper changed, even from a worker that did not see the eviction.
+    The write endpoints still evict the fragments of the papers they
+    change so that stale entries do not take up room.
+    """
+
+    def __init__(self, local, shared=None):
+        self.local = local
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, paper_id):
+        html = self.local.get(key)
+        if html is None and self.shared is not None:
+            html = self.shared.get(key, paper_id)
+            if html is not None:
+                self.local.set(key, paper_id, html)
+        with self._lock:
+            if html is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return None if html is None else Markup(html)
+
+    def set(self, key, paper_id, html):
+        self.local.set(key, paper_id, html)
+        if self.shared is not None:
+            self.shared.set(key, paper_id, html)
+
+    def evict_papers(self, paper_ids):
+        for paper_id in paper_ids:
+            paper_id = int(paper_id)
+            self.local.evict_paper(paper_id)
+            if self.shared is not None:
+                self.shared.evict_paper(paper_id)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+
+def fragment_key(*parts):
+    return ':'.join(str(part) for part in parts)
+
+
+def fragment_cache():
+    """ The FragmentCache of the current app, created from its config """
+    cache = current_app.extensions.get('fragment_cache')
+    if cache is None:
+        config = current_app.config
+        local = LRUFragmentStore(config.get('FRAGMENT_CACHE_SIZE', 5000))
+        backend = config.get('FRAGMENT_CACHE_BACKEND')
+        shared = None
+        if backend == 'disk':
+            shared = DiskFragmentStore(config['FRAGMENT_CACHE_PATH'])
+        elif backend == 'sqlite':
+            shared = SQLiteFragmentStore(config['FRAGMENT_CACHE_PATH'])
+        elif backend:
+            raise ValueError('Unknown FRAGMENT_CACHE_BACKEND %r' % backend)
+        cache = current_app.extensions['fragment_cache'] = FragmentCache(local, shared)
+    return cache
@@ -0,0 +1,161 @@
+import collections
+import datetime
+import threading
+import time
+
+from flask import current_app, json
+
+from app import db
+from app.models.event_models import ChangeEvent
+
+# Events read by one poll; a bigger backlog is read by the next poll right away
+EVENTS_PER_POLL = 500
+
+
+class ChangeBroker(object):
+    """ Fans the change events of all workers out to the event streams of this worker.
+
+    Workers share nothing but the change_events table: one thread per
+    worker polls it every poll seconds while a stream is open, so the
+    database sees one small query per interval however many chairs
+    watch. Streams only wait on a Condition; under a gevent worker they
+    are greenlets, so idle streams cost no thread each.
+    """
+
+    def __init__(self, app, poll=1.0, buffer_size=1000, max_clients=500, retention=3600):
+        self.app = app
+        self.poll = poll
+        self.max_clients = max_clients
+        self.retention = retention
+        self._condition = threading.Condition()
+        self._events = collections.deque(maxlen=buffer_size)
+        self._last_id = None  # newest event read, None until the first poll
+        self._covered_from = None  # every event after this id up to _last_id is in _events
+        self._clients = 0
+        self._thread = None
+        self._pruned_at = 0
+
+    @property
+    def clients(self):
+        return self._clients
+
+    def full(self):
+        return self._clients >= self.max_clients
+
+    def subscribe(self):
+        with self._condition:
+            self._clients += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='change-broker')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unsubscribe(self):
+        with self._condition:
+            self._clients -= 1
+
+    def wait(self, last_id, timeout):
+        """ (new last_id, events after last_id), waiting up to timeout seconds for one """
+        deadline = time.time() + timeout
+        with self._condition:
+            while True:
+                if self._last_id is not None and last_id < self._covered_from:
+                    break
+                events = [event for event in self._events if event['id'] > last_id]
+                if events:
+                    return events[-1]['id'], events
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return last_id, []
+                self._condition.wait(remaining)
+            covered_from = self._covered_from
+
+        # The stream is behind the buffer, e.g. a reconnect after a while: read the log itself
+        with self.app.app_context():
+            try:
+                events = ChangeEvent.since(last_id)
+            finally:
+                db.session.remove()
+        if events:
+            return events[-1]['id'], events
+        return covered_from, []
+
+    def stream(self, last_id, paper_id=None, duration=300, keepalive=15):
+        """ Server-Sent Events of the changes after last_id, for duration seconds.
+
+        Only events of paper_id are sent when it is given. A comment line
+        every keepalive seconds keeps proxies from closing an idle stream;
+        after duration the browser reconnects with the Last-Event-ID.
+        """
+        self.subscribe()
+        try:
+            yield 'retry: 3000\n\n'
+            ends = time.time() + duration
+            while True:
+                last_id, events = self.wait(last_id, max(0.0, min(keepalive, ends - time.time())))
+                for event in events:
+                    if paper_id is None or event['paper_id'] == paper_id:
+                        yield format_event(event)
+                if time.time() >= ends:
+                    return
+                if not events:
+                    yield ': keepalive\n\n'
+        finally:
+            self.unsubscribe()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._clients <= 0:
+                    self._thread = None
+                    return
+                last_id = self._last_id
+            events = []
+            try:
+                with self.app.app_context():
+                    try:
+                        if last_id is None:
+                            last_id = ChangeEvent.last_id()
+                        else:
+                            events = ChangeEvent.since(last_id, EVENTS_PER_POLL)
+                        self._prune()
+                    finally:
+                        db.session.remove()
+            except Exception:
+                self.app.logger.exception('Reading the change events failed')
+            with self._condition:
+                if self._last_id is None:
+                    self._last_id = self._covered_from = last_id
+                for event in events:
+                    if len(self._events) == self._events.maxlen:
+                        self._covered_from = self._events[0]['id']
+                    self._events.append(event)
+                    self._last_id = event['id']
+                self._condition.notify_all()
+            if len(events) < EVENTS_PER_POLL:
+                time.sleep(self.poll)
+
+    def _prune(self):
+        # Every worker prunes now and then; deleting twice does no harm
+        if time.time() - self._pruned_at < 60:
+            return
+        self._pruned_at = time.time()
+        ChangeEvent.prune(datetime.datetime.utcnow() - datetime.timedelta(seconds=self.retention))
+        db.session.commit()
+
+
+def format_event(event):
+    return 'id: %d\nevent: %s\ndata: %s\n\n' % (event['id'], event['kind'], json.dumps(event, sort_keys=True))
+
+
+def change_broker():
+    """ The ChangeBroker of the current app """
+    broker = current_app.extensions.get('change_broker')
+    if broker is None:
+        config = current_app.config
+        broker = ChangeBroker(current_app._get_current_object(),
+                              poll=config.get('LIVE_UPDATES_POLL_SECONDS', 1.0),
+                              max_clients=config.get('LIVE_UPDATES_MAX_CLIENTS', 500),
+                              retention=config.get('LIVE_UPDATES_RETENTION_SECONDS', 3600))
+        current_app.extensions['change_broker'] = broker
+    return broker
@@ -0,0 +1,256 @@
+import errno
+import hashlib
+import json
+import os
+import re
+import subprocess
+import tempfile
+
+from flask import current_app, request
+from werkzeug.wsgi import wrap_file
+
+# Bytes read from the request or a file at a time
+CHUNK_SIZE = 64 * 1024
+
+PDF_MAGIC = b'%PDF-'
+
+# Kind of the job that processes an uploaded manuscript, see process_manuscript
+MANUSCRIPT_JOB = 'manuscript'
+
+# Width in pixels of the first page preview
+PREVIEW_WIDTH = 800
+
+_PAGES = re.compile(br'^Pages:\s+(\d+)', re.MULTILINE)
+
+
+class ManuscriptRejected(ValueError):
+    """ An upload that was not stored; status is the HTTP status to answer with """
+
+    def __init__(self, status, message):
+        ValueError.__init__(self, message)
+        self.status = status
+
+
+class ManuscriptStore(object):
+    """ Manuscripts on local disk, stored once per content under their SHA-256.
+
+    A file lives at <root>/<2 hex>/<2 hex>/<sha256>. Uploads are written
+    to <root>/tmp while they are hashed and renamed into place when
+    complete, so a stored file is never partial and the same PDF uploaded
+    twice takes the space of one.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, digest, suffix=''):
+        """ The file of digest, or with suffix one derived from it, e.g. '.png' for its preview """
+        return os.path.join(self.root, digest[:2], digest[2:4], digest + suffix)
+
+    def info(self, digest):
+        """ What process_manuscript found out about digest, None until it ran """
+        try:
+            with open(self.path(digest, '.json')) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def save(self, stream, max_bytes):
+        """ Copy a PDF from stream into the store, CHUNK_SIZE bytes at a time; (sha256 hex, size) """
+        temp_dir = os.path.join(self.root, 'tmp')
+        _makedirs(temp_dir)
+        fd, temp_path = tempfile.mkstemp(dir=temp_dir)
+        try:
+            sha256 = hashlib.sha256()
+            size = 0
+            head = b''
+            with os.fdopen(fd, 'wb') as f:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ManuscriptRejected(413, 'Manuscripts are limited to %d MB' % (max_bytes // 2 ** 20))
+                    if len(head) < len(PDF_MAGIC):
+                        head += chunk[:len(PDF_MAGIC) - len(head)]
+                        if not PDF_MAGIC.startswith(head):
+                            raise ManuscriptRejected(415, 'Manuscripts must be PDF files')
+                    sha256.update(chunk)
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            if not head.startswith(PDF_MAGIC):
+                raise ManuscriptRejected(415, 'Manuscripts must be PDF files')
+
+            digest = sha256.hexdigest()
+            path = self.path(digest)
+            if os.path.exists(path):
+                os.remove(temp_path)
+            else:
+                _makedirs(os.path.dirname(path))
+                os.rename(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return digest, size
+
+
+class ProcessingError(Exception):
+    """ A manuscript that cannot be processed; retrying will not help """
+
+
+def process_manuscript(store, digest):
+    """ Extract the text, page count and first page preview of a stored manuscript.
+
+    Writes <sha256>.txt and <sha256>.png next to the file with the poppler
+    tools and <sha256>.json last, so a manuscript whose .json exists is
+    done and processing it again does nothing. Returns the .json content.
+    """
+    info = store.info(digest)
+    if info is not None:
+        return info
+    path = store.path(digest)
+    if not os.path.exists(path):
+        raise ProcessingError('No manuscript %s' % digest)
+
+    output = _run_tool(['pdfinfo', path])
+    match = _PAGES.search(output)
+    if match is None:
+        raise ProcessingError('pdfinfo found no pages in %s' % digest)
+    _run_tool(['pdftotext', '-enc', 'UTF-8', path, path + '.txt.tmp'])
+    os.rename(path + '.txt.tmp', store.path(digest, '.txt'))
+    # pdftoppm appends .png to the name it is given
+    _run_tool(['pdftoppm', '-png', '-singlefile', '-f', '1', '-l', '1', '-scale-to-x', str(PREVIEW_WIDTH),
+               '-scale-to-y', '-1', path, path + '.tmp'])
+    os.rename(path + '.tmp.png', store.path(digest, '.png'))
+
+    info = {'pages': int(match.group(1)), 'text_bytes': os.path.getsize(store.path(digest, '.txt'))}
+    with open(path + '.json.tmp', 'w') as f:
+        json.dump(info, f)
+    os.rename(path + '.json.tmp', store.path(digest, '.json'))
+    return info
+
+
+def _run_tool(args):
+    """ The output of a command; the command is killed when the caller is interrupted, e.g. by a job timeout """
+    try:
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError as e:
+        if e.errno == errno.ENOENT:
+            raise ProcessingError('%s is not installed' % args[0])
+        raise
+    try:
+        output, errors = process.communicate()
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    if process.returncode != 0:
+        # A damaged PDF fails the same way every time
+        raise ProcessingError('%s failed: %s' % (args[0], errors.decode('utf-8', 'replace').strip()[:500]))
+    return output
+
+
+def manuscript_excerpt(store, digest, length=1000):
+    """ The first length characters of the text of digest, None until it was extracted """
+    try:
+        with open(store.path(digest, '.txt'), 'rb') as f:
+            text = f.read(length * 4).decode('utf-8', 'ignore')
+    except (IOError, OSError):
+        return None
+    return u' '.join(text.split())[:length]
+
+
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def manuscript_store():
+    """ The ManuscriptStore of the current app, in MANUSCRIPT_PATH or manuscripts/ next to the app """
+    store = current_app.extensions.get('manuscript_store')
+    if store is None:
+        root = current_app.config.get('MANUSCRIPT_PATH') or \
+            os.path.join(os.path.dirname(current_app.root_path), 'manuscripts')
+        store = current_app.extensions['manuscript_store'] = ManuscriptStore(root)
+    return store
+
+
+def send_manuscript(digest, mimetype, filename, suffix=''):
+    """ The stored file digest as a response, honouring If-None-Match and a single Range.
+
+    The content of a digest never changes, so a URL naming it with
+    ?v=<digest> may be kept by browsers for a year; without it the browser
+    revalidates, as the paper may get a new manuscript. The file goes out through the server's wsgi.file_wrapper, which
+    gunicorn sends with sendfile(); gunicorn stops after Content-Length
+    bytes from the current offset, so a range is sent the same way. Other
+    servers get a range read in chunks. With MANUSCRIPT_ACCEL_PREFIX set,
+    nginx sends the file itself through X-Accel-Redirect. With suffix the
+    file derived from digest is sent instead, e.g. '.png' for the preview.
+    """
+    etag = digest + suffix
+    headers = {
+        'Cache-Control': 'private, max-age=31536000, immutable' if request.args.get('v') == digest
+                         else 'private, no-cache',
+        'Accept-Ranges': 'bytes',
+        'Content-Disposition': 'inline; filename="%s"' % filename,
+    }
+    response_class = current_app.response_class
+    if etag in request.if_none_match:
+        response = response_class(status=304, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    store = manuscript_store()
+    accel_prefix = current_app.config.get('MANUSCRIPT_ACCEL_PREFIX')
+    if accel_prefix:
+        headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + \
+            os.path.relpath(store.path(digest, suffix), store.root).replace(os.sep, '/')
+        response = response_class(mimetype=mimetype, headers=headers)
+        response.set_etag(etag)
+        return response
+
+    path = store.path(digest, suffix)
+    size = os.path.getsize(path)
+    start, stop, status = 0, size, 200
+    # If-Range: only send a part of the file the client already has
+    if_range = request.headers.get('If-Range')
+    # Several ranges in one request are answered with the whole file
+    if request.range is not None and len(request.range.ranges) == 1 and \
+            (not if_range or if_range.strip('"') == etag):
+        bounds = request.range.range_for_length(size)
+        if bounds is None:
+            headers['Content-Range'] = 'bytes */%d' % size
+            return response_class(status=416, headers=headers)
+        start, stop = bounds
+        status = 206
+        headers['Content-Range'] = 'bytes %d-%d/%d' % (start, stop - 1, size)
+
+    f = open(path, 'rb')
+    f.seek(start)
+    file_wrapper = request.environ.get('wsgi.file_wrapper')
+    if stop == size or getattr(file_wrapper, '__module__', '').startswith('gunicorn.'):
+        body = wrap_file(request.environ, f, CHUNK_SIZE)
+    else:
+        body = _read_range(f, stop - start)
+    response = response_class(body, status=status, mimetype=mimetype, headers=headers, direct_passthrough=True)
+    response.content_length = stop - start
+    response.set_etag(etag)
+    return response
+
+
+def _read_range(f, length):
+    try:
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
@@ -1,18 +1,41 @@
 from flask import Blueprint, redirect, render_template
 from flask import request, url_for
 from flask_user import current_user, login_required, roles_accepted
+from prometheus_client import CONTENT_TYPE_LATEST
 from flask import jsonify, json
+from flask import current_app, Markup, Response, stream_with_context
 
 from app import db
-from app.models.paper_models import Paper, PaperReviewers
+from app.commands.assign_reviewers import active_reviewer_ids, auto_assign_reviewers
+from app.commands.export import EXPORT_FORMATS, export_lines
+from app.commands.provision_users import PasswordHasher, provision_users
+from app.models.event_models import ChangeEvent, REVIEWERS_ASSIGNED, STATUS_CHANGED
+from app.models.identity_cache import identity_cache
+from app.models.job_models import Job
+from app.models.metrics import generate_metrics
+from app.models.perf_stats import perf_stats, LATENCY_BUCKETS
+from app.models.version_models import DataVersion, PAPERS_VERSION, USERS_VERSION
+from app.models.paper_search import search_papers, search_terms
+from app.models.paper_models import DECIDED_STATUSES, Paper, PaperAuthors, PaperReviewers, PaperScores
 from app.models.user_models import UserProfileForm, User, Role, UsersRoles
+from app.views.conditional import conditional_get
+from app.views.fragment_cache import fragment_cache, fragment_key
+from app.views.live_updates import change_broker
+from app.views.manuscripts import MANUSCRIPT_JOB, ManuscriptRejected, manuscript_excerpt, manuscript_store, \
+    send_manuscript
+from app.views.notifications import notify_authors_decided, notify_reviewers_assigned
+from app.views.pagination import keyset_paginate, per_page_arg
+from app.views.resolvers import NameResolver, reviewers_by_paper
+from app.views.review_scores import store_review_scores
+from app.views.reviewer_index import reviewer_index
 
-from phpserialize import *
-import io
+main_blueprint = Blueprint('main', __name__, template_folder='templates')
 
-from phpserialize import serialize
+# Scores accepted by one batch request, so the summaries are recounted in one IN list
+MAX_SCORES_PER_REQUEST = 500
 
-main_blueprint = Blueprint('main', __name__, template_folder='templates')
+# Users created by one bulk request; their passwords are hashed in the web worker, one after the other
+MAX_USERS_PER_REQUEST = 50
 
 
 # The Home page is accessible to anyone
@@ -43,7 +66,9 @@ def user_profile_page():
         form.populate_obj(current_user)
 
         # Save user_profile
+        DataVersion.bump([USERS_VERSION])
         db.session.commit()
+        reviewer_index().invalidate()
 
         # Redirect to home page
         return redirect(url_for('main.home_page'))
@@ -56,69 +81,77 @@ def user_profile_page():
 @main_blueprint.route('/conference/reviewer')
 @roles_accepted('admin')  # Limits access to users with the 'admin' role
 def assignment_of_reviewers():
-    users = User.query.order_by(User.id).all()
+    page = paginate_users(User.query.options(db.subqueryload(User.roles)))
+    identity_cache().add(page.items)
     return render_template('conference/assignment_of_reviewers.html', 
-                        users=users)
+                        users=page.items,
+                        page=page)
 
 
 @main_blueprint.route('/conference/paper')
 @roles_accepted('admin')  # Limits access to users with the 'admin' role
 def admin_list_of_papers():
-    papers = Paper.query.order_by(Paper.id).all()
-    paper_reviewer = []
-    paper_score = {}
-    paper_authors = []
-    for key,paper in enumerate(papers):
-        paper_score[key] = None
-        # get paper reviewer with paper.id
-        paper_reviewers = PaperReviewers.query.filter(PaperReviewers.paper_id == paper.id).all()
-        if paper_reviewers:
-            reviewer_names = []
-            score = None
-            for paperc in paper_reviewers:
-                # get user with reviewe_id
-                user = User.query.filter(User.id == paperc.reviewer_id).first()
-                reviewer_names.append(str(user.first_name))
-                if paperc.score:
-                    if(score == None):
-                        score=0 + int(paperc.score)
-                    else:
-                        score=score + int(paperc.score)
-            
-            paper_score[key] = score
-            # push to paper reviewer
-            paper_reviewer.append(', '.join(reviewer_names))
-
-        stream = io.BytesIO(paper.authors)
-        lists = dict_to_list(load(stream))
-        author_names = []
-        for author_id in lists:
-            # Find user where id = author_id
-            user = User.query.filter(User.id == author_id).first()
-            if user.id == current_user.id:
-                author_names.append('You')
-            else:
-                # Convert unicode firstname to str
-                # Push to author_names
-                author_names.append(str(user.first_name))
-        # Convert array to string separated with comma
-        # Push to paper_authors
-        paper_authors.append(', '.join(author_names))
+    filters = paper_filter_args()
+    page = paginate_papers(Paper.query.options(db.joinedload(Paper.scores)), filters)
+    rows = cached_paper_rows('admin_paper_row', page.items, render_admin_paper_rows)
     # List of status after index
     paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
 
     return render_template('conference/admin_list_of_papers.html',
-            papers=papers, 
-            paper_status=paper_status,
-            paper_authors=paper_authors,
-            paper_reviewer=paper_reviewer,
-            paper_score=paper_score)
+            rows=rows,
+            page=page,
+            filters=filters,
+            paper_status=paper_status)
+
+
+def render_admin_paper_rows(papers):
+    """ Render the admin list rows of papers, keyed by paper id """
+    # Collect every author and reviewer id of the rows, then load them at once
+    resolver = NameResolver()
+    paper_ids = [paper.id for paper in papers]
+    paper_reviewers = reviewers_by_paper(paper_ids)
+    resolver.add_paper_authors(paper_ids)
+    for paper in papers:
+        resolver.add_users(paperc.reviewer_id for paperc in paper_reviewers.get(paper.id, []))
+    resolver.resolve()
+
+    # List of status after index
+    paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
+    template = current_app.jinja_env.get_template('conference/admin_paper_row.html')
+    rows = {}
+    for paper in papers:
+        # Score total comes from the maintained per-paper summary
+        summary = paper.scores
+        score = summary.score_sum if summary and summary.score_count else None
+        reviewer_names = []
+        for paperc in paper_reviewers.get(paper.id, []):
+            user = resolver.user(paperc.reviewer_id)
+            if user:
+                reviewer_names.append(str(user.first_name))
+        rows[paper.id] = template.render(
+            paper=paper,
+            authors=resolver.first_names(resolver.authors(paper.id), current_user.id),
+            reviewers=', '.join(reviewer_names),
+            score=score,
+            paper_status=paper_status)
+    return rows
 
 
 @main_blueprint.route('/conference/overview')
 @roles_accepted('admin')  # Limits access to users with the 'admin' role
 def overview_scores():
-    return render_template('conference/overview_scores.html')
+    # One summary row per paper, no scan of paper_reviewers
+    filters = paper_filter_args()
+    query = db.session.query(Paper, PaperScores).outerjoin(PaperScores, PaperScores.paper_id == Paper.id)
+    page = paginate_papers(query, filters, key=lambda row: [row[0].id])
+
+    # List of status after index
+    paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
+    return render_template('conference/overview_scores.html',
+            rows=page.items,
+            page=page,
+            filters=filters,
+            paper_status=paper_status)
 
 
 @main_blueprint.route('/conference/paper/detail/<paper_id>')
@@ -126,45 +159,21 @@ def overview_scores():
 def conf_paper_detail(paper_id):
     # Populate by paper by paper_id
     paper = Paper.query.filter(Paper.id == paper_id).first()
-    # Convert paper author from binary to list
-    stream = io.BytesIO(paper.authors)
-    lists = dict_to_list(load(stream))
-
-    # Convert list authors to string separated with comma
-    authorList= ','.join(str(v) for v in lists)
+    # Author ids in submission order
+    lists = paper.author_ids()
 
     # User list for multiple select to assign reviewer
-    # Prevent author to set as reviewer
-    # Do -> Get all users where id not in author list
-    users_ = User.query.filter(User.id.notin_(authorList))
-    # Sort only user with role = reviewer and not admin
-    users = []
-    for user in users_:
-        userRole = UsersRoles.query.filter(UsersRoles.user_id == user.id).first()
-        if(userRole and userRole.user_id != 1):
-            userc = User.query.filter(User.id == userRole.user_id).first()
-            users.append(userc)
-
-    # Populate author names
-    author_names = []
-    for author_id in lists:
-        # Find user where id = author_id
-        user = User.query.filter(User.id == author_id).first()
-        # Convert unicode firstname to str
-        # Push to author_names
-        author_names.append(str(user.first_name) +' '+ str(user.last_name))
-    author_names = ', '.join(author_names)
-
-    # Populate current reviewer names
-    reviewer_names = []
+    # Eligible reviewers minus the authors of the paper
+    users = reviewer_index().candidates(lists)
+
+    # Populate author and current reviewer names
     paper_reviewers = PaperReviewers.query.filter(PaperReviewers.paper_id == paper_id).all()
-    for reviewers in paper_reviewers:
-        # Find user where id = author_id
-        user = User.query.filter(User.id == reviewers.reviewer_id).first()
-        # Convert unicode firstname to str
-        # Push to author_names
-        reviewer_names.append(str(user.first_name) +' '+ str(user.last_name) +' ('+ str(reviewers.score)+')')
-    reviewer_names = ', '.join(reviewer_names)
+    resolver = NameResolver()
+    resolver.add_users(lists)
+    resolver.add_users(reviewers.reviewer_id for reviewers in paper_reviewers)
+    resolver.resolve()
+    author_names = resolver.full_names(lists)
+    reviewer_names = resolver.reviewer_scores(paper_reviewers)
 
     # List of status after index
     paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
@@ -174,7 +183,34 @@ def conf_paper_detail(paper_id):
         author_names=author_names,
         reviewer_names=reviewer_names,
         paper_status=paper_status,
-        users=users)
+        users=users,
+        manuscript=manuscript_details(paper))
+
+
+# Live updates for the chair pages: score, reviewer and status changes as Server-Sent Events
+@main_blueprint.route('/conference/events')
+@roles_accepted('admin')
+def conf_events():
+    broker = change_broker()
+    if broker.full():
+        return Response('Too many event streams\n', status=503, mimetype='text/plain', headers={'Retry-After': '30'})
+
+    config = current_app.config
+    duration = config.get('LIVE_UPDATES_STREAM_SECONDS', 300)
+    duration = max(0, min(request.args.get('timeout', duration, type=float), duration))
+    # A reconnecting EventSource sends the id of the last event it received
+    last_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        last_id = ChangeEvent.last_id()
+    # The stream waits without holding a database connection
+    db.session.remove()
+
+    events = broker.stream(last_id, request.args.get('paper_id', type=int), duration,
+                           config.get('LIVE_UPDATES_KEEPALIVE_SECONDS', 15))
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 # Paper action by conference chair
@@ -196,36 +232,77 @@ def conf_assign_reviewer():
     reviewer_names = []
 
     if(reviewers):
-        # Check if paper reviewer with paper_id and reviewer_id already exist
-        # If not exist, create new paper reviewer
-        # if already exist skip 
-        for reviewer_id in reviewers:
-            paper_reviewer = PaperReviewers.query.filter(PaperReviewers.reviewer_id == reviewer_id, PaperReviewers.paper_id == paper_id).first()
-            if not paper_reviewer:
-                assign_reviewers_func(paper_id,reviewer_id)
-                db.session.commit()
-
-        # get paper_reviewer by paper_id
-        # remove all paper_reviewer where reviewer_id not in reviewers
-        new_reviewer_lists= ','.join(str(v) for v in reviewers)
-        paper_reviewers = PaperReviewers.query.filter(PaperReviewers.reviewer_id.notin_(new_reviewer_lists), PaperReviewers.paper_id == paper_id).all()
-        for paper_reviewer in paper_reviewers:
-            db.session.delete(paper_reviewer)
-            db.session.commit()
+        paper_id = int(paper_id)
+        requested = set(int(reviewer_id) for reviewer_id in reviewers)
+
+        # Diff the current assignment against the requested reviewer set
+        current = dict(db.session.query(PaperReviewers.reviewer_id, PaperReviewers.score)
+                       .filter(PaperReviewers.paper_id == paper_id))
+        added = requested.difference(current)
+        removed = set(current).difference(requested)
+
+        # Apply inserts and deletes as bulk statements in one transaction
+        if added:
+            db.session.execute(PaperReviewers.__table__.insert(),
+                               [{'paper_id': paper_id, 'reviewer_id': reviewer_id} for reviewer_id in sorted(added)])
+        if removed:
+            PaperReviewers.query.filter(PaperReviewers.paper_id == paper_id,
+                                        PaperReviewers.reviewer_id.in_(removed)).delete(synchronize_session=False)
+        if added or removed:
+            PaperScores.apply(paper_id, reviewers=len(added) - len(removed),
+                              removed=[current[reviewer_id] for reviewer_id in removed])
+            DataVersion.bump([PAPERS_VERSION], [paper_id])
+            ChangeEvent.publish(REVIEWERS_ASSIGNED, [paper_id], reviewers=sorted(requested))
+        db.session.commit()
+        fragment_cache().evict_papers([paper_id])
+        notify_reviewers_assigned(paper_id, added)
 
-        # Populate current reviewer names
-        paper_reviewers = PaperReviewers.query.filter(PaperReviewers.paper_id == paper_id).all()
-        for reviewers in paper_reviewers:
-            # Find user where id = author_id
-            user = User.query.filter(User.id == reviewers.reviewer_id).first()
-            # Convert unicode firstname to str
-            # Push to author_names
-            reviewer_names.append(str(user.first_name) +' '+ str(user.last_name) +' ('+ str(reviewers.score)+')')
-        reviewer_names = ', '.join(reviewer_names)
+        # Populate current reviewer names with one joined query
+        rows = db.session.query(User.first_name, User.last_name, PaperReviewers.score) \
+            .join(PaperReviewers, PaperReviewers.reviewer_id == User.id) \
+            .filter(PaperReviewers.paper_id == paper_id) \
+            .order_by(PaperReviewers.id)
+        reviewer_names = ', '.join(str(first_name) + ' ' + str(last_name) + ' (' + str(score) + ')'
+                                   for first_name, last_name, score in rows)
 
     return jsonify({'status':status, 'message':message, 'reviewer_names': reviewer_names})
 
 
+# Automatic reviewer assignment for all undecided papers
+@main_blueprint.route('/conference/assign/auto', methods=['POST'])
+@roles_accepted('admin')
+def conf_auto_assign_reviewers():
+    status=200
+    message='Process success'
+
+    data = request.get_json(silent=True)
+    k = data.get('k', 3) if isinstance(data, dict) else None
+    reviewers = len(active_reviewer_ids())
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= reviewers:
+        return jsonify({'status':400, 'message':'k must be a number of reviewers from 1 to %d' % reviewers}), 400
+    result = auto_assign_reviewers(k)
+    fragment_cache().evict_papers(result['paper_ids'])
+    if result['unfilled']:
+        message = '%d papers could not get %d reviewers' % (result['unfilled'], k)
+
+    return jsonify({'status':status, 'message':message, 'assigned':result['assigned'],
+                    'papers':result['papers'], 'unfilled':result['unfilled']})
+
+
+# Export of all papers, authors, reviewers and scores
+@main_blueprint.route('/conference/export')
+@roles_accepted('admin')
+def conf_export():
+    format = request.args.get('format', 'ndjson')
+    if format not in EXPORT_FORMATS:
+        return jsonify({'status':400, 'message':'Unknown format'}), 400
+
+    # Stream the rows as they are read instead of building the whole export
+    response = Response(stream_with_context(export_lines(format)), mimetype=EXPORT_FORMATS[format])
+    response.headers['Content-Disposition'] = 'attachment; filename=papers.' + format
+    return response
+
+
 # Paper action by conference chair
 @main_blueprint.route('/conference/action/paper')
 @roles_accepted('admin')  # Limits access to reviewer
@@ -233,19 +310,34 @@ def conf_action_paper():
     status=200
     message='Process success'
 
-    paper_id = request.args.get('paper_id')
-    action = request.args.get('action')
+    paper_id = request.args.get('paper_id', type=int)
+    action = request.args.get('action', type=int)
+    if paper_id is None or action not in (1, 2, 3):
+        return jsonify({'status':400, 'message':'A paper_id and an action from 1 to 3 are required'}), 400
     actionStr = ''
 
-    if(int(action)==1):
+    if(action==1):
         actionStr = 'Under Review'
-    elif(int(action)==2):
+    elif(action==2):
         actionStr = 'Accepted'
-    elif(int(action)==3):
+    elif(action==3):
         actionStr = 'Rejected'
-    
-    paper = Paper.query.filter_by(id=paper_id).update(dict(status=int(action)))
+
+    # Only a change of status is recorded, published and mailed
+    changed = Paper.query.filter(Paper.id == paper_id, Paper.status != action) \
+        .update({Paper.status: action}, synchronize_session=False)
+    if not changed:
+        db.session.rollback()
+        if db.session.query(Paper.id).filter(Paper.id == paper_id).first() is None:
+            return jsonify({'status':404, 'message':'No such paper'}), 404
+        return jsonify({'status':status, 'message':'Paper is already '+actionStr, 'paper_id': paper_id,
+                        'actionStr':actionStr, 'action':action})
+    DataVersion.bump([PAPERS_VERSION], [paper_id])
+    ChangeEvent.publish(STATUS_CHANGED, [paper_id], status=action)
     db.session.commit()
+    fragment_cache().evict_papers([paper_id])
+    if action in DECIDED_STATUSES:
+        notify_authors_decided(paper_id, actionStr)
 
     return jsonify({'status':status, 'message':message, 'paper_id': paper_id, 'actionStr':actionStr, 'action':action})
 
@@ -253,32 +345,26 @@ def conf_action_paper():
 # ACCEPT: admin, reviewer
 @main_blueprint.route('/review/paper')
 @roles_accepted('reviewer')  # Limits access to reviewer
+@conditional_get(PAPERS_VERSION, USERS_VERSION)
 def review_paper():
     paper_reviewers = PaperReviewers.query.filter(PaperReviewers.reviewer_id == current_user.id).all()
+
+    # Load the assigned papers and their authors with one query each
+    resolver = NameResolver()
+    resolver.add_papers(paper_r.paper_id for paper_r in paper_reviewers)
+    resolver.add_paper_authors(paper_r.paper_id for paper_r in paper_reviewers)
+    resolver.resolve()
+
     papers = []
-    paper_authors = []
     paper_scores = []
+    paper_authors = []
     for paper_r in paper_reviewers:
-        paper = Paper.query.filter(Paper.id == paper_r.paper_id).first()
+        paper = resolver.paper(paper_r.paper_id)
+        if paper is None:
+            continue
         papers.append(paper)
-
         paper_scores.append(paper_r.score)
-
-        stream = io.BytesIO(paper.authors)
-        lists = dict_to_list(load(stream))
-        author_names = []
-        for author_id in lists:
-            # Find user where id = author_id
-            user = User.query.filter(User.id == author_id).first()
-            if user.id == current_user.id:
-                author_names.append('You')
-            else:
-                # Convert unicode firstname to str
-                # Push to author_names
-                author_names.append(str(user.first_name))
-        # Convert array to string separated with comma
-        # Push to paper_authors
-        paper_authors.append(', '.join(author_names))
+        paper_authors.append(resolver.first_names(resolver.authors(paper.id), current_user.id))
 
     # List of status after index
     paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
@@ -293,46 +379,59 @@ def review_paper():
 @main_blueprint.route('/review/paper/star')
 @roles_accepted('reviewer')  # Limits access to reviewer
 def review_paper_star():
-    user_id = current_user.id
-    paper_id = request.args.get('paper_id')
-    value = request.args.get('value')
-    value = int(value) - 3
+    paper_id = request.args.get('paper_id', type=int)
+    value = request.args.get('value', type=int)
+    if paper_id is None or value is None or not 1 <= value <= 5:
+        return jsonify({'status':400, 'message':'A paper_id and a value from 1 to 5 are required'}), 400
+    value = value - 3
 
     status=200
     message='Process success'
-    paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
-
-    # Allowed user to give score only if paper still under review
-    paper = Paper.query.filter(Paper.id == paper_id).first()
-    if(paper.status != 2 or paper.status != 3):
-        # Check again user authority to review paper_id
-        paper_reviewer = PaperReviewers.query.filter(PaperReviewers.reviewer_id == user_id,PaperReviewers.paper_id==paper_id).first()
-        if(paper_reviewer):
-            paper_reviewer = PaperReviewers.query.filter(PaperReviewers.reviewer_id == user_id,PaperReviewers.paper_id==paper_id).update(dict(score=value))
-            db.session.commit()
-        else:
-            status=303
-            message='No authorization'
-    else:
-        status=304
-        message='Paper has been '+paper_status[paper.status] # string with paper status
+    saved, rejected = store_review_scores(current_user.id, [(paper_id, value)])
+    if not saved:
+        status, message = rejected[paper_id]
 
     return jsonify({'paper_id': paper_id, 'value':value, 'status':status, 'message':message})
 
 
+# Several scores of the current reviewer at once: {"scores": [{"paper_id": 1, "value": 4}, ...]}
+@main_blueprint.route('/review/paper/stars', methods=['POST'])
+@roles_accepted('reviewer')  # Limits access to reviewer
+def review_paper_stars():
+    status=200
+    message='Process success'
+
+    data = request.get_json(silent=True)
+    items = data.get('scores', []) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return jsonify({'status':400, 'message':'Send a JSON object with a list of scores'}), 400
+    scores = []
+    for item in items:
+        try:
+            paper_id, value = int(item['paper_id']), int(item['value'])
+        except (KeyError, TypeError, ValueError):
+            value = None
+        if value is None or not 1 <= value <= 5:
+            return jsonify({'status':400, 'message':'Every score needs a paper_id and a value from 1 to 5'}), 400
+        scores.append((paper_id, value - 3))
+    if len(scores) > MAX_SCORES_PER_REQUEST:
+        return jsonify({'status':400, 'message':'At most %d scores per request' % MAX_SCORES_PER_REQUEST}), 400
+
+    saved, rejected = store_review_scores(current_user.id, scores)
+    return jsonify({'status':status, 'message':message, 'saved':sorted(saved),
+                    'rejected':[{'paper_id':paper_id, 'status':code, 'message':reason}
+                                for paper_id, (code, reason) in sorted(rejected.items())]})
+
+
 @main_blueprint.route('/member/submit-paper')
 @login_required # Limits access to authenticated users
 def paper_submission():
-    # form = PaperSubmissionForm(request.form)
-    users = User.query.order_by(User.last_name).all()
-    # if request.method == 'POST':
-        # print(request.query)
-        # return request.query
-        # paper = Paper(form.authors, form.title, form.abstract)  # some attributes are missing for now
-        # db.session.commit()
-        # form = PaperSubmissionForm(request.form)
-        # return render_template('member/paper_submission.html', form=form)
-    return render_template('member/paper_submission.html', users=users)
+    page = paginate_users(User.query)
+    # Further pages of the author list are loaded as JSON by the form
+    if request.args.get('format') == 'json':
+        authors = [{'id': user.id, 'name': user.first_name + ' ' + user.last_name} for user in page.items]
+        return jsonify({'authors': authors, 'next': page.next_cursor})
+    return render_template('member/paper_submission.html', users=page.items, page=page)
 
 
 # Paper submit
@@ -352,85 +451,100 @@ def submit_paper():
         if(key == 'abstract'):
             abstract = value
 
-    create_paper(serialize(authors), str(title), str(abstract), current_user.id)
+    paper = create_paper(authors, str(title), str(abstract), current_user.id)
+    DataVersion.bump([PAPERS_VERSION])
     db.session.commit()
 
-    return jsonify({'data': data})
+    # The manuscript follows with PUT to manuscript_url
+    return jsonify({'data': data, 'paper_id': paper.id,
+                    'manuscript_url': url_for('main.upload_manuscript', paper_id=paper.id)})
 
 
 @main_blueprint.route('/member/list-papers')
 @login_required # Limits access to authenticated users
+@conditional_get(PAPERS_VERSION, USERS_VERSION)
 def list_of_papers():
-    papers = Paper.query.order_by(Paper.id).all()
-    paper_authors = []
-    for paper in papers:
-        stream = io.BytesIO(paper.authors)
-        lists = dict_to_list(load(stream))
-        author_names = []
-        for author_id in lists:
-            # Find user where id = author_id
-            user = User.query.filter(User.id == author_id).first()
-            if user.id == current_user.id:
-                author_names.append('You')
-            else:
-                # Convert unicode firstname to str
-                # Push to author_names
-                author_names.append(str(user.first_name))
-        # Convert array to string separated with comma
-        # Push to paper_authors
-        paper_authors.append(', '.join(author_names))
+    filters = paper_filter_args()
+    page = paginate_papers(Paper.query, filters)
+    rows = cached_paper_rows('paper_row', page.items, render_paper_rows)
     # List of status after index
     paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
     return render_template('member/list_of_papers.html', 
-            papers=papers, 
-            paper_status=paper_status,
-            paper_authors=paper_authors)
+            rows=rows,
+            page=page,
+            filters=filters,
+            paper_status=paper_status)
+
+
+# Full-text search over paper titles and abstracts, best matches first
+@main_blueprint.route('/paper/search')
+@login_required # Limits access to authenticated users
+def paper_search():
+    text = request.args.get('q', '')
+    terms = search_terms(text)
+    papers = []
+    page = None
+    if terms:
+        query, rank = search_papers(terms)
+        args = {'q': text}
+        if request.args.get('per_page'):
+            args['per_page'] = per_page_arg(request.args)
+        page = keyset_paginate(query, [rank, Paper.id], lambda row: [row[1], row[0].id],
+                               cursor=request.args.get('after'), per_page=per_page_arg(request.args), args=args)
+        papers = [paper for paper, paper_rank in page.items]
+
+    # List of status after index
+    paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
+    if request.args.get('format') == 'json':
+        return jsonify({'papers': [{'id': paper.id, 'title': paper.title, 'abstract': paper.abstract,
+                                    'status': paper_status[paper.status]} for paper in papers],
+                        'next': page.next_cursor if page else None})
+    rows = cached_paper_rows('paper_row', papers, render_paper_rows)
+    return render_template('member/search_papers.html',
+            rows=rows,
+            page=page,
+            q=text)
+
+
+def render_paper_rows(papers):
+    """ Render the member list rows of papers, keyed by paper id """
+    # Load every author of the rows with one join
+    resolver = NameResolver()
+    resolver.add_paper_authors(paper.id for paper in papers)
+
+    # List of status after index
+    paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
+    template = current_app.jinja_env.get_template('member/paper_row.html')
+    rows = {}
+    for paper in papers:
+        rows[paper.id] = template.render(
+            paper=paper,
+            authors=resolver.first_names(resolver.authors(paper.id), current_user.id),
+            paper_status=paper_status)
+    return rows
 
 
 @main_blueprint.route('/paper/detail/<paper_id>')
 @login_required # Limits access to authenticated users
+@conditional_get(USERS_VERSION, paper=True)
 def member_paper_detail(paper_id):
     # Populate by paper by paper_id
     paper = Paper.query.filter(Paper.id == paper_id).first()
-    # Convert paper author from binary to list
-    stream = io.BytesIO(paper.authors)
-    lists = dict_to_list(load(stream))
-
-    # Convert list authors to string separated with comma
-    authorList= ','.join(str(v) for v in lists)
+    # Author ids in submission order
+    lists = paper.author_ids()
 
     # User list for multiple select to assign reviewer
-    # Prevent author to set as reviewer
-    # Do -> Get all users where id not in author list
-    users_ = User.query.filter(User.id.notin_(authorList))
-    # Sort only user with role = reviewer and not admin
-    users = []
-    for user in users_:
-        userRole = UsersRoles.query.filter(UsersRoles.user_id == user.id).first()
-        if(userRole and userRole.user_id != 1):
-            userc = User.query.filter(User.id == userRole.user_id).first()
-            users.append(userc)
-
-    # Populate author names
-    author_names = []
-    for author_id in lists:
-        # Find user where id = author_id
-        user = User.query.filter(User.id == author_id).first()
-        # Convert unicode firstname to str
-        # Push to author_names
-        author_names.append(str(user.first_name) +' '+ str(user.last_name))
-    author_names = ', '.join(author_names)
-
-    # Populate current reviewer names
-    reviewer_names = []
+    # Eligible reviewers minus the authors of the paper
+    users = reviewer_index().candidates(lists)
+
+    # Populate author and current reviewer names
     paper_reviewers = PaperReviewers.query.filter(PaperReviewers.paper_id == paper_id).all()
-    for reviewers in paper_reviewers:
-        # Find user where id = author_id
-        user = User.query.filter(User.id == reviewers.reviewer_id).first()
-        # Convert unicode firstname to str
-        # Push to author_names
-        reviewer_names.append(str(user.first_name) +' '+ str(user.last_name) +' ('+ str(reviewers.score)+')')
-    reviewer_names = ', '.join(reviewer_names)
+    resolver = NameResolver()
+    resolver.add_users(lists)
+    resolver.add_users(reviewers.reviewer_id for reviewers in paper_reviewers)
+    resolver.resolve()
+    author_names = resolver.full_names(lists)
+    reviewer_names = resolver.reviewer_scores(paper_reviewers)
 
     # List of status after index
     paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
@@ -440,7 +554,99 @@ def member_paper_detail(paper_id):
         author_names=author_names,
         reviewer_names=reviewer_names,
         paper_status=paper_status,
-        users=users)
+        users=users,
+        manuscript=manuscript_details(paper),
+        can_upload=(current_user.id in lists or paper.submittedBy == current_user.id)
+                   and paper.status not in DECIDED_STATUSES)
+
+
+# Manuscript upload: the PDF is the raw request body, streamed to disk in chunks
+@main_blueprint.route('/paper/<int:paper_id>/manuscript', methods=['PUT'])
+@login_required # Limits access to authenticated users
+def upload_manuscript(paper_id):
+    paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
+    paper = Paper.query.filter(Paper.id == paper_id).first()
+    if paper is None:
+        return jsonify({'status':404, 'message':'No such paper'}), 404
+    if not is_paper_author(paper) and not current_user.has_roles('admin'):
+        return jsonify({'status':403, 'message':'No authorization'}), 403
+    if paper.status in DECIDED_STATUSES:
+        return jsonify({'status':409, 'message':'Paper has been '+paper_status[paper.status]}), 409
+    max_bytes = current_app.config.get('MANUSCRIPT_MAX_BYTES', 50 * 2 ** 20)
+    if request.content_length and request.content_length > max_bytes:
+        return jsonify({'status':413, 'message':'Manuscripts are limited to %d MB' % (max_bytes // 2 ** 20)}), 413
+
+    # Hand the connection back to the pool while the file comes in
+    db.session.rollback()
+    try:
+        digest, size = manuscript_store().save(request.stream, max_bytes)
+    except ManuscriptRejected as e:
+        return jsonify({'status':e.status, 'message':str(e)}), e.status
+
+    # The paper may have been decided while the file came in
+    updated = Paper.query.filter(Paper.id == paper_id, Paper.status.notin_(DECIDED_STATUSES)) \
+        .update({Paper.mediaRef: digest, Paper.mediaTyp: 'application/pdf'}, synchronize_session=False)
+    if not updated:
+        db.session.rollback()
+        return jsonify({'status':409, 'message':'Paper has been decided'}), 409
+    DataVersion.bump([PAPERS_VERSION], [paper_id])
+    # Text, page count and preview are made by `manage.py worker`, once per file
+    Job.enqueue(MANUSCRIPT_JOB, MANUSCRIPT_JOB + ':' + digest, {'digest': digest})
+    db.session.commit()
+    fragment_cache().evict_papers([paper_id])
+
+    return jsonify({'status':200, 'message':'Process success', 'sha256':digest, 'size':size,
+                    'url':url_for('main.paper_manuscript', paper_id=paper_id, v=digest)})
+
+
+# Manuscript download, for the authors, the assigned reviewers and the chairs
+@main_blueprint.route('/paper/<int:paper_id>/manuscript')
+@login_required # Limits access to authenticated users
+def paper_manuscript(paper_id):
+    paper = Paper.query.filter(Paper.id == paper_id).first()
+    if paper is None or not paper.mediaRef:
+        return Response('No manuscript\n', status=404, mimetype='text/plain')
+    reviewer = db.session.query(PaperReviewers.id) \
+        .filter(PaperReviewers.paper_id == paper_id, PaperReviewers.reviewer_id == current_user.id).first()
+    if reviewer is None and not is_paper_author(paper) and not current_user.has_roles('admin'):
+        return Response('No authorization\n', status=403, mimetype='text/plain')
+    # The response is a file, no database connection is needed while it is sent
+    db.session.remove()
+    return send_manuscript(paper.mediaRef, paper.mediaTyp or 'application/pdf', 'paper-%d.pdf' % paper_id)
+
+
+# First page of the manuscript as an image, once the worker has made it
+@main_blueprint.route('/paper/<int:paper_id>/manuscript/preview')
+@login_required # Limits access to authenticated users
+def paper_manuscript_preview(paper_id):
+    paper = Paper.query.filter(Paper.id == paper_id).first()
+    if paper is None or not paper.mediaRef or manuscript_store().info(paper.mediaRef) is None:
+        return Response('No preview\n', status=404, mimetype='text/plain')
+    reviewer = db.session.query(PaperReviewers.id) \
+        .filter(PaperReviewers.paper_id == paper_id, PaperReviewers.reviewer_id == current_user.id).first()
+    if reviewer is None and not is_paper_author(paper) and not current_user.has_roles('admin'):
+        return Response('No authorization\n', status=403, mimetype='text/plain')
+    db.session.remove()
+    return send_manuscript(paper.mediaRef, 'image/png', 'paper-%d.png' % paper_id, suffix='.png')
+
+
+def manuscript_details(paper):
+    """ Page count and text excerpt of the manuscript of paper, None until the worker processed it """
+    if not paper.mediaRef:
+        return None
+    store = manuscript_store()
+    info = store.info(paper.mediaRef)
+    if info is None:
+        return None
+    return {'pages': info['pages'], 'excerpt': manuscript_excerpt(store, paper.mediaRef, 600)}
+
+
+def is_paper_author(paper):
+    """ Whether the current user submitted paper or is one of its authors """
+    if paper.submittedBy == current_user.id:
+        return True
+    return db.session.query(PaperAuthors.id) \
+        .filter(PaperAuthors.paper_id == paper.id, PaperAuthors.user_id == current_user.id).first() is not None
 
 
 # User activation
@@ -456,11 +662,62 @@ def activate_user_admin():
     activation = True if active == 'true' else False
 
     user = User.query.filter_by(id=id).update(dict(active=activation))
+    DataVersion.bump([USERS_VERSION])
     db.session.commit()
+    reviewer_index().invalidate()
 
     return jsonify({'status':status, 'message':message, 'activation': activation, 'active': active})
 
 
+# Bulk creation of users by the conference chair
+@main_blueprint.route('/admin/users/bulk', methods=['POST'])
+@roles_accepted('admin')
+def admin_bulk_create_users():
+    status=200
+    message='Process success'
+
+    data = request.get_json(silent=True)
+    items = data.get('users', []) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not all(isinstance(user, dict) for user in items):
+        return jsonify({'status':400, 'message':'Send a JSON object with a list of users'}), 400
+    users = [user for user in items if user.get('email') and user.get('password')]
+    if len(users) != len(items):
+        return jsonify({'status':400, 'message':'Every user needs an email and a password'}), 400
+    if len(users) > MAX_USERS_PER_REQUEST:
+        return jsonify({'status':413, 'message':'At most %d users per request, '
+                        'use `manage.py import --users` for more' % MAX_USERS_PER_REQUEST}), 413
+
+    # Hashed in this process: a pool per request would fork the web worker
+    with PasswordHasher(1) as hasher:
+        created = provision_users(users, hasher)
+    db.session.commit()
+    reviewer_index().invalidate()
+
+    return jsonify({'status':status, 'message':message, 'created':created, 'skipped':len(users) - created})
+
+
+# Request and SQL statistics per endpoint of this worker process
+@main_blueprint.route('/admin/perf')
+@roles_accepted('admin')
+def admin_perf():
+    if request.args.get('reset'):
+        perf_stats().reset()
+        return redirect(url_for('main.admin_perf'))
+    endpoints = perf_stats().snapshot()
+    if request.args.get('format') == 'json':
+        return jsonify({'endpoints': [dict(stats, endpoint=endpoint) for endpoint, stats in endpoints]})
+    return render_template('conference/perf_stats.html', endpoints=endpoints, buckets=LATENCY_BUCKETS)
+
+
+# Prometheus scrape target, summed over all worker processes
+@main_blueprint.route('/metrics')
+def metrics():
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != 'Bearer ' + token:
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(generate_metrics(), mimetype=CONTENT_TYPE_LATEST)
+
+
 # User assignation as reviewer
 @main_blueprint.route('/assign/user')
 @roles_accepted('admin')
@@ -474,19 +731,88 @@ def assign_user_admin():
     if user_role and user_role.role_id != 1:
             # Delete user role in UsersRoles
             db.session.delete(user_role)
+            DataVersion.bump([USERS_VERSION])
             db.session.commit()
             action = 0
     else:
         # Update user role
         reviewer_role = find_or_create_role('reviewer', u'Reviewer')
+        DataVersion.bump([USERS_VERSION])
         user = find_or_update_user(id, reviewer_role)
         action = 1
+    reviewer_index().invalidate()
 
     return jsonify({'status':status, 'message':message, 'id':id, 'action':action})
 
 
+def cached_paper_rows(name, papers, render_rows):
+    """ The rendered row of each paper, from the fragment cache when unchanged.
+
+    render_rows(papers) renders the rows missing from the cache and returns
+    them keyed by paper id. Rows showing 'You' among the authors are cached
+    per viewer, all other rows are shared by every viewer.
+    """
+    cache = fragment_cache()
+    users_version = DataVersion.current([USERS_VERSION])[USERS_VERSION][0]
+    paper_ids = [paper.id for paper in papers]
+    authored = set()
+    if paper_ids:
+        authored.update(paper_id for paper_id, in db.session.query(PaperAuthors.paper_id)
+                        .filter(PaperAuthors.user_id == current_user.id, PaperAuthors.paper_id.in_(paper_ids)))
+
+    keys = {}
+    rows = {}
+    for paper in papers:
+        viewer = current_user.id if paper.id in authored else ''
+        keys[paper.id] = fragment_key(name, paper.id, paper.version, users_version, viewer)
+        rows[paper.id] = cache.get(keys[paper.id], paper.id)
+
+    missing = [paper for paper in papers if rows[paper.id] is None]
+    if missing:
+        for paper_id, html in render_rows(missing).items():
+            cache.set(keys[paper_id], paper_id, html)
+            rows[paper_id] = Markup(html)
+    return [rows[paper.id] for paper in papers]
+
+
+def paper_filter_args():
+    """ Read the paper list filters from the query string """
+    return {
+        'status': request.args.get('status', type=int),
+        'submitter': request.args.get('submitter', type=int),
+        'reviewer': request.args.get('reviewer', type=int),
+        'per_page': request.args.get('per_page', type=int),
+    }
+
+
+def paginate_papers(query, filters, key=lambda paper: [paper.id]):
+    """ Filter papers by status, submitter and reviewer and return one page keyed on Paper.id """
+    if filters['status'] is not None:
+        query = query.filter(Paper.status == filters['status'])
+    if filters['submitter'] is not None:
+        query = query.filter(Paper.submittedBy == filters['submitter'])
+    if filters['reviewer'] is not None:
+        reviewed = db.session.query(PaperReviewers.paper_id).filter(PaperReviewers.reviewer_id == filters['reviewer'])
+        query = query.filter(Paper.id.in_(reviewed))
+    args = dict((key, value) for key, value in filters.items() if value is not None)
+    return keyset_paginate(query, [Paper.id], key,
+                           cursor=request.args.get('after'), per_page=per_page_arg(request.args), args=args)
+
+
+def paginate_users(query):
+    """ Return one page of users keyed on (User.last_name, User.id) """
+    args = {}
+    if request.args.get('per_page'):
+        args['per_page'] = per_page_arg(request.args)
+    return keyset_paginate(query, [User.last_name, User.id], lambda user: [user.last_name, user.id],
+                           cursor=request.args.get('after'), per_page=per_page_arg(request.args), args=args)
+
+
 def create_paper(authors, title, abstract, submmitedBy):
-    paper = Paper(authors=authors, title=title, abstract=abstract, submittedBy=submmitedBy, status=0)
+    paper = Paper(title=title, abstract=abstract, submittedBy=submmitedBy, status=0)
+    paper.scores = PaperScores()
+    for position, author_id in enumerate(authors):
+        paper.author_links.append(PaperAuthors(user_id=int(author_id), position=position))
     db.session.add(paper)
     return paper
 
@@ -502,7 +828,7 @@ def find_or_create_role(name, label):
 
 def find_or_update_user(id, role=None):
     """ Find existing user and update role """
-    user = User.query.filter(User.id == id).first()
+    user = identity_cache().get_user(id)
     if user and role:
         user.roles.append(role)
         db.session.commit()
@@ -0,0 +1,37 @@
+from flask import current_app, render_template, url_for
+
+from app import db
+from app.models.mail_queue import mail_queue
+from app.models.paper_models import Paper, PaperAuthors
+from app.models.user_models import User
+
+
+def notify_reviewers_assigned(paper_id, reviewer_ids):
+    """ Mail the reviewers just assigned to paper_id; only queues the mails """
+    if not reviewer_ids or not current_app.config.get('MAIL_NOTIFICATIONS', True):
+        return
+    title = db.session.query(Paper.title).filter(Paper.id == paper_id).scalar()
+    url = url_for('main.review_paper', _external=True)
+    subject = '[%s] Review assignment: %s' % (current_app.config['APP_NAME'], title)
+    for first_name, email in db.session.query(User.first_name, User.email).filter(User.id.in_(reviewer_ids)):
+        mail_queue().send(subject, [email], render_template('emails/reviewer_assigned.txt',
+                                                             first_name=first_name, title=title, url=url))
+
+
+def notify_authors_decided(paper_id, decision):
+    """ Mail the authors and the submitter of paper_id that it was decided, e.g. 'Accepted' """
+    if not current_app.config.get('MAIL_NOTIFICATIONS', True):
+        return
+    paper = db.session.query(Paper.title, Paper.submittedBy).filter(Paper.id == paper_id).first()
+    if paper is None:
+        return
+    title, submitted_by = paper
+    user_ids = set(user_id for user_id, in db.session.query(PaperAuthors.user_id)
+                   .filter(PaperAuthors.paper_id == paper_id))
+    if submitted_by is not None:
+        user_ids.add(submitted_by)
+    url = url_for('main.member_paper_detail', paper_id=paper_id, _external=True)
+    subject = '[%s] Paper %s: %s' % (current_app.config['APP_NAME'], decision.lower(), title)
+    for first_name, email in db.session.query(User.first_name, User.email).filter(User.id.in_(user_ids)):
+        mail_queue().send(subject, [email], render_template('emails/paper_decided.txt', first_name=first_name,
+                                                             title=title, decision=decision, url=url))
@@ -0,0 +1,83 @@
+import base64
+import json
+
+from app import db
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+
+
+def encode_cursor(values):
+    """ Encode the sort key of the last row of a page as an opaque URL-safe string """
+    raw = json.dumps(list(values), separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """ Decode a cursor made by encode_cursor(), None if it is missing or invalid """
+    if not cursor:
+        return None
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(str(cursor) + padding).decode('utf-8'))
+    except (TypeError, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+def per_page_arg(args):
+    """ Read per_page from request args, clamped to 1..MAX_PER_PAGE """
+    per_page = args.get('per_page', DEFAULT_PER_PAGE, type=int)
+    return max(1, min(per_page or DEFAULT_PER_PAGE, MAX_PER_PAGE))
+
+
+def after_condition(columns, values):
+    """ Row-value comparison (c1, c2, ...) > (v1, v2, ...) written with AND/OR
+    so that every backend can use the composite index on columns. The
+    leading c1 >= v1 lets the index be searched from the cursor on rather
+    than scanned from its start.
+    """
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return column > value
+    return db.and_(column >= value, _after(columns, values))
+
+
+def _after(columns, values):
+    column, value = columns[0], values[0]
+    if len(columns) == 1:
+        return column > value
+    return db.or_(column > value, db.and_(column == value, _after(columns[1:], values[1:])))
+
+
+class KeysetPage(object):
+    """ One page of a keyset paginated query """
+
+    def __init__(self, items, next_cursor, cursor, per_page, args):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+        self.per_page = per_page
+        self.args = args  # filter arguments to keep in pager links
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def keyset_paginate(query, columns, key, cursor=None, per_page=DEFAULT_PER_PAGE, args=None):
+    """ Return the page of query that follows cursor.
+
+    columns are the ORDER BY columns, which must end with a unique column,
+    and key(item) returns the values of those columns for a loaded item.
+    Only per_page + 1 rows are read whatever the size of the table.
+    """
+    values = decode_cursor(cursor)
+    if values is not None and len(values) == len(columns):
+        query = query.filter(after_condition(columns, values))
+    else:
+        cursor = None
+    rows = query.order_by(*columns).limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = encode_cursor(key(items[-1])) if len(rows) > per_page else None
+    return KeysetPage(items, next_cursor, cursor, per_page, args or {})
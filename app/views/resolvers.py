@@ -0,0 +1,117 @@
+from app import db
+from app.models.identity_cache import identity_cache
+from app.models.paper_models import Paper, PaperAuthors, PaperReviewers
+from app.models.user_models import User
+
+# SQLite refuses statements with more than 999 bound parameters
+IN_CHUNK_SIZE = 500
+
+
+def chunked(ids, size=IN_CHUNK_SIZE):
+    """ Split a list of ids into lists of at most size elements """
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+class NameResolver(object):
+    """ Collect the user and paper ids a page needs and load them in bulk.
+
+    Usage:
+        resolver = NameResolver()
+        resolver.add_users(author_ids)
+        resolver.add_papers(paper_ids)
+        resolver.resolve()
+        resolver.first_names(author_ids, current_user.id)
+    """
+
+    def __init__(self):
+        self.user_ids = set()
+        self.paper_ids = set()
+        self.users = {}
+        self.papers = {}
+        self.paper_authors = {}
+
+    def add_users(self, ids):
+        self.user_ids.update(int(id) for id in ids)
+
+    def add_papers(self, ids):
+        self.paper_ids.update(int(id) for id in ids)
+
+    def add_paper_authors(self, paper_ids):
+        """ Load the authors of papers with one indexed join per chunk """
+        for ids in chunked(set(int(id) for id in paper_ids).difference(self.paper_authors)):
+            for id in ids:
+                self.paper_authors[id] = []
+            query = db.session.query(PaperAuthors.paper_id, User) \
+                .join(User, User.id == PaperAuthors.user_id) \
+                .filter(PaperAuthors.paper_id.in_(ids)) \
+                .order_by(PaperAuthors.paper_id, PaperAuthors.position)
+            for paper_id, user in query:
+                self.users[user.id] = user
+                self.paper_authors[paper_id].append(user.id)
+        identity_cache().add(self.users.values())
+
+    def authors(self, paper_id):
+        """ Author user ids of a paper added with add_paper_authors() """
+        return self.paper_authors.get(int(paper_id), [])
+
+    def resolve(self):
+        """ Load every pending user and paper with one IN query per chunk """
+        missing = self.user_ids.difference(self.users)
+        if missing:
+            self.users.update(identity_cache().get_users(missing))
+        missing = self.paper_ids.difference(self.papers)
+        for ids in chunked(missing):
+            for paper in Paper.query.filter(Paper.id.in_(ids)):
+                self.papers[paper.id] = paper
+        return self
+
+    def user(self, id):
+        return self.users.get(int(id))
+
+    def paper(self, id):
+        return self.papers.get(int(id))
+
+    def first_names(self, ids, current_user_id=None):
+        """ Comma separated first names, with 'You' for the current user """
+        names = []
+        for id in ids:
+            user = self.user(id)
+            if user is None:
+                continue
+            if user.id == current_user_id:
+                names.append('You')
+            else:
+                names.append(str(user.first_name))
+        return ', '.join(names)
+
+    def full_names(self, ids):
+        """ Comma separated 'first last' names """
+        names = []
+        for id in ids:
+            user = self.user(id)
+            if user is None:
+                continue
+            names.append(str(user.first_name) + ' ' + str(user.last_name))
+        return ', '.join(names)
+
+    def reviewer_scores(self, paper_reviewers):
+        """ Comma separated 'first last (score)' names of paper reviewers """
+        names = []
+        for paper_reviewer in paper_reviewers:
+            user = self.user(paper_reviewer.reviewer_id)
+            if user is None:
+                continue
+            names.append(str(user.first_name) + ' ' + str(user.last_name) + ' (' + str(paper_reviewer.score) + ')')
+        return ', '.join(names)
+
+
+def reviewers_by_paper(paper_ids):
+    """ Map paper_id -> list of PaperReviewers, loaded with one IN query per chunk """
+    result = {}
+    for ids in chunked(paper_ids):
+        query = PaperReviewers.query.filter(PaperReviewers.paper_id.in_(ids)).order_by(PaperReviewers.id)
+        for paper_reviewer in query:
+            result.setdefault(paper_reviewer.paper_id, []).append(paper_reviewer)
+    return result
@@ -0,0 +1,41 @@
+from app import db
+from app.models.event_models import ChangeEvent, SCORE_SET
+from app.models.paper_models import DECIDED_STATUSES, Paper, PaperReviewers, PaperScores
+from app.models.version_models import DataVersion, PAPERS_VERSION
+from app.views.fragment_cache import fragment_cache
+
+
+def store_review_scores(reviewer_id, scores):
+    """ Store (paper_id, score) pairs of reviewer_id and commit.
+
+    Each score is one conditional UPDATE that checks the assignment and
+    that the paper is still open; the summaries of the changed papers are
+    then recounted with one more UPDATE. Returns the set of saved paper
+    ids and a map paper_id -> (status, message) for the refused ones.
+    """
+    paper_status = ['Submitted', 'Under Review', 'Accepted', 'Rejected']
+    saved = set()
+    for paper_id, score in scores:
+        if PaperReviewers.set_score(paper_id, reviewer_id, score):
+            saved.add(paper_id)
+
+    rejected = {}
+    refused = set(paper_id for paper_id, score in scores) - saved
+    if refused:
+        # Tell a decided paper from a missing assignment, with one query for all of them
+        decided = dict(db.session.query(Paper.id, Paper.status)
+                       .filter(Paper.id.in_(refused), Paper.status.in_(DECIDED_STATUSES)))
+        for paper_id in refused:
+            if paper_id in decided:
+                rejected[paper_id] = (304, 'Paper has been '+paper_status[decided[paper_id]])
+            else:
+                rejected[paper_id] = (303, 'No authorization')
+
+    if saved:
+        PaperScores.recount(saved)
+        DataVersion.bump([PAPERS_VERSION], saved)
+        ChangeEvent.publish(SCORE_SET, sorted(saved), reviewer_id=reviewer_id)
+    db.session.commit()
+    if saved:
+        fragment_cache().evict_papers(saved)
+    return saved, rejected
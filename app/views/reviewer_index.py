@@ -0,0 +1,62 @@
+import collections
+import threading
+import time
+
+from flask import current_app
+
+from app import db
+from app.models.user_models import User, Role, UsersRoles
+from app.models.version_models import DataVersion, USERS_VERSION
+
+Reviewer = collections.namedtuple('Reviewer', ['id', 'first_name', 'last_name'])
+
+
+class EligibleReviewerIndex(object):
+    """ Active users with the reviewer role, loaded with one query.
+
+    The index is shared by all requests of a worker. Every role and
+    activation change bumps USERS_VERSION, so the index is loaded again as
+    soon as that version differs from the one it was loaded at, whichever
+    worker made the change. Changes made without a bump are picked up
+    after REVIEWER_INDEX_TTL seconds.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._reviewers = None
+        self._version = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def reviewers(self):
+        """ List of Reviewer tuples ordered by user id """
+        version = DataVersion.current([USERS_VERSION])[USERS_VERSION][0]
+        with self._lock:
+            if self._reviewers is None or version != self._version or time.time() - self._loaded_at > self.ttl:
+                rows = db.session.query(User.id, User.first_name, User.last_name) \
+                    .join(UsersRoles, UsersRoles.user_id == User.id) \
+                    .join(Role, Role.id == UsersRoles.role_id) \
+                    .filter(Role.name == 'reviewer', User.active == True) \
+                    .order_by(User.id)
+                self._reviewers = [Reviewer(*row) for row in rows]
+                self._version = version
+                self._loaded_at = time.time()
+            return self._reviewers
+
+    def candidates(self, author_ids):
+        """ Reviewers who are not among author_ids """
+        authors = set(int(author_id) for author_id in author_ids)
+        return [reviewer for reviewer in self.reviewers() if reviewer.id not in authors]
+
+    def invalidate(self):
+        with self._lock:
+            self._reviewers = None
+
+
+def reviewer_index():
+    """ The EligibleReviewerIndex of the current app """
+    index = current_app.extensions.get('eligible_reviewers')
+    if index is None:
+        index = EligibleReviewerIndex(current_app.config.get('REVIEWER_INDEX_TTL', 30))
+        current_app.extensions['eligible_reviewers'] = index
+    return index
@@ -9,12 +9,24 @@ from flask_migrate import MigrateCommand
 from flask_script import Manager
 
 from app import create_app
-from app.commands import InitDbCommand
+from app.commands import InitDbCommand, CheckQueryPlansCommand, AssignReviewersCommand, ExportCommand, \
+    ImportCommand, BenchmarkHashingCommand, SeedCommand, BenchmarkRoutesCommand, BenchmarkWritesCommand, \
+    BenchmarkMailCommand, WorkerCommand
 
 # Setup Flask-Script with command line commands
 manager = Manager(create_app)
 manager.add_command('db', MigrateCommand)
 manager.add_command('init_db', InitDbCommand)
+manager.add_command('check_query_plans', CheckQueryPlansCommand)
+manager.add_command('assign_reviewers', AssignReviewersCommand)
+manager.add_command('export', ExportCommand)
+manager.add_command('import', ImportCommand)
+manager.add_command('benchmark_hashing', BenchmarkHashingCommand)
+manager.add_command('seed', SeedCommand)
+manager.add_command('benchmark_routes', BenchmarkRoutesCommand)
+manager.add_command('benchmark_writes', BenchmarkWritesCommand)
+manager.add_command('benchmark_mail', BenchmarkMailCommand)
+manager.add_command('worker', WorkerCommand)
 
 if __name__ == "__main__":
     # python manage.py                      # shows available commands
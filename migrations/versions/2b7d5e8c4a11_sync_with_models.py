@@ -0,0 +1,114 @@
+"""Bring the schema in line with app/models
+
+Revision ID: 2b7d5e8c4a11
+Revises: 0001c8ac1a69
+Create Date: 2026-10-18 11:02:19.381736
+
+The initial revision created the Flask-User starter tables (user, role,
+user_roles) which the application never used. Replace them with the
+tables of app/models. Tables already created by 'manage.py init_db'
+are left alone so existing databases can be upgraded in place.
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2b7d5e8c4a11'
+down_revision = '0001c8ac1a69'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    existing = sa.inspect(op.get_bind()).get_table_names()
+
+    for table in ['user_roles', 'user', 'role']:
+        if table in existing:
+            op.drop_table(table)
+
+    if 'roles' not in existing:
+        op.create_table('roles',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=50), server_default='', nullable=False),
+        sa.Column('label', sa.Unicode(length=255), server_default='', nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+        )
+    if 'users' not in existing:
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.Unicode(length=255), server_default='', nullable=False),
+        sa.Column('confirmed_at', sa.DateTime(), nullable=True),
+        sa.Column('password', sa.String(length=255), server_default='', nullable=False),
+        sa.Column('is_active', sa.Boolean(), server_default='0', nullable=False),
+        sa.Column('first_name', sa.Unicode(length=50), server_default='', nullable=False),
+        sa.Column('last_name', sa.Unicode(length=50), server_default='', nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('email')
+        )
+    if 'users_roles' not in existing:
+        op.create_table('users_roles',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('role_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['role_id'], ['roles.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'papers' not in existing:
+        op.create_table('papers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('authors', sa.String(length=255), server_default='', nullable=False),
+        sa.Column('title', sa.String(length=255), server_default='', nullable=False),
+        sa.Column('abstract', sa.String(length=255), server_default='', nullable=False),
+        sa.Column('mediaRef', sa.String(length=255), server_default='', nullable=True),
+        sa.Column('mediaTyp', sa.String(length=255), server_default='', nullable=True),
+        sa.Column('status', sa.Integer(), server_default='0', nullable=True),
+        sa.Column('submittedBy', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['submittedBy'], ['users.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'paper_reviewers' not in existing:
+        op.create_table('paper_reviewers',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('paper_id', sa.Integer(), nullable=False),
+        sa.Column('reviewer_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('paper_reviewers')
+    op.drop_table('papers')
+    op.drop_table('users_roles')
+    op.drop_table('users')
+    op.drop_table('roles')
+    op.create_table('role',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=True),
+    sa.Column('description', sa.String(length=255), server_default='', nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=50), nullable=False),
+    sa.Column('password', sa.String(length=255), server_default='', nullable=False),
+    sa.Column('reset_password_token', sa.String(length=100), server_default='', nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('confirmed_at', sa.DateTime(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), server_default='0', nullable=False),
+    sa.Column('first_name', sa.String(length=50), server_default='', nullable=False),
+    sa.Column('last_name', sa.String(length=50), server_default='', nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('user_roles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('role_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['role_id'], ['role.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
@@ -0,0 +1,95 @@
+"""Normalize Paper.authors into the paper_authors table
+
+Revision ID: 3f1c2a9d7b10
+Revises: 2b7d5e8c4a11
+Create Date: 2026-10-18 09:12:44.104531
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9d7b10'
+down_revision = '2b7d5e8c4a11'
+
+from alembic import op
+import sqlalchemy as sa
+
+import io
+from phpserialize import load, dict_to_list, serialize
+
+# Number of papers decoded and inserted per batch during the backfill
+BATCH_SIZE = 500
+
+papers = sa.table('papers',
+    sa.column('id', sa.Integer()),
+    sa.column('authors', sa.String()),
+)
+
+paper_authors = sa.table('paper_authors',
+    sa.column('paper_id', sa.Integer()),
+    sa.column('user_id', sa.Integer()),
+    sa.column('position', sa.Integer()),
+)
+
+
+def upgrade():
+    # Databases created by 'manage.py init_db' already have the new layout
+    connection = op.get_bind()
+    if 'paper_authors' in sa.inspect(connection).get_table_names():
+        return
+
+    op.create_table('paper_authors',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('paper_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['paper_id'], ['papers.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_paper_authors_paper_id_position', 'paper_authors', ['paper_id', 'position'], unique=True)
+    op.create_index('ix_paper_authors_user_id_paper_id', 'paper_authors', ['user_id', 'paper_id'])
+
+    # Backfill from the serialized author lists, BATCH_SIZE papers at a time
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select([papers.c.id, papers.c.authors])
+            .where(papers.c.id > last_id)
+            .order_by(papers.c.id)
+            .limit(BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+        mappings = []
+        for paper_id, authors in rows:
+            if authors:
+                if not isinstance(authors, bytes):
+                    authors = authors.encode('utf-8')
+                author_ids = dict_to_list(load(io.BytesIO(authors)))
+                for position, user_id in enumerate(author_ids):
+                    mappings.append({'paper_id': paper_id, 'user_id': int(user_id), 'position': position})
+        if mappings:
+            op.bulk_insert(paper_authors, mappings)
+        last_id = rows[-1][0]
+
+    with op.batch_alter_table('papers') as batch_op:
+        batch_op.drop_column('authors')
+
+
+def downgrade():
+    with op.batch_alter_table('papers') as batch_op:
+        batch_op.add_column(sa.Column('authors', sa.String(length=255), server_default='', nullable=False))
+
+    # Serialize the author lists back onto papers
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select([paper_authors.c.paper_id, paper_authors.c.user_id])
+        .order_by(paper_authors.c.paper_id, paper_authors.c.position))
+    author_ids = {}
+    for paper_id, user_id in rows:
+        author_ids.setdefault(paper_id, []).append(user_id)
+    for paper_id, ids in author_ids.items():
+        connection.execute(papers.update().where(papers.c.id == paper_id).values(authors=serialize(ids)))
+
+    op.drop_index('ix_paper_authors_user_id_paper_id', table_name='paper_authors')
+    op.drop_index('ix_paper_authors_paper_id_position', table_name='paper_authors')
+    op.drop_table('paper_authors')
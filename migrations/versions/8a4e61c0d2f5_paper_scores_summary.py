@@ -0,0 +1,47 @@
+"""Add per-paper score summaries
+
+Revision ID: 8a4e61c0d2f5
+Revises: 3f1c2a9d7b10
+Create Date: 2026-10-18 10:31:07.552190
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8a4e61c0d2f5'
+down_revision = '3f1c2a9d7b10'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Databases created by 'manage.py init_db' already have the table
+    if 'paper_scores' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('paper_scores',
+    sa.Column('paper_id', sa.Integer(), nullable=False),
+    sa.Column('reviewer_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('score_count', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('score_sum', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('score_sq_sum', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('score_min', sa.Integer(), nullable=True),
+    sa.Column('score_max', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['paper_id'], ['papers.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('paper_id')
+    )
+
+    # Backfill with a single grouped pass over paper_reviewers
+    op.execute(
+        'INSERT INTO paper_scores '
+        '(paper_id, reviewer_count, score_count, score_sum, score_sq_sum, score_min, score_max) '
+        'SELECT papers.id, COUNT(paper_reviewers.id), COUNT(paper_reviewers.score), '
+        'COALESCE(SUM(paper_reviewers.score), 0), '
+        'COALESCE(SUM(paper_reviewers.score * paper_reviewers.score), 0), '
+        'MIN(paper_reviewers.score), MAX(paper_reviewers.score) '
+        'FROM papers LEFT OUTER JOIN paper_reviewers ON paper_reviewers.paper_id = papers.id '
+        'GROUP BY papers.id')
+
+
+def downgrade():
+    op.drop_table('paper_scores')
@@ -0,0 +1,45 @@
+"""Add the jobs table of the background worker
+
+Revision ID: a9c3e5f70b12
+Revises: f3b8d1a6c524
+Create Date: 2026-10-18 19:05:31.274118
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a9c3e5f70b12'
+down_revision = 'f3b8d1a6c524'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Databases created by 'manage.py init_db' already have the table
+    if 'jobs' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('jobs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=50), nullable=False),
+    sa.Column('key', sa.String(length=255), nullable=False),
+    sa.Column('payload', sa.Text(), server_default='{}', nullable=False),
+    sa.Column('status', sa.String(length=20), server_default='queued', nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('max_attempts', sa.Integer(), server_default='3', nullable=False),
+    sa.Column('timeout', sa.Integer(), server_default='300', nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('locked_by', sa.String(length=100), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+    op.create_index('ix_jobs_status_run_after', 'jobs', ['status', 'run_after'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_jobs_status_run_after', table_name='jobs')
+    op.drop_table('jobs')
@@ -0,0 +1,25 @@
+"""Index users on (last_name, id) for the paginated user lists
+
+Revision ID: b4d8f2a61e37
+Revises: a9c3e5f70b12
+Create Date: 2026-10-18 20:14:09.581342
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'b4d8f2a61e37'
+down_revision = 'a9c3e5f70b12'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # 'manage.py init_db' creates it with the table
+    indexes = sa.inspect(op.get_bind()).get_indexes('users')
+    if 'ix_users_last_name_id' not in [index['name'] for index in indexes]:
+        op.create_index('ix_users_last_name_id', 'users', ['last_name', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_users_last_name_id', table_name='users')
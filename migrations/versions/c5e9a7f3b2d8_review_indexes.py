@@ -0,0 +1,54 @@
+"""Index the review hot paths and make reviewer assignments unique
+
+Revision ID: c5e9a7f3b2d8
+Revises: 8a4e61c0d2f5
+Create Date: 2026-10-18 11:20:53.907412
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c5e9a7f3b2d8'
+down_revision = '8a4e61c0d2f5'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def create_index(name, table, columns, unique=False):
+    """ Create an index unless 'manage.py init_db' already did """
+    indexes = sa.inspect(op.get_bind()).get_indexes(table)
+    if name not in [index['name'] for index in indexes]:
+        op.create_index(name, table, columns, unique=unique)
+
+
+def upgrade():
+    # Keep the oldest row of any duplicated (paper_id, reviewer_id) assignment
+    op.execute(
+        'DELETE FROM paper_reviewers WHERE id NOT IN '
+        '(SELECT MIN(id) FROM paper_reviewers GROUP BY paper_id, reviewer_id)')
+
+    create_index('ix_paper_reviewers_paper_id_reviewer_id', 'paper_reviewers', ['paper_id', 'reviewer_id'], unique=True)
+    create_index('ix_paper_reviewers_reviewer_id', 'paper_reviewers', ['reviewer_id'])
+    create_index('ix_users_roles_user_id', 'users_roles', ['user_id'])
+    create_index('ix_users_roles_role_id_user_id', 'users_roles', ['role_id', 'user_id'])
+    create_index('ix_papers_status', 'papers', ['status'])
+
+    # Removed duplicates were counted in the score summaries
+    op.execute('DELETE FROM paper_scores')
+    op.execute(
+        'INSERT INTO paper_scores '
+        '(paper_id, reviewer_count, score_count, score_sum, score_sq_sum, score_min, score_max) '
+        'SELECT papers.id, COUNT(paper_reviewers.id), COUNT(paper_reviewers.score), '
+        'COALESCE(SUM(paper_reviewers.score), 0), '
+        'COALESCE(SUM(paper_reviewers.score * paper_reviewers.score), 0), '
+        'MIN(paper_reviewers.score), MAX(paper_reviewers.score) '
+        'FROM papers LEFT OUTER JOIN paper_reviewers ON paper_reviewers.paper_id = papers.id '
+        'GROUP BY papers.id')
+
+
+def downgrade():
+    op.drop_index('ix_papers_status', table_name='papers')
+    op.drop_index('ix_users_roles_role_id_user_id', table_name='users_roles')
+    op.drop_index('ix_users_roles_user_id', table_name='users_roles')
+    op.drop_index('ix_paper_reviewers_reviewer_id', table_name='paper_reviewers')
+    op.drop_index('ix_paper_reviewers_paper_id_reviewer_id', table_name='paper_reviewers')
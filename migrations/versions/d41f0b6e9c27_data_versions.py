@@ -0,0 +1,46 @@
+"""Add change counters for conditional GET
+
+Revision ID: d41f0b6e9c27
+Revises: c5e9a7f3b2d8
+Create Date: 2026-10-18 12:05:41.220394
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd41f0b6e9c27'
+down_revision = 'c5e9a7f3b2d8'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Databases created by 'manage.py init_db' already have the table and the columns
+    inspector = sa.inspect(op.get_bind())
+    if 'data_versions' not in inspector.get_table_names():
+        op.create_table('data_versions',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+        )
+
+    # The counters bump() updates
+    versions = sa.table('data_versions', sa.column('name', sa.String()), sa.column('version', sa.Integer()))
+    existing = set(name for name, in op.get_bind().execute(sa.select([versions.c.name])))
+    rows = [{'name': name, 'version': 0} for name in ('papers', 'users') if name not in existing]
+    if rows:
+        op.bulk_insert(versions, rows)
+
+    columns = set(column['name'] for column in inspector.get_columns('papers'))
+    if 'version' not in columns:
+        with op.batch_alter_table('papers') as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('papers') as batch_op:
+        batch_op.drop_column('updated_at')
+        batch_op.drop_column('version')
+    op.drop_table('data_versions')
@@ -0,0 +1,35 @@
+"""Add the change event log for live updates
+
+Revision ID: e7a2c4d9f316
+Revises: d41f0b6e9c27
+Create Date: 2026-10-18 15:42:07.518203
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'e7a2c4d9f316'
+down_revision = 'd41f0b6e9c27'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    # Databases created by 'manage.py init_db' already have the table
+    if 'change_events' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('change_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=30), nullable=False),
+    sa.Column('paper_id', sa.Integer(), nullable=True),
+    sa.Column('data', sa.Text(), server_default='{}', nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_change_events_created_at'), 'change_events', ['created_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_change_events_created_at'), table_name='change_events')
+    op.drop_table('change_events')
@@ -0,0 +1,24 @@
+"""Add the full-text search index of paper titles and abstracts
+
+Revision ID: f3b8d1a6c524
+Revises: e7a2c4d9f316
+Create Date: 2026-10-18 17:20:55.804112
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'f3b8d1a6c524'
+down_revision = 'e7a2c4d9f316'
+
+from alembic import op
+
+from app.models.paper_search import create_search_index, drop_search_index
+
+
+def upgrade():
+    # FTS5 table and triggers on SQLite, a GIN tsvector index on PostgreSQL
+    create_search_index(op.get_bind(), rebuild=True)
+
+
+def downgrade():
+    drop_search_index(op.get_bind())
@@ -0,0 +1,88 @@
+import contextlib
+import json
+import threading
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app, db
+from app.commands.seed import seed_database
+from app.models.paper_models import Paper, PaperAuthors, PaperReviewers
+
+# Size of the conference seeded for every test
+SEED_USERS = 60
+SEED_PAPERS = 40
+
+
+@pytest.fixture
+def app(tmpdir):
+    """ An app on a scratch SQLite file seeded with a small generated conference """
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmpdir.join('test.sqlite')),
+        'WTF_CSRF_ENABLED': False,
+        'PASSWORD_HASH_PROCESSES': 1,
+        'MANUSCRIPT_PATH': str(tmpdir.join('manuscripts')),
+        'FRAGMENT_CACHE_BACKEND': None,
+        'MAIL_NOTIFICATIONS': False,
+    })
+    with app.app_context():
+        seed_database(users=SEED_USERS, papers=SEED_PAPERS, k=3, seed=1)
+        db.session.remove()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def ids(app):
+    """ A paper under review, one of its reviewers, its first author and the admin """
+    with app.app_context():
+        paper_id, reviewer_id = db.session.query(PaperReviewers.paper_id, PaperReviewers.reviewer_id) \
+            .join(Paper, Paper.id == PaperReviewers.paper_id) \
+            .filter(Paper.status == 1) \
+            .order_by(PaperReviewers.paper_id, PaperReviewers.id).first()
+        member_id = db.session.query(PaperAuthors.user_id) \
+            .filter(PaperAuthors.paper_id == paper_id, PaperAuthors.position == 0).scalar()
+        db.session.remove()
+    return {'paper_id': paper_id, 'admin': 1, 'reviewer': reviewer_id, 'member': member_id}
+
+
+def client_for(app, user_id):
+    """ A test client logged in as user_id. No app context is held by the
+    test while it sends requests, so each request gets its own, as in production.
+    """
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@contextlib.contextmanager
+def count_statements(app):
+    """ Collect the SQL statements this thread runs inside the with block """
+    statements = []
+    thread = threading.current_thread()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if threading.current_thread() is thread:
+            statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def post_json(client, url, data):
+    """ POST data as a JSON body """
+    return client.post(url, data=json.dumps(data), content_type='application/json')
+
+
+def response_json(response):
+    """ The JSON body of response """
+    return json.loads(response.get_data(as_text=True))
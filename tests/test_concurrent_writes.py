@@ -0,0 +1,75 @@
+import random
+import threading
+
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.commands.export import iter_paper_records
+from app.models.paper_models import DECIDED_STATUSES, Paper, PaperReviewers, PaperScores
+from app.views.review_scores import store_review_scores
+
+THREADS = 8
+WRITES_PER_THREAD = 25
+
+
+def test_concurrent_score_writes(app):
+    """ Reviewers scoring from many threads while another thread exports
+    every paper: no write fails with "database is locked" and the summaries
+    match the scores.
+    """
+    with app.app_context():
+        # Readers do not block writers only in WAL mode
+        assert db.session.execute('PRAGMA journal_mode').scalar() == 'wal'
+        assert db.session.execute('PRAGMA busy_timeout').scalar() > 0
+        assignments = db.session.query(PaperReviewers.paper_id, PaperReviewers.reviewer_id) \
+            .join(Paper, Paper.id == PaperReviewers.paper_id) \
+            .filter(Paper.status.notin_(DECIDED_STATUSES)).all()
+        db.session.remove()
+    assert assignments
+
+    errors = []
+    saved = []
+    done = threading.Event()
+
+    def writer(seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            try:
+                for i in range(WRITES_PER_THREAD):
+                    paper_id, reviewer_id = rng.choice(assignments)
+                    stored, rejected = store_review_scores(reviewer_id, [(paper_id, rng.randint(-2, 2))])
+                    saved.extend(stored)
+            except OperationalError as e:
+                errors.append(str(e))
+            finally:
+                db.session.remove()
+
+    def reader():
+        with app.app_context():
+            while not done.is_set():
+                for record in iter_paper_records():
+                    pass
+            db.session.remove()
+
+    exporter = threading.Thread(target=reader)
+    exporter.start()
+    writers = [threading.Thread(target=writer, args=(seed,)) for seed in range(THREADS)]
+    for thread in writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    done.set()
+    exporter.join()
+
+    assert errors == []
+    assert len(saved) == THREADS * WRITES_PER_THREAD
+
+    with app.app_context():
+        score = PaperReviewers.score
+        expected = dict((row[0], tuple(row[1:])) for row in db.session.query(
+            PaperReviewers.paper_id, db.func.count(PaperReviewers.id), db.func.count(score),
+            db.func.coalesce(db.func.sum(score), 0), db.func.coalesce(db.func.sum(score * score), 0),
+            db.func.min(score), db.func.max(score)).group_by(PaperReviewers.paper_id))
+        for summary in PaperScores.query.filter(PaperScores.paper_id.in_(set(saved))):
+            assert (summary.reviewer_count, summary.score_count, summary.score_sum, summary.score_sq_sum,
+                    summary.score_min, summary.score_max) == expected[summary.paper_id]
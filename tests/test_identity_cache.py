@@ -0,0 +1,34 @@
+from app import db
+from app.models.identity_cache import identity_cache_stats
+from app.models.paper_models import Paper, PaperReviewers
+from tests.conftest import client_for
+
+
+def stats_of_request(app, client, url):
+    """ The identity cache stats of one request """
+    before = identity_cache_stats(app)
+    response = client.get(url)
+    assert response.status_code == 200
+    after = identity_cache_stats(app)
+    return dict((name, after.get(name, 0) - before.get(name, 0)) for name in ('hits', 'misses', 'queries'))
+
+
+def test_second_lookup_of_a_user_is_a_hit(app, ids):
+    # The author opening their paper: Flask-User loads them, then the page looks them up again as an author
+    with app.app_context():
+        paper = Paper.query.get(ids['paper_id'])
+        users = set(paper.author_ids())
+        users.update(reviewer_id for reviewer_id, in db.session.query(PaperReviewers.reviewer_id)
+                     .filter(PaperReviewers.paper_id == paper.id))
+        db.session.remove()
+    assert ids['member'] in users
+
+    # The cache lives for one request: the second request loads the users again
+    client = client_for(app, ids['member'])
+    for request in range(2):
+        stats = stats_of_request(app, client, '/paper/detail/%(paper_id)s' % ids)
+        # Every user is loaded once, the author once by Flask-User and once more with the others
+        assert stats['misses'] == len(users)
+        assert stats['hits'] == 1
+        assert stats['queries'] == 2
+
@@ -0,0 +1,21 @@
+from app.commands.check_query_plans import check_query_plans, full_scans
+
+
+def test_view_queries_use_indexes(app):
+    with app.app_context():
+        scans = check_query_plans()
+    assert scans == [], '\n'.join('%s: %s\n    %s' % scan for scan in scans)
+
+
+def test_full_scan_is_reported(app):
+    # paper_reviewers has no index on score
+    with app.app_context():
+        details = full_scans('SELECT id FROM paper_reviewers WHERE score = ?', (1,))
+    assert len(details) == 1
+    assert details[0].startswith('SCAN paper_reviewers')
+
+
+def test_unindexed_sort_is_reported(app):
+    with app.app_context():
+        details = full_scans('SELECT id FROM papers WHERE status = ? ORDER BY title LIMIT 10', (1,))
+    assert 'USE TEMP B-TREE FOR ORDER BY' in details
@@ -0,0 +1,209 @@
+import pytest
+
+from app import db
+from app.commands.export import CSV_COLUMNS
+from app.models.paper_models import DECIDED_STATUSES, Paper, PaperReviewers, PaperScores
+from app.models.user_models import User
+from app.models.version_models import DataVersion, PAPERS_VERSION
+from app.views.misc_views import MAX_USERS_PER_REQUEST
+from tests.conftest import client_for, count_statements, post_json, response_json
+
+# Read-only pages: (role, url, statements of a first request, caches cold) on the seeded conference
+PAGES = [
+    ('admin', '/conference/paper', 9),
+    ('admin', '/conference/overview', 3),
+    ('admin', '/conference/reviewer', 4),
+    ('admin', '/conference/paper/detail/%(paper_id)s', 9),
+    ('reviewer', '/review/paper', 6),
+    ('member', '/member/list-papers', 7),
+    ('member', '/paper/detail/%(paper_id)s', 11),
+    ('member', '/member/submit-paper', 3),
+    ('member', '/paper/search?q=model', 5),
+]
+
+# Paper lists whose statement count must not depend on the rows of the page
+PAPER_LISTS = [
+    ('admin', '/conference/paper'),
+    ('admin', '/conference/overview'),
+    ('member', '/member/list-papers'),
+]
+
+
+def paper_where(app, reviewer_id, assigned, decided):
+    """ The id of a paper, decided or not, that reviewer_id does or does not review """
+    with app.app_context():
+        reviewed = db.session.query(PaperReviewers.paper_id).filter(PaperReviewers.reviewer_id == reviewer_id)
+        query = db.session.query(Paper.id)
+        query = query.filter(Paper.id.in_(reviewed) if assigned else ~Paper.id.in_(reviewed))
+        query = query.filter(Paper.status.in_(DECIDED_STATUSES) if decided else
+                             Paper.status.notin_(DECIDED_STATUSES))
+        paper_id = query.order_by(Paper.id).limit(1).scalar()
+        db.session.remove()
+    assert paper_id is not None
+    return paper_id
+
+
+@pytest.mark.parametrize('role,url,budget', PAGES)
+def test_page_within_query_budget(app, ids, role, url, budget):
+    client = client_for(app, ids[role])
+    with count_statements(app) as statements:
+        response = client.get(url % ids)
+    assert response.status_code == 200
+    assert len(statements) <= budget, '\n'.join(statements)
+
+
+@pytest.mark.parametrize('role,url', PAPER_LISTS)
+def test_paper_list_queries_do_not_grow_with_the_page(app, ids, role, url):
+    counts = []
+    for per_page in (5, 40):
+        client = client_for(app, ids[role])
+        with count_statements(app) as statements:
+            response = client.get(url + '?per_page=%d' % per_page)
+        assert response.status_code == 200
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+
+def test_unchanged_paper_detail_is_not_modified(app, ids):
+    client = client_for(app, ids['member'])
+    url = '/paper/detail/%(paper_id)s' % ids
+    first = client.get(url)
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    with count_statements(app) as statements:
+        second = client.get(url, headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.get_data() == b''
+    assert len(statements) < 10
+
+    # A score changes the paper version and with it the ETag
+    reviewer = client_for(app, ids['reviewer'])
+    assert response_json(reviewer.get('/review/paper/star?paper_id=%(paper_id)s&value=5' % ids))['status'] == 200
+    third = client.get(url, headers={'If-None-Match': etag})
+    assert third.status_code == 200
+
+
+def test_star_score_updates_the_summary(app, ids):
+    client = client_for(app, ids['reviewer'])
+    response = client.get('/review/paper/star?paper_id=%(paper_id)s&value=5' % ids)
+    assert response_json(response) == {'paper_id': ids['paper_id'], 'value': 2, 'status': 200,
+                                   'message': 'Process success'}
+    with app.app_context():
+        scores = [score for score, in db.session.query(PaperReviewers.score)
+                  .filter(PaperReviewers.paper_id == ids['paper_id'])]
+        summary = PaperScores.query.get(ids['paper_id'])
+        assert summary.reviewer_count == len(scores)
+        assert summary.score_count == len([score for score in scores if score is not None])
+        assert summary.score_sum == sum(score for score in scores if score is not None)
+
+
+def test_star_score_refusals(app, ids):
+    client = client_for(app, ids['reviewer'])
+    decided = paper_where(app, ids['reviewer'], assigned=True, decided=True)
+    other = paper_where(app, ids['reviewer'], assigned=False, decided=False)
+
+    assert response_json(client.get('/review/paper/star?paper_id=%d&value=4' % decided))['status'] == 304
+    assert response_json(client.get('/review/paper/star?paper_id=%d&value=4' % other))['status'] == 303
+    response = client.get('/review/paper/star?paper_id=%(paper_id)s&value=9' % ids)
+    assert response.status_code == 400
+
+
+def test_star_scores_batch(app, ids):
+    client = client_for(app, ids['reviewer'])
+    other = paper_where(app, ids['reviewer'], assigned=False, decided=False)
+    scores = [{'paper_id': ids['paper_id'], 'value': 4}, {'paper_id': other, 'value': 4}]
+    with count_statements(app) as statements:
+        response = post_json(client, '/review/paper/stars', {'scores': scores})
+    body = response_json(response)
+    assert body['saved'] == [ids['paper_id']]
+    assert body['rejected'] == [{'paper_id': other, 'status': 303, 'message': 'No authorization'}]
+    assert len(statements) <= 12
+
+    for data in ('[1, 2]', '{"scores": [1]}', '{"scores": {"paper_id": 1}}'):
+        response = client.post('/review/paper/stars', data=data, content_type='application/json')
+        assert response.status_code == 400
+
+
+def test_paper_action(app, ids):
+    client = client_for(app, ids['admin'])
+    assert client.get('/conference/action/paper?paper_id=x&action=2').status_code == 400
+    assert client.get('/conference/action/paper?paper_id=%(paper_id)s' % ids).status_code == 400
+    assert client.get('/conference/action/paper?paper_id=99999&action=2').status_code == 404
+
+    response = client.get('/conference/action/paper?paper_id=%(paper_id)s&action=2' % ids)
+    assert response_json(response)['actionStr'] == 'Accepted'
+    with app.app_context():
+        assert Paper.query.get(ids['paper_id']).status == 2
+        version = DataVersion.current([PAPERS_VERSION])[PAPERS_VERSION][0]
+
+    # The same decision again changes nothing
+    response = client.get('/conference/action/paper?paper_id=%(paper_id)s&action=2' % ids)
+    assert response.status_code == 200
+    assert response_json(response)['message'] == 'Paper is already Accepted'
+    with app.app_context():
+        assert DataVersion.current([PAPERS_VERSION])[PAPERS_VERSION][0] == version
+
+
+def test_auto_assign_reviewers(app, ids):
+    client = client_for(app, ids['admin'])
+    assert client.get('/conference/assign/auto').status_code == 405
+    assert post_json(client, '/conference/assign/auto', {'k': 0}).status_code == 400
+    assert post_json(client, '/conference/assign/auto', {'k': 'three'}).status_code == 400
+
+    response = post_json(client, '/conference/assign/auto', {'k': 3})
+    assert response.status_code == 200
+    body = response_json(response)
+    assert body['unfilled'] == 0
+    with app.app_context():
+        counts = db.session.query(db.func.count(PaperReviewers.id)) \
+            .join(Paper, Paper.id == PaperReviewers.paper_id) \
+            .filter(Paper.status.notin_(DECIDED_STATUSES)) \
+            .group_by(PaperReviewers.paper_id).all()
+        assert all(count >= 3 for count, in counts)
+
+
+def test_bulk_create_users(app, ids):
+    client = client_for(app, ids['admin'])
+    users = [{'email': 'new%d@example.com' % i, 'password': 'Password1'} for i in range(2)]
+    response = post_json(client, '/admin/users/bulk', {'users': users})
+    assert response_json(response)['created'] == 2
+    response = post_json(client, '/admin/users/bulk', {'users': users})
+    assert response_json(response)['created'] == 0
+    assert response_json(response)['skipped'] == 2
+    with app.app_context():
+        assert User.query.filter(User.email == 'new0@example.com').count() == 1
+
+    too_many = [{'email': 'bulk%d@example.com' % i, 'password': 'Password1'}
+                for i in range(MAX_USERS_PER_REQUEST + 1)]
+    assert post_json(client, '/admin/users/bulk', {'users': too_many}).status_code == 413
+    assert post_json(client, '/admin/users/bulk', {'users': [{'email': 'x@example.com'}]}).status_code == 400
+    assert post_json(client, '/admin/users/bulk', [1]).status_code == 400
+
+
+def test_upload_manuscript(app, ids):
+    client = client_for(app, ids['member'])
+    pdf = b'%PDF-1.4\n' + b'0' * 1024 + b'\n%%EOF\n'
+    response = client.put('/paper/%(paper_id)s/manuscript' % ids, data=pdf, content_type='application/pdf')
+    assert response.status_code == 200
+    body = response_json(response)
+    assert body['size'] == len(pdf)
+
+    download = client.get(body['url'])
+    assert download.status_code == 200
+    assert download.get_data() == pdf
+
+    admin = client_for(app, ids['admin'])
+    admin.get('/conference/action/paper?paper_id=%(paper_id)s&action=3' % ids)
+    response = client.put('/paper/%(paper_id)s/manuscript' % ids, data=pdf, content_type='application/pdf')
+    assert response.status_code == 409
+
+
+def test_export_csv(app, ids):
+    client = client_for(app, ids['admin'])
+    response = client.get('/conference/export?format=csv')
+    assert response.status_code == 200
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0] == ','.join(CSV_COLUMNS)
+    with app.app_context():
+        assert len(lines) == Paper.query.count() + 1